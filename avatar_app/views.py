@@ -3,10 +3,11 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django.db.models import Prefetch
 
 from .models import Avatar, UserAvatarProgress, Stage, AvatarStage, AvatarOutfit, OutfitPurchase
-from loyalty_app.models import PointsTransaction
+from loyalty_app.points import IDEMPOTENCY_HEADER, IdempotencyConflict, InsufficientPoints, spend_points
 from .serializers import AvatarSerializer, AvatarDetailSerializer, UserAvatarProgressSerializer
 
 
@@ -192,28 +193,33 @@ class AvatarOutfitsViewSet(viewsets.ViewSet):
             return Response({'detail': 'У вас нет карты лояльности.'}, status=400)
 
         outfit = self.get_object()
-        balance = user.loyalty_card.get_balance()
-
-        if OutfitPurchase.objects.filter(user=user, outfit=outfit).exists():
-            return Response({'detail': 'Вы уже приобрели этот аутфит.'}, status=400)
-
-        if balance < outfit.price:
-            return Response({
-                'detail': f'Недостаточно бонусов. Баланс: {balance}, требуется: {outfit.price}'
-            }, status=400)
-
-        PointsTransaction.objects.create(
-            points=-outfit.price,
-            price=outfit.price,
-            transaction_type='списание',
-            card_id=user.loyalty_card,
-            resident_id=None
-        )
 
-        purchase = OutfitPurchase.objects.create(user=user, outfit=outfit)
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key and len(idempotency_key) > 64:
+            return Response({'detail': f'{IDEMPOTENCY_HEADER} длиннее 64 символов.'}, status=400)
+
+        try:
+            with transaction.atomic():
+                _, created = spend_points(
+                    user.loyalty_card.id, outfit.price, idempotency_key=idempotency_key,
+                    operation=f'outfit:{outfit.id}', price=outfit.price
+                )
+                # Повтор с тем же ключом (created=False) ничего не списал — покупка уже сделана раньше
+                if created:
+                    # Проверка под блокировкой карты, поэтому параллельный запрос не купит аутфит второй раз
+                    if OutfitPurchase.objects.filter(user=user, outfit=outfit).exists():
+                        transaction.set_rollback(True)
+                        return Response({'detail': 'Вы уже приобрели этот аутфит.'}, status=400)
+                    OutfitPurchase.objects.create(user=user, outfit=outfit)
+        except IdempotencyConflict as e:
+            return Response({'detail': str(e)}, status=409)
+        except InsufficientPoints as e:
+            if OutfitPurchase.objects.filter(user=user, outfit=outfit).exists():
+                return Response({'detail': 'Вы уже приобрели этот аутфит.'}, status=400)
+            return Response({'detail': str(e)}, status=400)
 
         return Response({
-            'detail': f'Успешная покупка аутфита #{purchase.outfit.id}. Списано: {outfit.price} бонусов.'
+            'detail': f'Успешная покупка аутфита #{outfit.id}. Списано: {outfit.price} бонусов.'
         })
 
     @action(detail=True, methods=['post'], url_path='wear')
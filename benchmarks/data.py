@@ -0,0 +1,203 @@
+"""
+Генератор данных для нагрузочных тестов: пользователи с картами и транзакциями, резиденты
+с категориями и метками, здания с этажами-сетками локаций, мероприятия.
+
+Всё создаётся через bulk_create — так быстрее и не срабатывают сигналы с рассылками
+в Telegram. Генерация детерминирована: одинаковые параметры и seed дают одинаковые данные.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from event_app.models import Event
+from loyalty_app.models import LoyaltyCard, PointsSystemSettings, PointsTransaction
+from loyalty_app.points import transactions_total
+from resident_app.models import Category, MapMarker, Resident
+from route_app.markers import snap_markers
+from route_app.models import Building, Connection, Floor, Location, LocationCorner, LocationType
+from route_app.navigation import invalidate_graph
+
+User = get_user_model()
+
+# Первый tg_id сгенерированных пользователей — чтобы не пересекаться с настоящими
+TG_ID_OFFSET = 9_000_000_000
+CELL = 10  # сторона клетки-локации на плане этажа
+FLOORS_PER_BUILDING = 3
+CATEGORIES = 5
+SUBCATEGORIES = 3
+BATCH_SIZE = 1000
+
+
+def generate(users=1000, transactions=10000, residents=100, locations=600, events=30, seed=0):
+    """Создаёт данные и возвращает словарь с числом созданных объектов каждого вида."""
+    rnd = random.Random(seed)
+    with transaction.atomic():
+        PointsSystemSettings.objects.get_or_create(
+            defaults={'points_per_100_rubles': 5, 'points_per_1_percent': 10, 'new_user_points': 0}
+        )
+        cards = _users(users, transactions, rnd)
+        floors = _locations(locations, rnd)
+        _residents(residents, floors, rnd)
+        _events(events)
+    # Граф и привязки меток пересчитываются по уже сохранённым данным
+    invalidate_graph()
+    snap_markers()
+    return {
+        'users': len(cards),
+        'transactions': transactions if cards else 0,
+        'residents': residents,
+        'locations': Location.objects.count(),
+        'events': events,
+    }
+
+
+def _users(count, transactions, rnd):
+    start = TG_ID_OFFSET + User.objects.filter(tg_id__gte=TG_ID_OFFSET).count()
+    users = User.objects.bulk_create([
+        User(tg_id=start + i, first_name=f'Пользователь {start + i}', username=f'user{start + i}')
+        for i in range(count)
+    ], batch_size=BATCH_SIZE)
+    taken = set(LoyaltyCard.objects.values_list('card_number', flat=True))
+    numbers = []
+    while len(numbers) < len(users):
+        number = f'{rnd.randrange(10 ** 6):06d}'
+        number = f'{number[:3]} {number[3:]}'
+        if number not in taken:
+            taken.add(number)
+            numbers.append(number)
+    cards = LoyaltyCard.objects.bulk_create([
+        LoyaltyCard(user=user, card_number=number) for user, number in zip(users, numbers)
+    ], batch_size=BATCH_SIZE)
+    if cards:
+        PointsTransaction.objects.bulk_create(_transactions(cards, transactions, rnd), batch_size=BATCH_SIZE)
+        # bulk_create обходит save(), поэтому балансы карт считаются одним запросом
+        LoyaltyCard.objects.filter(pk__in=[card.pk for card in cards]).update(balance=transactions_total())
+    return cards
+
+
+def _transactions(cards, count, rnd):
+    # Активность распределена неравномерно: у немногих карт большая часть операций
+    weights = [1 / (rank + 1) for rank in range(len(cards))]
+    for card in rnd.choices(cards, weights=weights, k=count):
+        if rnd.random() < 0.8:
+            price = rnd.randrange(100, 5000)
+            yield PointsTransaction(points=price * 5 // 100 or 1, price=price,
+                                    transaction_type='начисление', card_id=card)
+        else:
+            yield PointsTransaction(points=-rnd.randrange(10, 100), price=0,
+                                    transaction_type='списание', card_id=card)
+
+
+def _locations(count, rnd):
+    """
+    Здания по FLOORS_PER_BUILDING этажей, этаж — квадратная сетка комнат со связями между
+    соседями. Этажи соединены лестницей в углу сетки, здания — переходом на первом этаже.
+    Возвращает список (этаж, сторона сетки).
+    """
+    room, _ = LocationType.objects.get_or_create(name='Помещение')
+    stairs, _ = LocationType.objects.get_or_create(
+        name='Лестница', defaults={'transition': LocationType.Transition.STAIRS}
+    )
+    side = 10
+    per_building = side * side * FLOORS_PER_BUILDING
+    buildings = max(1, round(count / per_building))
+    side = max(2, round((count / (buildings * FLOORS_PER_BUILDING)) ** 0.5))
+
+    start = Building.objects.count()
+    created = Building.objects.bulk_create([
+        Building(name=f'Бенчмарк {start + b + 1}') for b in range(buildings)
+    ])
+    floors = Floor.objects.bulk_create([
+        Floor(building=building, number=number)
+        for building in created for number in range(1, FLOORS_PER_BUILDING + 1)
+    ])
+
+    grid = {}  # (этаж, строка, столбец) → локация
+    new = []
+    for floor in floors:
+        for row in range(side):
+            for col in range(side):
+                location_type = stairs if (row, col) == (0, 0) else room
+                location = Location(name=f'{floor.building.name}, {floor.number} эт., {row}-{col}',
+                                    floor=floor, location_type=location_type)
+                grid[floor.id, row, col] = location
+                new.append(location)
+    Location.objects.bulk_create(new, batch_size=BATCH_SIZE)
+
+    LocationCorner.objects.bulk_create((
+        LocationCorner(location=grid[floor.id, row, col], x=x, y=y, order=order)
+        for floor in floors for row in range(side) for col in range(side)
+        for order, (x, y) in enumerate([
+            (col * CELL, row * CELL), ((col + 1) * CELL, row * CELL),
+            ((col + 1) * CELL, (row + 1) * CELL), (col * CELL, (row + 1) * CELL),
+        ])
+    ), batch_size=BATCH_SIZE)
+
+    connections = []
+    for floor in floors:
+        for row in range(side):
+            for col in range(side):
+                here = grid[floor.id, row, col]
+                for other in ((row, col + 1), (row + 1, col)):
+                    if other[0] < side and other[1] < side:
+                        connections.append(Connection(from_location=here, to_location=grid[(floor.id, *other)],
+                                                      cost=CELL * rnd.uniform(1, 1.3)))
+    for lower, upper in zip(floors, floors[1:]):
+        if lower.building_id == upper.building_id:
+            connections.append(Connection(from_location=grid[lower.id, 0, 0], to_location=grid[upper.id, 0, 0],
+                                          cost=CELL * 2))
+        else:
+            first = next(floor for floor in floors if floor.building_id == lower.building_id)
+            connections.append(Connection(from_location=grid[first.id, side - 1, side - 1],
+                                          to_location=grid[upper.id, side - 1, 0], cost=CELL * 3))
+    Connection.objects.bulk_create(connections, batch_size=BATCH_SIZE)
+    return [(floor, side) for floor in floors]
+
+
+def _residents(count, floors, rnd):
+    parents = Category.objects.bulk_create([Category(name=f'Категория {i + 1}') for i in range(CATEGORIES)])
+    children = Category.objects.bulk_create([
+        Category(name=f'{parent.name}.{j + 1}', parent=parent) for parent in parents for j in range(SUBCATEGORIES)
+    ])
+
+    start = Resident.objects.count()
+    taken = set(Resident.objects.values_list('pin_code', flat=True))
+    residents = []
+    placements = []
+    for i in range(count):
+        pin = f'{rnd.randrange(10 ** 6):06d}'
+        while pin in taken:
+            pin = f'{rnd.randrange(10 ** 6):06d}'
+        taken.add(pin)
+        floor, side = rnd.choice(floors)
+        residents.append(Resident(name=f'Резидент {start + i + 1}', pin_code=pin, building=floor.building.name,
+                                  floor=str(floor.number), office=str(i + 1)))
+        placements.append((rnd.uniform(0, side * CELL), rnd.uniform(0, side * CELL)))
+    Resident.objects.bulk_create(residents, batch_size=BATCH_SIZE)
+
+    Resident.categories.through.objects.bulk_create([
+        Resident.categories.through(resident=resident, category=category)
+        for resident in residents
+        for category in {rnd.choice(parents), rnd.choice(children)}
+    ], batch_size=BATCH_SIZE)
+    MapMarker.objects.bulk_create([
+        MapMarker(resident=resident, x=x, y=y) for resident, (x, y) in zip(residents, placements)
+    ], batch_size=BATCH_SIZE)
+
+
+def _events(count):
+    now = timezone.now()
+    start = Event.objects.count()
+    Event.objects.bulk_create([
+        Event(
+            title=f'Мероприятие {start + i + 1}', description='Описание', info='Подробности', location='Двор',
+            # Каждое третье мероприятие идёт сегодня, остальные — в ближайшие недели
+            start_date=now - timedelta(hours=1) if i % 3 == 0 else now + timedelta(days=i),
+            end_date=now + timedelta(hours=2) if i % 3 == 0 else now + timedelta(days=i, hours=3),
+            photo='events/photos/event.png',
+        )
+        for i in range(count)
+    ])
@@ -0,0 +1,247 @@
+"""
+Нагрузка на эндпоинты, которые чаще всего дёргает Telegram-бот.
+
+Каждый сценарий строит запрос по случайным объектам из базы и прогоняется при нескольких
+уровнях параллельности. Запросы идут либо в процессе через django.test.Client (тогда
+у каждого потока своё соединение с базой и считаются SQL-запросы), либо по HTTP
+на запущенный сервер (--base-url, без подсчёта запросов).
+"""
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, quantiles
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from event_app.models import Event
+from loyalty_app.models import LoyaltyCard, PointsTransaction
+from resident_app.models import Resident
+from route_app.models import Location
+
+User = get_user_model()
+
+# Из выборки берётся не больше стольких объектов каждого вида
+SAMPLE_SIZE = 1000
+
+
+class Dataset:
+    """Идентификаторы объектов, по которым строятся запросы."""
+
+    def __init__(self, seed=0):
+        rnd = random.Random(seed)
+
+        def sample(values):
+            values = list(values)
+            return rnd.sample(values, min(len(values), SAMPLE_SIZE))
+
+        self.cards = sample(LoyaltyCard.objects.values_list('id', 'user__tg_id'))
+        self.residents = sample(Resident.objects.values_list('id', flat=True))
+        self.locations = sample(Location.objects.values_list('id', flat=True))
+
+    def summary(self):
+        return {
+            'users': User.objects.count(),
+            'transactions': PointsTransaction.objects.count(),
+            'residents': Resident.objects.count(),
+            'locations': Location.objects.count(),
+            'events': Event.objects.count(),
+        }
+
+
+def _users(rnd, dataset):
+    return 'GET', '/api/users/', None, {}
+
+
+def _card_image(rnd, dataset):
+    _, tg_id = rnd.choice(dataset.cards)
+    return 'GET', f'/api/loyalty-cards/{tg_id}/card-image/', None, {}
+
+
+def _accrue(rnd, dataset):
+    card_id, _ = rnd.choice(dataset.cards)
+    return (
+        'POST', '/api/resident/points-transactions/accrue/',
+        {'card_id': card_id, 'price': rnd.randrange(100, 5000)},
+        {'X-Resident-ID': str(rnd.choice(dataset.residents))},
+    )
+
+
+def _navigate(rnd, dataset):
+    start, end = rnd.sample(dataset.locations, 2)
+    return 'GET', f'/api/routes/navigate/?from={start}&to={end}', None, {}
+
+
+def _residents_map(rnd, dataset):
+    return 'GET', '/api/map/residents/', None, {}
+
+
+def _events_today(rnd, dataset):
+    return 'GET', '/api/events/today/', None, {}
+
+
+# Имя → (построитель запроса, чего требует от данных)
+SCENARIOS = {
+    'users': (_users, ()),
+    'card_image': (_card_image, ('cards',)),
+    'accrue': (_accrue, ('cards', 'residents')),
+    'navigate': (_navigate, ('locations',)),
+    'residents_map': (_residents_map, ()),
+    'events_today': (_events_today, ()),
+}
+
+
+class InProcessSender:
+    """Запросы через django.test.Client с подсчётом SQL-запросов; по одному на поток."""
+    counts_queries = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def __call__(self, method, path, data, headers):
+        # Журнал запросов ограничен по длине — без очистки счёт на длинном прогоне съезжает
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as context:
+            if method == 'POST':
+                response = self.client.post(path, data, content_type='application/json', headers=headers)
+            else:
+                response = self.client.get(path, headers=headers)
+        return response.status_code, len(context)
+
+    def close(self):
+        connection.close()
+
+
+class HttpSender:
+    """Запросы на запущенный сервер; число SQL-запросов снаружи не видно."""
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def __call__(self, method, path, data, headers):
+        response = self.session.request(method, self.base_url + path, json=data, headers=headers, timeout=60)
+        return response.status_code, None
+
+    def close(self):
+        self.session.close()
+
+
+def run_scenario(name, dataset, requests_count, concurrency, make_sender, warmup=0, seed=0):
+    build, _ = SCENARIOS[name]
+    headers = {'X-Bot-Api-Key': settings.BOT_API_KEY}
+
+    # Прогрев вне замера: граф навигации, шрифты карты, кэши
+    if warmup:
+        sender = make_sender()
+        rnd = random.Random(seed - 1)
+        try:
+            for _ in range(warmup):
+                method, path, data, extra = build(rnd, dataset)
+                sender(method, path, data, {**headers, **extra})
+        finally:
+            sender.close()
+
+    samples = []
+    lock = threading.Lock()
+    shares = [requests_count // concurrency + (worker < requests_count % concurrency) for worker in range(concurrency)]
+
+    def work(worker):
+        rnd = random.Random(seed * 1000 + worker)
+        sender = make_sender()
+        local = []
+        try:
+            for _ in range(shares[worker]):
+                method, path, data, extra = build(rnd, dataset)
+                started = time.perf_counter()
+                try:
+                    status, queries = sender(method, path, data, {**headers, **extra})
+                except Exception:
+                    status, queries = 'error', None
+                local.append(((time.perf_counter() - started) * 1000, status, queries))
+        finally:
+            sender.close()
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(work, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, _ in samples)
+    statuses = Counter(str(status) for _, status, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400),
+        'status': dict(sorted(statuses.items())),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latency_ms': _latency(latencies),
+        'queries_per_request': {'mean': round(mean(queries), 2), 'max': max(queries)} if queries else None,
+    }
+
+
+def _latency(latencies):
+    if not latencies:
+        return None
+    if len(latencies) == 1:
+        p50 = p95 = p99 = latencies[0]
+    else:
+        cuts = quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2),
+        'mean': round(mean(latencies), 2), 'max': round(latencies[-1], 2),
+    }
+
+
+def run(scenarios, concurrency_levels, requests_count, warmup=0, seed=0, base_url=None):
+    """Прогоняет сценарии и возвращает отчёт, готовый к json.dumps."""
+    dataset = Dataset(seed)
+    if base_url:
+        def make_sender():
+            return HttpSender(base_url)
+    else:
+        make_sender = InProcessSender
+
+    results = []
+    skipped = []
+    for name in scenarios:
+        _, requires = SCENARIOS[name]
+        missing = [kind for kind in requires if len(getattr(dataset, kind)) < (2 if kind == 'locations' else 1)]
+        if missing:
+            skipped.append({'scenario': name, 'missing': missing})
+            continue
+        for concurrency in concurrency_levels:
+            results.append(run_scenario(name, dataset, requests_count, concurrency, make_sender, warmup, seed))
+
+    return {
+        'commit': _commit(),
+        'started_at': timezone.now().isoformat(),
+        'target': base_url or 'in-process',
+        'database': connection.vendor,
+        'data': dataset.summary(),
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def _commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.load import SCENARIOS, run
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест эндпоинтов бота: p50/p95/p99 задержки и число SQL-запросов на запрос '
+            'для каждого сценария и уровня параллельности. Отчёт выводится в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                            help='Сценарии (по умолчанию — все)')
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16],
+                            help='Уровни параллельности: число одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый сценарий и уровень параллельности')
+        parser.add_argument('--warmup', type=int, default=5, help='Запросов прогрева перед замером')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--base-url',
+                            help='Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                                 'Без него запросы идут в процессе и считаются SQL-запросы')
+        parser.add_argument('-o', '--output', help='Файл для отчёта (по умолчанию — stdout)')
+        parser.add_argument('--indent', type=int, default=2, help='Отступ JSON')
+
+    def handle(self, *args, **options):
+        report = run(
+            options['scenarios'],
+            options['concurrency'],
+            options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            base_url=options['base_url'],
+        )
+        content = json.dumps(report, ensure_ascii=False, indent=options['indent'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,48 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmarks.data import generate
+
+
+class Command(BaseCommand):
+    help = ('Заполнить базу данными для нагрузочных тестов: пользователи с картами и транзакциями, '
+            'резиденты с метками, здания с локациями и связями, мероприятия')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Пользователей (у каждого карта лояльности)')
+        parser.add_argument('--transactions', type=int, default=10000, help='Транзакций бонусов на всех')
+        parser.add_argument('--residents', type=int, default=100, help='Резидентов с метками на карте')
+        parser.add_argument('--locations', type=int, default=600, help='Примерное число локаций')
+        parser.add_argument('--events', type=int, default=30, help='Мероприятий (каждое третье — сегодня)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--flush', action='store_true',
+                            help='Очистить базу перед генерацией (только для отдельной базы бенчмарка!)')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            self._check_flush_allowed()
+            call_command('flush', interactive=False, verbosity=0)
+        created = generate(
+            users=options['users'],
+            transactions=options['transactions'],
+            residents=options['residents'],
+            locations=options['locations'],
+            events=options['events'],
+            seed=options['seed'],
+        )
+        self.stdout.write(json.dumps(created, ensure_ascii=False))
+
+    @staticmethod
+    def _check_flush_allowed():
+        # Очищаем только базу из benchmarks.settings и никогда — рабочую из DB_*
+        database = connection.settings_dict
+        if not getattr(settings, 'BENCHMARK_DATABASE', None):
+            raise CommandError('--flush доступен только с DJANGO_SETTINGS_MODULE=benchmarks.settings')
+        production = (os.getenv('DB_NAME'), os.getenv('DB_HOST'))
+        if database['ENGINE'] != 'django.db.backends.sqlite3' and (database['NAME'], database['HOST']) == production:
+            raise CommandError(f'--flush: база {database["NAME"]} совпадает с рабочей DB_NAME, очистка отменена')
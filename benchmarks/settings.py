@@ -0,0 +1,65 @@
+"""
+Настройки для нагрузочных тестов API: всё как в dzavod.settings, но локально и воспроизводимо.
+
+По умолчанию база — SQLite-файл benchmark.sqlite3 (BENCHMARK_DATABASE=sqlite), с
+BENCHMARK_DATABASE=postgres — отдельная база из BENCHMARK_DB_NAME/USER/PASS/HOST/PORT.
+DB_* из .env (рабочая база) сюда не подставляются. Медиа хранятся на диске, поэтому
+логотип и маскот карты лояльности читаются локально, без сети.
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py migrate
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py benchmark_seed --users 1000
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python manage.py benchmark_api -o result.json
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from dzavod.settings import *  # noqa: F401,F403
+from dzavod.settings import BASE_DIR, INSTALLED_APPS, STORAGES, ALLOWED_HOSTS
+
+INSTALLED_APPS = INSTALLED_APPS + ['benchmarks.apps.BenchmarksConfig']
+
+SECRET_KEY = os.getenv('SECRET_KEY') or 'benchmark'
+BOT_API_KEY = os.getenv('BOT_API_KEY') or 'benchmark'
+ALLOWED_HOSTS = ALLOWED_HOSTS + ['testserver', 'localhost', '127.0.0.1']
+
+# benchmark_seed --flush очищает базу только при этих настройках
+BENCHMARK_DATABASE = os.getenv('BENCHMARK_DATABASE', 'sqlite')
+
+if BENCHMARK_DATABASE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCHMARK_SQLITE_PATH', str(BASE_DIR / 'benchmark.sqlite3')),
+            # Параллельные начисления бонусов ждут блокировку, а не падают сразу
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+elif BENCHMARK_DATABASE == 'postgres':
+    if not os.getenv('BENCHMARK_DB_NAME'):
+        raise ImproperlyConfigured('BENCHMARK_DATABASE=postgres: укажите отдельную базу в BENCHMARK_DB_NAME')
+    if (os.getenv('BENCHMARK_DB_NAME'), os.getenv('BENCHMARK_DB_HOST')) == (os.getenv('DB_NAME'), os.getenv('DB_HOST')):
+        raise ImproperlyConfigured('BENCHMARK_DB_NAME совпадает с рабочей базой DB_NAME')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('BENCHMARK_DB_NAME'),
+            'USER': os.getenv('BENCHMARK_DB_USER'),
+            'PASSWORD': os.getenv('BENCHMARK_DB_PASS'),
+            'HOST': os.getenv('BENCHMARK_DB_HOST'),
+            'PORT': os.getenv('BENCHMARK_DB_PORT'),
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'BENCHMARK_DATABASE должен быть sqlite или postgres, а не {BENCHMARK_DATABASE!r}')
+
+STORAGES = {
+    **STORAGES,
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+}
+MEDIA_ROOT = BASE_DIR / 'benchmark_media'
+MEDIA_URL = '/media/'
+
+# Задачи (привязка меток, пересчёт путей, отрисовка карт) выполняются сразу, без брокера —
+# перерисовка картинки карты после начисления входит в замер сценария accrue
+CELERY_TASK_ALWAYS_EAGER = True
@@ -1,8 +1,25 @@
+import logging
 import os
+
 from celery import Celery
+from celery.signals import worker_init
+from django.core.exceptions import ImproperlyConfigured
+
+from dzavod.checks import require_shared_cache
+
+logger = logging.getLogger(__name__)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dzavod.settings')
 
 app = Celery('dzavod')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def check_shared_cache(**kwargs):
+    # Воркер не останавливаем: задачи без общего кэша работают, но их сбросы кэша не дойдут до gunicorn
+    try:
+        require_shared_cache()
+    except ImproperlyConfigured as e:
+        logger.error(e)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def require_shared_cache():
+    """
+    Версия графа навигации, планы этажей, матрицы туров и картинки карт сбрасываются
+    из любого процесса (админка, API, celery). С локальным кэшем процесса остальные
+    воркеры этого не видят и отдают устаревшие данные, поэтому вне DEBUG нужен CACHE_URL.
+    """
+    if not settings.DEBUG and not settings.CACHE_URL:
+        raise ImproperlyConfigured(
+            'CACHE_URL не задан: без общего кэша (Redis) воркеры gunicorn и celery '
+            'не видят сбросов кэша друг друга.'
+        )
@@ -229,6 +229,33 @@ USE_X_FORWARDED_HOST = True
 
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 
+# Общий кэш для всех воркеров gunicorn и celery (версия графа навигации и т.п.).
+# Без CACHE_URL каждый процесс держит свой локальный кэш — это годится только для DEBUG и тестов,
+# иначе gunicorn не стартует (dzavod.checks.require_shared_cache).
+CACHE_URL = os.getenv('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Штраф за переход между этажами (в метрах стоимости на каждый этаж) по типу перехода.
+# Переход между этажами без типа считается лестницей.
+NAVIGATION_TRANSITION_PENALTIES = {
+    'stairs': 15,
+    'elevator': 30,
+    'escalator': 10,
+    'ramp': 5,
+}
+
 WHITENOISE_MANIFEST_STRICT = False
 
 AWS_ACCESS_KEY_ID = os.environ.get('SUPABASE_S3_ACCESS_KEY_ID')  # S3 Access Key
@@ -0,0 +1,379 @@
+"""
+Регрессия числа SQL-запросов для GET-эндпоинтов роутера из dzavod/urls.py и именованных
+URL вне роутера из EXTRA_ENDPOINTS.
+
+Каждый эндпоинт — коллекции и detail (retrieve и действия с detail=True) — вызывается на
+данных двух размеров; detail открывается на объектах из первой пачки. Число запросов не
+должно расти вместе с размером ответа — иначе это N+1 — и не должно превышать бюджет из
+QUERY_BUDGETS. Эндпоинт без бюджета тоже роняет тест: новый эндпоинт нужно добавить сюда,
+а не оставить без проверки.
+
+Запросы считаются на втором вызове: первый прогревает кэш графа навигации и ленивые
+get_or_create (реферальная ссылка), которые иначе исказили бы сравнение.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from avatar_app.models import Avatar, AvatarOutfit, AvatarStage, OutfitPurchase, Stage, UserAvatarProgress
+from event_app.models import Event
+from faq_app.models import FAQ, QuestionType
+from loyalty_app.models import LoyaltyCard, PointsSystemSettings, PointsTransaction, Promotion, UserPromotion
+from mailing_app.models import Mailing, Subscription
+from resident_app.models import Category, MapMarker, Resident
+from route_app.models import (
+    Building, Connection, Floor, Location, LocationCorner, LocationType, MarkerLocation, Route, Tour
+)
+
+from .urls import router
+
+User = get_user_model()
+
+BOT_API_KEY = 'test-bot-key'
+
+# Размер данных при первом замере и сколько добавляется перед вторым
+SMALL_BATCH = 3
+EXTRA_BATCH = 12
+
+# Верхняя граница числа запросов по имени URL
+QUERY_BUDGETS = {
+    'user-list': 3,
+    'user-detail': 3,
+    'user-get-by-phone': 3,
+    'user-me-me': 8,
+    'user-me-my-avatars': 3,
+    'user-me-my-promocodes': 3,
+    'user-me-promocode-detail': 4,
+    'user-me-points-transactions': 1,
+    'user-me-referral-link': 2,
+    'mailing-list': 1,
+    'mailing-detail': 1,
+    'admin-subscriptions-list': 1,
+    'admin-subscriptions-detail': 1,
+    'user-subscriptions-list': 1,
+    'user-subscriptions-detail': 1,
+    'user-subscriptions-my-subscriptions': 2,
+    'resident-points-transactions-list': 0,
+    'resident-points-transactions-detail': 0,
+    'promotions-list': 2,
+    'promotions-detail': 2,
+    'points-settings-get-single': 1,
+    'category-list': 3,
+    'category-detail': 4,
+    'resident-list': 4,
+    'resident-detail': 4,
+    'event-list': 1,
+    'event-detail': 1,
+    'event-today-events': 2,
+    'event-exclude-today-events': 2,
+    'admin-question-type-list': 1,
+    'admin-question-type-detail': 1,
+    'admin-faq-list': 1,
+    'admin-faq-detail': 1,
+    'user-question-type-list': 1,
+    'user-question-type-detail': 1,
+    'user-faq-list': 1,
+    'user-faq-detail': 1,
+    'avatar-list': 3,
+    'avatar-detail': 3,
+    'avatar-progress-list': 1,
+    'avatar-progress-detail': 1,
+    'avatar-shop-outfits-list': 5,
+    'building-list': 1,
+    'building-detail': 1,
+    'building-export-geojson': 1,
+    'floor-list': 2,
+    'floor-detail': 1,
+    'floor-locate': 1,
+    # План этажа отдаётся из кэша после первого запроса
+    'floor-plan-json': 0,
+    'floor-plan-svg': 0,
+    'location-list': 3,
+    'location-detail': 2,
+    'location-type-list': 1,
+    'location-type-detail': 1,
+    'location-corner-list': 1,
+    'location-corner-detail': 1,
+    'connection-list': 4,
+    'connection-detail': 3,
+    'route-list': 4,
+    'route-detail': 3,
+    'route-navigate': 3,
+    'route-navigate-between': 2,
+    'route-navigate-many': 1,
+    'route-navigate-resident': 3,
+    'tour-list': 2,
+    'tour-detail': 2,
+    'tour-path': 2,
+    'loyalty-card-image': 2,
+    'loyalty-card-number': 2,
+    'loyalty-card-id': 2,
+    'loyalty-card-by-number': 4,
+    'map-resident-list': 5,
+    'floor_plan_preview': 0,
+}
+
+# GET-эндпоинты вне роутера: карты лояльности для бота, карта резидентов, превью плана этажа
+EXTRA_ENDPOINTS = [
+    'loyalty-card-image',
+    'loyalty-card-number',
+    'loyalty-card-id',
+    'loyalty-card-by-number',
+    'map-resident-list',
+    'floor_plan_preview',
+]
+
+# Параметры эндпоинтов, которым они обязательны: имя URL → функция от теста
+URL_KWARGS = {
+    'user-get-by-phone': lambda test: {'phone_number': test.admin.phone_number},
+    'user-detail': lambda test: {'tg_id': test.admin.tg_id},
+    'user-me-promocode-detail': lambda test: {'pk': UserPromotion.objects.order_by('id').first().pk},
+    'mailing-detail': lambda test: {'pk': Mailing.objects.order_by('id').first().pk},
+    'admin-subscriptions-detail': lambda test: {'pk': Subscription.objects.order_by('id').first().pk},
+    'user-subscriptions-detail': lambda test: {'pk': Subscription.objects.order_by('id').first().pk},
+    'resident-points-transactions-detail': lambda test: {'pk': PointsTransaction.objects.order_by('id').first().pk},
+    'promotions-detail': lambda test: {'pk': Promotion.objects.order_by('id').first().pk},
+    'category-detail': lambda test: {'id': Category.objects.order_by('id').first().pk},
+    'resident-detail': lambda test: {'pk': test.resident.pk},
+    'event-detail': lambda test: {'pk': Event.objects.order_by('id').first().pk},
+    'admin-question-type-detail': lambda test: {'pk': QuestionType.objects.order_by('id').first().pk},
+    'admin-faq-detail': lambda test: {'pk': FAQ.objects.order_by('id').first().pk},
+    'user-question-type-detail': lambda test: {'pk': QuestionType.objects.order_by('id').first().pk},
+    'user-faq-detail': lambda test: {'pk': FAQ.objects.order_by('id').first().pk},
+    'avatar-detail': lambda test: {'pk': Avatar.objects.order_by('id').first().pk},
+    'avatar-progress-detail': lambda test: {'pk': UserAvatarProgress.objects.order_by('id').first().pk},
+    'building-detail': lambda test: {'pk': test.first_location().floor.building_id},
+    'building-export-geojson': lambda test: {'pk': test.first_location().floor.building_id},
+    'floor-detail': lambda test: {'pk': test.first_location().floor_id},
+    'floor-locate': lambda test: {'pk': test.first_location().floor_id},
+    'floor-plan-json': lambda test: {'pk': test.first_location().floor_id},
+    'floor-plan-svg': lambda test: {'pk': test.first_location().floor_id},
+    'floor_plan_preview': lambda test: {'pk': test.first_location().floor_id},
+    'location-detail': lambda test: {'pk': test.first_location().pk},
+    'location-type-detail': lambda test: {'pk': LocationType.objects.order_by('id').first().pk},
+    'location-corner-detail': lambda test: {'pk': LocationCorner.objects.order_by('id').first().pk},
+    'connection-detail': lambda test: {'pk': Connection.objects.order_by('id').first().pk},
+    'route-detail': lambda test: {'pk': Route.objects.order_by('id').first().pk},
+    'route-navigate': lambda test: {'pk': Route.objects.order_by('id').first().pk},
+    'tour-detail': lambda test: {'pk': test.tour.pk},
+    'tour-path': lambda test: {'pk': test.tour.pk},
+    'loyalty-card-image': lambda test: {'user__tg_id': test.admin.tg_id},
+    'loyalty-card-number': lambda test: {'user__tg_id': test.admin.tg_id},
+    'loyalty-card-id': lambda test: {'user__tg_id': test.admin.tg_id},
+    'loyalty-card-by-number': lambda test: {'card_number': test.admin.loyalty_card.card_number},
+}
+QUERY_PARAMS = {
+    'user-subscriptions-my-subscriptions': lambda test: {'tg_id': test.admin.tg_id},
+    'route-navigate-between': lambda test: {'from': test.first_location().id, 'to': test.last_location().id},
+    'route-navigate-many': lambda test: {
+        'from': test.first_location().id,
+        'to': ','.join(str(floor.locations.order_by('id').last().id) for floor in Floor.objects.all()),
+    },
+    'route-navigate-resident': lambda test: {'from': test.first_location().id, 'resident': test.resident.id},
+    'floor-locate': lambda test: {'x': 5, 'y': 5},
+}
+
+
+def get_endpoints():
+    """Имена URL всех GET-маршрутов из роутера проекта и EXTRA_ENDPOINTS."""
+    for prefix, viewset, basename in router.registry:
+        for route in router.get_routes(viewset):
+            mapping = router.get_method_map(viewset, route.mapping)
+            if 'get' in mapping:
+                yield route.name.format(basename=basename)
+    yield from EXTRA_ENDPOINTS
+
+
+def seed(admin, start, count):
+    """
+    Добавляет count объектов каждого вида, номера начинаются со start. Всё создаётся через
+    bulk_create, чтобы не срабатывали сигналы с рассылками в Telegram.
+    """
+    now = timezone.now()
+    numbers = range(start, start + count)
+
+    users = User.objects.bulk_create([
+        User(tg_id=100_000 + i, first_name=f'Пользователь {i}', phone_number=f'+7900{i:07d}') for i in numbers
+    ])
+    cards = LoyaltyCard.objects.bulk_create([
+        LoyaltyCard(user=user, card_number=f'{i:03d} {i:03d}') for i, user in zip(numbers, users)
+    ])
+    admin_card = admin.loyalty_card
+    PointsTransaction.objects.bulk_create(
+        [PointsTransaction(points=100, price=1000, transaction_type='начисление', card_id=card) for card in cards]
+        + [PointsTransaction(points=10, price=100, transaction_type='начисление', card_id=admin_card) for _ in numbers]
+    )
+
+    Mailing.objects.bulk_create([Mailing(text=f'Рассылка {i}', tg_user_id=admin.tg_id) for i in numbers])
+    subscriptions = Subscription.objects.bulk_create([Subscription(name=f'Подписка {i}') for i in numbers])
+    Subscription.users.through.objects.bulk_create([
+        Subscription.users.through(subscription=subscription, user=admin) for subscription in subscriptions
+    ])
+
+    parents = Category.objects.bulk_create([Category(name=f'Категория {i}') for i in numbers])
+    children = Category.objects.bulk_create([
+        Category(name=f'Подкатегория {i}.{j}', parent=parent) for i, parent in zip(numbers, parents) for j in range(2)
+    ])
+
+    building = Building.objects.create(name=f'Строение {start}')
+    floor = Floor.objects.create(building=building, number=1)
+    location_types = LocationType.objects.bulk_create([LocationType(name=f'Тип {i}') for i in numbers])
+    locations = Location.objects.bulk_create([
+        Location(name=f'Локация {i}', floor=floor, location_type=location_type)
+        for i, location_type in zip(numbers, location_types)
+    ])
+    LocationCorner.objects.bulk_create([
+        LocationCorner(location=location, x=k * 10 + dx, y=dy, order=order)
+        for k, location in enumerate(locations)
+        for order, (dx, dy) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+    ])
+    # Цепочка внутри этажа и переход к предыдущему строению, чтобы граф оставался связным
+    previous = Location.objects.exclude(floor=floor).order_by('-id').first()
+    chain = ([previous] if previous else []) + locations
+    Connection.objects.bulk_create([
+        Connection(from_location=a, to_location=b, cost=10) for a, b in zip(chain, chain[1:])
+    ])
+    Route.objects.bulk_create([
+        Route(name=f'Маршрут {i}', start_location=locations[0], end_location=location)
+        for i, location in zip(numbers, locations)
+    ])
+
+    residents = Resident.objects.bulk_create([
+        Resident(name=f'Резидент {i}', pin_code=f'{i:06d}', building=building.name, floor='1', office=str(i))
+        for i in numbers
+    ])
+    Resident.categories.through.objects.bulk_create([
+        Resident.categories.through(resident=resident, category=category)
+        for resident, parent, pair in zip(residents, parents, zip(children[::2], children[1::2]))
+        for category in (parent, *pair)
+    ])
+    markers = MapMarker.objects.bulk_create([
+        MapMarker(resident=resident, x=k * 10 + 5, y=5) for k, resident in enumerate(residents)
+    ])
+    MarkerLocation.objects.bulk_create([
+        MarkerLocation(marker=marker, location=location, distance=0, computed_at=now)
+        for marker, location in zip(markers, locations)
+    ])
+    # Самый первый тур получает резидентов каждой пачки — на нём проверяются detail-эндпоинты
+    first_tour = Tour.objects.order_by('id').first()
+    tours = Tour.objects.bulk_create([Tour(name=f'Тур {i}') for i in numbers])
+    Tour.residents.through.objects.bulk_create([
+        Tour.residents.through(tour=tour, resident=resident)
+        for tour in tours + ([first_tour] if first_tour else []) for resident in residents
+    ])
+
+    promotions = Promotion.objects.bulk_create([
+        Promotion(
+            title=f'Акция {i}', description='Описание', start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=30), photo='promotions/photos/promo.png', is_approved=True,
+            discount_percent=10, promotional_code=f'CODE{i}', resident=resident,
+        )
+        for i, resident in zip(numbers, residents)
+    ])
+    UserPromotion.objects.bulk_create([UserPromotion(user=admin, promotion=promotion) for promotion in promotions])
+
+    Event.objects.bulk_create([
+        Event(
+            title=f'Мероприятие {i}', description='Описание', info='Подробности', location='Двор',
+            # Половина мероприятий идёт сегодня, половина — через неделю
+            start_date=now - timedelta(hours=1) if i % 2 else now + timedelta(days=7),
+            end_date=now + timedelta(hours=1) if i % 2 else now + timedelta(days=8),
+            photo='events/photos/event.png',
+        )
+        for i in numbers
+    ])
+
+    question_types = QuestionType.objects.bulk_create([
+        QuestionType(name=f'Тип вопроса {i}', description='Описание') for i in numbers
+    ])
+    FAQ.objects.bulk_create([
+        FAQ(question=f'Вопрос {i}?', answer='Ответ', type=question_type)
+        for i, question_type in zip(numbers, question_types)
+    ])
+
+    stages = list(Stage.objects.all())
+    avatars = Avatar.objects.bulk_create([Avatar(name=f'Аватар {i}', description='Описание') for i in numbers])
+    AvatarStage.objects.bulk_create([
+        AvatarStage(avatar=avatar, stage=stage, default_img='avatars/photos/avatar.png')
+        for avatar in avatars for stage in stages
+    ])
+    # Активный аватар один — первый из самой первой пачки
+    has_active = UserAvatarProgress.objects.filter(user=admin, is_active=True).exists()
+    UserAvatarProgress.objects.bulk_create([
+        UserAvatarProgress(user=admin, avatar=avatar, current_stage=stages[0], is_active=not has_active and k == 0)
+        for k, avatar in enumerate(avatars)
+    ])
+    active = UserAvatarProgress.objects.get(user=admin, is_active=True)
+    active_stage = AvatarStage.objects.get(avatar=active.avatar, stage=active.current_stage)
+    outfits = AvatarOutfit.objects.bulk_create([
+        AvatarOutfit(avatar_stage=active_stage, outfit='avatars/clothes/previews/outfit.png', price=i,
+                     custom_img='avatars/clothes/avatar_images/outfit.png')
+        for i in numbers
+    ])
+    OutfitPurchase.objects.bulk_create([OutfitPurchase(user=admin, outfit=outfit) for outfit in outfits[::2]])
+
+
+@override_settings(BOT_API_KEY=BOT_API_KEY)
+class EndpointQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PointsSystemSettings.objects.create(points_per_100_rubles=5, points_per_1_percent=10, new_user_points=0)
+        Stage.objects.bulk_create([
+            Stage(name=f'Стадия {i}', description='Описание', required_spending=i * 1000) for i in range(3)
+        ])
+
+        cls.admin = User.objects.create_user(
+            tg_id=1, first_name='Админ', role=User.Role.DESIGN_ADMIN, phone_number='+79990000000'
+        )
+        LoyaltyCard.objects.create(user=cls.admin, card_number='000 001')
+
+        seed(cls.admin, 1, SMALL_BATCH)
+        cls.resident = Resident.objects.order_by('id').first()
+        cls.tour = Tour.objects.order_by('id').first()
+
+    def setUp(self):
+        self.client = APIClient(HTTP_X_BOT_API_KEY=BOT_API_KEY)
+        self.client.force_authenticate(self.admin)
+
+    def first_location(self):
+        return Location.objects.order_by('id').first()
+
+    def last_location(self):
+        return Location.objects.order_by('id').last()
+
+    def count_queries(self, name):
+        url = reverse(name, kwargs=URL_KWARGS.get(name, lambda test: None)(self))
+        params = QUERY_PARAMS.get(name, lambda test: {})(self)
+        cache.clear()
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        # 405 отдают эндпоинты, отключённые в коде (resident/points-transactions)
+        self.assertIn(response.status_code, (200, 204, 405), f'{name}: {response.status_code}')
+        return len(context)
+
+    def test_every_endpoint_has_budget(self):
+        missing = sorted(set(get_endpoints()) - set(QUERY_BUDGETS))
+        self.assertEqual(missing, [], 'Добавьте бюджет запросов для новых эндпоинтов в QUERY_BUDGETS')
+
+    def test_query_count_does_not_grow_with_data(self):
+        names = [name for name in get_endpoints() if name in QUERY_BUDGETS]
+        small = {name: self.count_queries(name) for name in names}
+
+        seed(self.admin, SMALL_BATCH + 1, EXTRA_BATCH)
+        for name in names:
+            with self.subTest(endpoint=name):
+                large = self.count_queries(name)
+                self.assertEqual(
+                    large, small[name],
+                    f'{name}: {small[name]} запросов на {SMALL_BATCH} объектах и {large} — '
+                    f'на {SMALL_BATCH + EXTRA_BATCH}',
+                )
+                self.assertLessEqual(large, QUERY_BUDGETS[name])
@@ -11,6 +11,12 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from dzavod.checks import require_shared_cache
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dzavod.settings')
 
 application = get_wsgi_application()
+
+# Несколько воркеров gunicorn с локальным кэшем расходятся в версиях данных — не стартуем
+require_shared_cache()
+
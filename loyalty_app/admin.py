@@ -8,19 +8,21 @@ from django.db import models
 
 from .models import LoyaltyCard, PointsTransaction, Promotion, PointsSystemSettings, UserPromotion
 from .forms import LoyaltyCardForm, PointsTransactionForm, PromotionAdminForm, PointsSystemSettingsAdminForm
-from .views import LoyaltyCardViewSet
+from .card_images import get_card_image
+from .tasks import render_card_images
 from avatar_app.models import UserAvatarProgress
 
 User = get_user_model()
 
+RENDER_BATCH_SIZE = 200
+
 
 @staff_member_required
 def admin_card_image_view(request, card_id):
     try:
-        card = LoyaltyCard.objects.get(pk=card_id)
-        viewset = LoyaltyCardViewSet()
-        image = viewset.generate_card_image(card.user, card.card_number)  # Вызываем метод
-        return HttpResponse(image.getvalue(), content_type='image/png')
+        card = LoyaltyCard.objects.select_related('user').get(pk=card_id)
+        _, image = get_card_image(card)
+        return HttpResponse(image, content_type='image/png')
     except LoyaltyCard.DoesNotExist:
         return HttpResponse("Карта не найдена", status=404)
 
@@ -29,7 +31,7 @@ def admin_card_image_view(request, card_id):
 class LoyaltyCardAdmin(admin.ModelAdmin):
     form = LoyaltyCardForm
 
-    list_display = ('card_number', 'user_info', 'created_at')
+    list_display = ('card_number', 'user_info', 'balance', 'created_at')
     list_display_links = ('card_number', 'user_info', 'created_at')
     list_filter = ('created_at',)
     search_fields = (
@@ -39,7 +41,7 @@ class LoyaltyCardAdmin(admin.ModelAdmin):
         'user__user_first_name',
         'user__user_last_name'
     )
-    readonly_fields = ('card_number', 'created_at', 'card_image_preview')
+    readonly_fields = ('card_number', 'balance', 'created_at', 'card_image_preview')
 
     fieldsets = (
         ('Превью карты', {
@@ -47,7 +49,7 @@ class LoyaltyCardAdmin(admin.ModelAdmin):
             'classes': ('wide',)
         }),
         (None, {
-            'fields': ('user', 'user_first_name', 'user_last_name', 'card_number', 'created_at')
+            'fields': ('user', 'user_first_name', 'user_last_name', 'card_number', 'balance', 'created_at')
         }),
     )
 
@@ -75,12 +77,13 @@ class LoyaltyCardAdmin(admin.ModelAdmin):
     card_image_preview.short_description = 'Превью карты'
 
     def regenerate_card_image(self, request, queryset):
-        viewset = LoyaltyCardViewSet()
-        for card in queryset:
-            image = viewset.generate_card_image(card.user, card.card_number)
+        card_ids = list(queryset.values_list('id', flat=True))
+        # Пачками, чтобы большую выборку разобрали несколько воркеров
+        for start in range(0, len(card_ids), RENDER_BATCH_SIZE):
+            render_card_images.delay(card_ids[start:start + RENDER_BATCH_SIZE], force=True)
         self.message_user(
             request,
-            f"Изображения {queryset.count()} карт успешно перегенерированы"
+            f"Перерисовка изображений {len(card_ids)} карт поставлена в очередь"
         )
 
     regenerate_card_image.short_description = 'Перегенерировать изображения карт'
@@ -91,10 +94,9 @@ class LoyaltyCardAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
     def save_model(self, request, obj, form, change):
-        if not change:
-            if not obj.card_number:
-                obj.card_number = obj.generate_card_number()
-            LoyaltyCardViewSet().generate_card_image(obj.user, obj.card_number)
+        # Картинку новой карты отрисует celery-задача из сигнала post_save
+        if not change and not obj.card_number:
+            obj.card_number = obj.generate_card_number()
         super().save_model(request, obj, form, change)
 
     def get_urls(self):
@@ -0,0 +1,167 @@
+"""
+Шрифты и картинки для отрисовки карт лояльности, загруженные один раз на процесс.
+
+Шрифты читаются с диска при первой отрисовке. Логотип и маскот лежат в медиахранилище
+(loyalty_cards/), читаются оттуда через default_storage и хранятся уже уменьшенными RGBA,
+готовыми к вставке. Изменившийся файл загружается заново, а его новая версия попадает в
+ключ кэша картинок карт (card_images), так что карты перерисуются сами.
+
+Время изменения файлов в хранилище — сетевой запрос, поэтому его результат хранится в общем
+кэше ASSET_CHECK_INTERVAL секунд: хранилище опрашивает один процесс, остальные читают готовые
+версии. Полный прогон render_card_images перепроверяет хранилище сразу. Шрифты лежат рядом с
+кодом, их время изменения проверяется локально с тем же интервалом.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFont
+
+logger = logging.getLogger(__name__)
+
+ASSET_CHECK_INTERVAL = 300
+VERSIONS_CACHE_KEY = 'loyalty_app:card_assets:versions'
+FONT_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
+
+# Имя → (файл в FONT_DIR, кегль)
+FONTS = {
+    'large': ('arial.ttf', 40),
+    'medium': ('arial.ttf', 30),
+    'medium_bold': ('arialbd.ttf', 30),
+    'small': ('arial.ttf', 25),
+}
+
+# Имя → (путь в медиахранилище, предельный размер после уменьшения)
+ARTWORK = {
+    'logo': ('loyalty_cards/logo.png', (150, 150)),
+    'mascot': ('loyalty_cards/mascot.png', (200, 200)),
+}
+
+
+class CardAssets:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fonts = None
+        self._font_digest = None
+        self._font_versions = None
+        self._fonts_checked_at = None
+        self._artwork = {}
+        self._versions = {}
+
+    def fonts(self):
+        """{имя: ImageFont} из FONTS; если шрифты не читаются — встроенный шрифт Pillow."""
+        self.refresh()
+        return self._fonts
+
+    def artwork(self, name):
+        """Уменьшенная RGBA-картинка из ARTWORK или None, если файла нет."""
+        self.refresh()
+        return self._artwork.get(name)
+
+    def version(self):
+        """Строка, которая меняется вместе со шрифтами и любым файлом из ARTWORK."""
+        self.refresh()
+        return ','.join([str(self._font_digest)] + [str(self._versions.get(name)) for name in ARTWORK])
+
+    def refresh(self, force=False):
+        versions = None if force else cache.get(VERSIONS_CACHE_KEY)
+        if versions is None:
+            versions = {name: _modified_time(path) for name, (path, _) in ARTWORK.items()}
+            cache.set(VERSIONS_CACHE_KEY, versions, ASSET_CHECK_INTERVAL)
+
+        if not self._is_stale(versions, force):
+            return
+        with self._lock:
+            if not self._is_stale(versions, force):
+                return
+            if self._fonts_due(force):
+                font_versions = _font_versions()
+                if self._fonts is None or font_versions != self._font_versions:
+                    self._fonts, self._font_digest = _load_fonts()
+                    self._font_versions = font_versions
+                self._fonts_checked_at = time.monotonic()
+            for name in self._changed(versions):
+                path, size = ARTWORK[name]
+                modified = versions.get(name)
+                self._artwork[name] = _load_artwork(path, size) if modified is not None else None
+                self._versions[name] = modified
+
+    def clear(self):
+        with self._lock:
+            self._fonts = None
+            self._font_digest = None
+            self._font_versions = None
+            self._fonts_checked_at = None
+            self._artwork = {}
+            self._versions = {}
+        cache.delete(VERSIONS_CACHE_KEY)
+
+    def _is_stale(self, versions, force):
+        return self._fonts_due(force) or bool(self._changed(versions))
+
+    def _fonts_due(self, force):
+        return (
+            force
+            or self._fonts_checked_at is None
+            or time.monotonic() - self._fonts_checked_at >= ASSET_CHECK_INTERVAL
+        )
+
+    def _changed(self, versions):
+        # Файл не менялся или хранилище недоступно (None) — остаётся уже загруженная версия
+        return [
+            name for name in ARTWORK
+            if name not in self._versions or versions.get(name) not in (None, self._versions[name])
+        ]
+
+
+def _font_versions():
+    versions = {}
+    for filename, _ in FONTS.values():
+        try:
+            versions[filename] = os.path.getmtime(os.path.join(FONT_DIR, filename))
+        except OSError:
+            versions[filename] = None
+    return versions
+
+
+def _load_fonts():
+    """({имя: ImageFont}, хэш содержимого файлов) — хэш одинаков на всех серверах с теми же шрифтами."""
+    try:
+        data = {}
+        for filename, _ in FONTS.values():
+            if filename not in data:
+                with open(os.path.join(FONT_DIR, filename), 'rb') as file:
+                    data[filename] = file.read()
+        fonts = {name: ImageFont.truetype(BytesIO(data[filename]), size) for name, (filename, size) in FONTS.items()}
+        digest = hashlib.sha1(b''.join(data[filename] for filename in sorted(data))).hexdigest()[:12]
+        return fonts, digest
+    except Exception as e:
+        logger.warning(f"Failed to load fonts, using default: {e}")
+        return {name: ImageFont.load_default() for name in FONTS}, 'default'
+
+
+def _modified_time(path):
+    try:
+        return default_storage.get_modified_time(path).isoformat()
+    except Exception as e:
+        logger.warning(f"Не удалось проверить {path} в хранилище: {e}")
+        return None
+
+
+def _load_artwork(path, size):
+    try:
+        with default_storage.open(path, 'rb') as file:
+            image = Image.open(file).convert('RGBA')
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        return image
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить {path} из хранилища: {e}")
+        return None
+
+
+card_assets = CardAssets()
@@ -0,0 +1,160 @@
+"""
+Изображения карт лояльности.
+
+Картинка зависит только от номера карты, имени владельца, баланса, версии шаблона
+и версий логотипа с маскотом (card_assets), поэтому готовый PNG кэшируется по хэшу этих данных. Хэш служит и ETag: клиент с актуальной
+картинкой получает 304 Not Modified без отрисовки, а перерисовка происходит только когда
+меняется что-то из исходных данных. При изменении вёрстки карты нужно увеличить
+CARD_TEMPLATE_VERSION — старые картинки перестанут совпадать по ключу и истекут сами.
+
+Картинки заранее отрисовывает задача loyalty_app.tasks.render_card_images: при создании карты,
+изменении баланса и имени владельца. Эндпоинт рисует сам только при промахе кэша, поэтому
+кэш должен быть общим для gunicorn и celery (CACHE_URL).
+"""
+import hashlib
+import json
+from io import BytesIO
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from PIL import Image, ImageDraw
+
+from .card_assets import card_assets
+
+CARD_TEMPLATE_VERSION = 1
+CARD_IMAGE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def card_owner_name(user):
+    """(имя, фамилия) для карты: из анкеты программы лояльности, иначе из Telegram."""
+    first_name = getattr(user, 'user_first_name', None) or getattr(user, 'first_name', 'Не указано')
+    last_name = getattr(user, 'user_last_name', None) or getattr(user, 'last_name', 'Не указано')
+    return first_name, last_name
+
+
+def card_image_inputs(card, user=None):
+    """Всё, от чего зависит картинка карты, в порядке аргументов render_card_image."""
+    first_name, last_name = card_owner_name(user or card.user)
+    return card.card_number, first_name, last_name, card.get_balance()
+
+
+def card_image_etag(inputs):
+    payload = json.dumps([CARD_TEMPLATE_VERSION, card_assets.version(), *inputs], ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def get_card_image(card, user=None, force=False):
+    """(etag, PNG) карты; отрисовка только при промахе кэша или с force=True."""
+    inputs = card_image_inputs(card, user)
+    etag = card_image_etag(inputs)
+    return etag, _cached_image(etag, inputs, force)
+
+
+def prerender_card_images(cards, force=False):
+    """Отрисовывает в кэш картинки карт, которых там ещё нет (с force=True — все). Возвращает число отрисованных."""
+    count = 0
+    for card in cards:
+        inputs = card_image_inputs(card)
+        etag = card_image_etag(inputs)
+        if force or cache.get(_image_key(etag)) is None:
+            _cached_image(etag, inputs, force=True)
+            count += 1
+    return count
+
+
+def _image_key(etag):
+    return f'loyalty_app:card_image:{etag}'
+
+
+def _cached_image(etag, inputs, force=False):
+    key = _image_key(etag)
+    content = None if force else cache.get(key)
+    if content is None:
+        content = render_card_image(*inputs)
+        cache.set(key, content, CARD_IMAGE_TIMEOUT)
+    return content
+
+
+def card_image_response(request, card, user=None):
+    """Ответ с картинкой карты: 304, если у клиента актуальная версия, иначе PNG из кэша."""
+    inputs = card_image_inputs(card, user)
+    etag = card_image_etag(inputs)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(_cached_image(etag, inputs), content_type='image/png')
+
+    response['ETag'] = f'"{etag}"'
+    # Баланс меняется в любой момент, поэтому клиент перепроверяет картинку по ETag при каждом показе
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def render_card_image(card_number, first_name, last_name, balance):
+    """PNG карты лояльности 800×500."""
+    cream_light = (255, 255, 230)
+    img = Image.new('RGB', (800, 500), color=cream_light)
+    draw = ImageDraw.Draw(img)
+
+    fonts = card_assets.fonts()
+    font_large = fonts['large']
+    font_medium = fonts['medium']
+    font_medium_bold = fonts['medium_bold']
+    font_small = fonts['small']
+
+    logo = card_assets.artwork('logo')
+    logo_y = 20
+    logo_x = 30
+    logo_height = 0
+    if logo is not None:
+        logo_height = logo.height
+        img.paste(logo, (logo_x, logo_y), logo)
+
+    logo_title_spacing = 50
+    title_text = "Карта лояльности"
+    bbox_title = draw.textbbox((0, 0), title_text, font=font_large)
+    title_width = bbox_title[2] - bbox_title[0]
+    title_x = (img.width - title_width) // 2
+    title_y = logo_y + logo_height + logo_title_spacing
+    draw.text((title_x, title_y), title_text, font=font_large, fill=(0, 0, 0))
+
+    title_spacing = 50
+    base_y = title_y + bbox_title[3] - bbox_title[1] + title_spacing
+
+    full_name = f"{first_name} {last_name}"
+    line_spacing = 50
+    draw.text((50, base_y), full_name, font=font_medium, fill=(0, 0, 0))
+
+    bbox_name = draw.textbbox((0, 0), full_name, font=font_medium)
+    name_height = bbox_name[3] - bbox_name[1]
+    base_y += name_height + line_spacing
+
+    balance_prefix = "Баланс: "
+    balance_suffix = " бонусов"
+    x_pos = 50
+    draw.text((x_pos, base_y), balance_prefix, font=font_medium, fill=(0, 0, 0))
+    prefix_width = draw.textbbox((0, 0), balance_prefix, font=font_medium)[2]
+    draw.text((x_pos + prefix_width, base_y), str(balance), font=font_medium_bold, fill=(0, 0, 0))
+    balance_width = draw.textbbox((0, 0), str(balance), font=font_medium_bold)[2]
+    draw.text((x_pos + prefix_width + balance_width, base_y), balance_suffix, font=font_medium, fill=(0, 0, 0))
+
+    card_number_text = f"№ {card_number}"
+    bbox_card = draw.textbbox((0, 0), card_number_text, font=font_small)
+    card_width = bbox_card[2] - bbox_card[0]
+    card_height = bbox_card[3] - bbox_card[1]
+    card_x = (img.width - card_width) // 2
+    card_y = img.height - card_height - 20
+    draw.text((card_x, card_y), card_number_text, font=font_small, fill=(0, 0, 0))
+
+    mascot = card_assets.artwork('mascot')
+    if mascot is not None:
+        mascot_width, mascot_height = mascot.size
+        mascot_x = img.width - mascot_width - 20
+        mascot_y = img.height - mascot_height - 20
+        img.paste(mascot, (mascot_x, mascot_y), mascot)
+
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_balances(apps, schema_editor):
+    LoyaltyCard = apps.get_model('loyalty_app', 'LoyaltyCard')
+    PointsTransaction = apps.get_model('loyalty_app', 'PointsTransaction')
+    totals = (
+        PointsTransaction.objects.filter(card_id=OuterRef('pk'))
+        .order_by().values('card_id').annotate(total=Sum('points')).values('total')
+    )
+    LoyaltyCard.objects.update(balance=Coalesce(Subquery(totals), Value(0)))
+
+
+def schedule_reconciliation(apps, schema_editor):
+    CrontabSchedule = apps.get_model('django_celery_beat', 'CrontabSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute='30', hour='3', day_of_week='*', day_of_month='*', month_of_year='*', timezone='Europe/Moscow'
+    )
+    PeriodicTask.objects.get_or_create(
+        name='Сверка балансов карт лояльности',
+        defaults={'task': 'loyalty_app.tasks.reconcile_card_balances', 'crontab': schedule},
+    )
+
+
+def unschedule_reconciliation(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task='loyalty_app.tasks.reconcile_card_balances').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty_app', '0010_alter_promotion_photo'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loyaltycard',
+            name='balance',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Баланс'),
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+        migrations.RunPython(schedule_reconciliation, unschedule_reconciliation),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty_app', '0011_loyaltycard_balance'),
+        ('resident_app', '0007_alter_resident_photo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointstransaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.AddField(
+            model_name='pointstransaction',
+            name='operation',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Операция'),
+        ),
+        migrations.AddConstraint(
+            model_name='pointstransaction',
+            constraint=models.UniqueConstraint(fields=('card_id', 'idempotency_key'), name='unique_card_idempotency_key'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import random
 import string
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from dzavod import settings
 from resident_app.models import Resident
 from dzavod.validators import validate_image
@@ -13,6 +14,9 @@ class LoyaltyCard(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='loyalty_card', verbose_name='Пользователь')
     card_number = models.CharField(max_length=15, unique=True, verbose_name='Номер карты')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    # Сумма бонусов по всем транзакциям карты; меняется вместе с записью транзакции,
+    # расхождения с суммой транзакций исправляет ночная сверка (points.reconcile_balances)
+    balance = models.IntegerField(default=0, editable=False, verbose_name='Баланс')
 
     class Meta:
         verbose_name = 'Карта лояльности'
@@ -22,7 +26,13 @@ class LoyaltyCard(models.Model):
         return f'Карта {self.card_number} ({self.user})'
     
     def get_balance(self):
-        return PointsTransaction.objects.filter(card_id=self.id).aggregate(total=models.Sum('points'))['total'] or 0
+        """Баланс на момент загрузки карты из базы или последнего refresh_from_db(fields=['balance'])."""
+        return self.balance
+
+    @staticmethod
+    def add_to_balance(card_id, points):
+        if points:
+            LoyaltyCard.objects.filter(pk=card_id).update(balance=F('balance') + points)
 
     def generate_card_number(self):
         while True:
@@ -34,6 +44,13 @@ class LoyaltyCard(models.Model):
     def save(self, *args, **kwargs):
         if not self.card_number:
             self.card_number = self.generate_card_number()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Баланс меняет только add_to_balance; сохранение карты из формы или админки
+            # не должно записать обратно значение, прочитанное до новой транзакции
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'balance'
+            ]
         super().save(*args, **kwargs)
 
 
@@ -51,13 +68,34 @@ class PointsTransaction(models.Model):
 
     card_id = models.ForeignKey(LoyaltyCard, on_delete=models.CASCADE, related_name='transactions', verbose_name='Карта лояльности')
     resident_id = models.ForeignKey(Resident, on_delete=models.CASCADE, related_name='transactions', verbose_name='Резидент', null=True, blank=True)
+    # Ключ идемпотентности от клиента: повтор запроса с тем же ключом не списывает бонусы ещё раз
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False, verbose_name='Ключ идемпотентности')
+    # Что оплачено этим списанием (например, outfit:12 или promo:3) — ключ нельзя переиспользовать для другой покупки
+    operation = models.CharField(max_length=64, null=True, blank=True, editable=False, verbose_name='Операция')
 
     class Meta:
         verbose_name = 'Транзакция бонусов'
         verbose_name_plural = 'Транзакции бонусов'
+        constraints = [
+            models.UniqueConstraint(fields=['card_id', 'idempotency_key'], name='unique_card_idempotency_key'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type.capitalize()} {self.points} бонусов"
+
+    def save(self, *args, **kwargs):
+        # Транзакция и изменение баланса карты сохраняются вместе или не сохраняются вовсе
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = PointsTransaction.objects.filter(pk=self.pk).values_list('card_id', 'points').first()
+            super().save(*args, **kwargs)
+            if previous:
+                LoyaltyCard.add_to_balance(previous[0], -previous[1])
+            LoyaltyCard.add_to_balance(self.card_id_id, self.points)
+        if PointsTransaction.card_id.is_cached(self):
+            # Карта, переданная в транзакцию (например, только что созданная в get_or_create), видит новый баланс
+            self.card_id.refresh_from_db(fields=['balance'])
     
 
 class PointsSystemSettings(models.Model):
@@ -97,10 +135,14 @@ class Promotion(models.Model):
         super().__init__(*args, **kwargs)
         self._original_is_approved = self.is_approved
 
-    def percent_equals_points(self):
-        """Возвращает процент скидки и количество бонусов."""
+    def percent_equals_points(self, settings_instance=None):
+        """
+        Возвращает процент скидки и количество бонусов.
+        settings_instance — уже загруженные настройки, чтобы список акций не читал их для каждой.
+        """
         try:
-            settings_instance = PointsSystemSettings.objects.first()
+            if settings_instance is None:
+                settings_instance = PointsSystemSettings.objects.first()
             if settings_instance:
                 points = round(float(self.discount_percent) * settings_instance.points_per_1_percent)
                 return f"{self.discount_percent}% = {points} бонусов"
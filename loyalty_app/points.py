@@ -0,0 +1,100 @@
+"""
+Баланс бонусов карты.
+
+LoyaltyCard.balance хранит сумму транзакций карты и меняется в одной транзакции БД
+с записью PointsTransaction, поэтому чтение баланса не зависит от длины истории.
+Записи в обход save() (bulk_create, update по queryset, правки в базе руками) баланс
+не трогают — их догоняет сверка reconcile_balances, которая раз в сутки запускается задачей
+loyalty_app.tasks.reconcile_card_balances.
+
+Списания идут только через spend_points: проверка баланса и запись транзакции выполняются
+под блокировкой строки карты, поэтому параллельные покупки не уводят баланс в минус.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import LoyaltyCard, PointsTransaction
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором клиент передаёт ключ идемпотентности списания
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class InsufficientPoints(Exception):
+    def __init__(self, balance, required):
+        super().__init__(f'Недостаточно бонусов. Баланс: {balance}, требуется: {required}')
+        self.balance = balance
+        self.required = required
+
+
+class IdempotencyConflict(Exception):
+    """Ключ идемпотентности уже использован для другой операции или суммы."""
+
+
+def spend_points(card_id, points, idempotency_key=None, operation=None, **fields):
+    """
+    Списывает points бонусов с карты и возвращает (транзакция, создана ли она сейчас).
+
+    Карта блокируется (select_for_update) до конца внешней транзакции, поэтому покупку,
+    ради которой списываются бонусы, нужно записывать в том же transaction.atomic():
+    тогда её ошибка откатит и списание. operation — что оплачивается (outfit:<id>, promo:<id>).
+    Повтор с тем же idempotency_key и той же операцией возвращает уже созданную транзакцию,
+    ничего не списывая: покупку при этом создавать не нужно. Ключ, уже потраченный на другую
+    операцию или сумму, — IdempotencyConflict. fields — остальные поля транзакции (price, resident_id).
+    Нехватка бонусов — InsufficientPoints.
+    """
+    with transaction.atomic():
+        card = LoyaltyCard.objects.select_for_update().get(pk=card_id)
+        if idempotency_key:
+            existing = PointsTransaction.objects.filter(card_id=card, idempotency_key=idempotency_key).first()
+            if existing:
+                if existing.operation != operation or existing.points != -points:
+                    raise IdempotencyConflict(f'{IDEMPOTENCY_HEADER} уже использован для другой покупки.')
+                return existing, False
+        if card.balance < points:
+            raise InsufficientPoints(card.balance, points)
+        fields.setdefault('price', 0.0)
+        debit = PointsTransaction.objects.create(
+            points=-points, transaction_type='списание', card_id=card,
+            idempotency_key=idempotency_key, operation=operation, **fields
+        )
+        return debit, True
+
+
+def transactions_total():
+    """Сумма бонусов по транзакциям карты для аннотации queryset карт."""
+    totals = (
+        PointsTransaction.objects.filter(card_id=OuterRef('pk'))
+        .order_by().values('card_id').annotate(total=Sum('points')).values('total')
+    )
+    return Coalesce(Subquery(totals), Value(0))
+
+
+def reconcile_balances(cards=None):
+    """
+    Сверяет баланс карт с суммой их транзакций и исправляет расхождения.
+    cards — queryset карт (по умолчанию все). Возвращает число исправленных карт.
+    """
+    cards = LoyaltyCard.objects.all() if cards is None else cards
+    mismatched = list(
+        cards.annotate(total=transactions_total()).exclude(balance=F('total')).values_list('id', flat=True)
+    )
+
+    fixed = 0
+    for card_id in mismatched:
+        # Сумма пересчитывается под блокировкой карты, чтобы не затереть параллельное изменение
+        with transaction.atomic():
+            card = LoyaltyCard.objects.select_for_update().filter(pk=card_id).first()
+            if card is None:
+                continue
+            total = card.transactions.aggregate(total=Sum('points'))['total'] or 0
+            if card.balance == total:
+                continue
+            logger.warning(f"Баланс карты {card.card_number} расходится с транзакциями: {card.balance} != {total}")
+            LoyaltyCard.objects.filter(pk=card_id).update(balance=total)
+            fixed += 1
+    return fixed
@@ -1,5 +1,6 @@
 import datetime
 import re
+from functools import cached_property
 
 from rest_framework import serializers
 from .models import LoyaltyCard, PointsTransaction, Promotion, UserPromotion, PointsSystemSettings
@@ -46,8 +47,13 @@ class PromotionSerializer(serializers.ModelSerializer):
         model = Promotion
         fields = '__all__'
 
+    @cached_property
+    def points_settings(self):
+        # В списке дочерний сериализатор общий, поэтому настройки читаются один раз
+        return PointsSystemSettings.objects.first()
+
     def get_percent_equals_points(self, obj):
-        return obj.percent_equals_points()
+        return obj.percent_equals_points(self.points_settings)
     
     def validate(self, data):
         start = data.get('start_date')
@@ -118,8 +124,12 @@ class UserPromotionDisplaySerializer(serializers.ModelSerializer):
             'percent_equals_points',
         ]
 
+    @cached_property
+    def points_settings(self):
+        return PointsSystemSettings.objects.first()
+
     def get_percent_equals_points(self, obj):
-        return obj.promotion.percent_equals_points()
+        return obj.promotion.percent_equals_points(self.points_settings)
     
 
 class PointsSystemSettingsSerializer(serializers.ModelSerializer):
@@ -1,6 +1,10 @@
 import logging
-from django.db.models.signals import post_save, pre_save
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from .card_images import card_owner_name
 from .models import Promotion, LoyaltyCard, PointsSystemSettings, PointsTransaction
 from user_app.models import User
 from mailing_app.models import Subscription, Mailing
@@ -31,6 +35,52 @@ def accrue_new_user_points(sender, instance, created, **kwargs):
         resident_id = None,
     )
 
+# Удаление транзакции (в том числе массовое из админки) откатывает её вклад в баланс карты
+@receiver(post_delete, sender=PointsTransaction)
+def subtract_deleted_transaction(sender, instance, **kwargs):
+    LoyaltyCard.add_to_balance(instance.card_id_id, -instance.points)
+
+# Картинки карт: перерисовываются в celery после коммита, когда меняется что-то на карте
+
+def _render_card_images_on_commit(card_ids):
+    from .tasks import render_card_images
+    card_ids = [card_id for card_id in card_ids if card_id is not None]
+    if card_ids:
+        transaction.on_commit(lambda: render_card_images.delay(card_ids))
+
+
+@receiver(post_save, sender=LoyaltyCard)
+def render_new_card_image(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        _render_card_images_on_commit([instance.id])
+
+
+@receiver(post_save, sender=PointsTransaction)
+@receiver(post_delete, sender=PointsTransaction)
+def render_card_image_on_balance_change(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        _render_card_images_on_commit([instance.card_id_id])
+
+
+@receiver(pre_save, sender=User)
+def remember_card_owner_name(sender, instance, **kwargs):
+    instance._old_card_owner = None
+    if instance.pk:
+        old = User.objects.filter(pk=instance.pk).values(
+            'first_name', 'last_name', 'user_first_name', 'user_last_name', 'loyalty_card__id'
+        ).first()
+        if old and old['loyalty_card__id'] is not None:
+            card_id = old.pop('loyalty_card__id')
+            instance._old_card_owner = (card_owner_name(SimpleNamespace(**old)), card_id)
+
+
+@receiver(post_save, sender=User)
+def render_card_image_on_name_change(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_card_owner', None)
+    if old and card_owner_name(instance) != old[0]:
+        _render_card_images_on_commit([old[1]])
+
+
 # Отправляет уведомление всем админам 
 @receiver(post_save, sender=Promotion)
 def send_promotion_to_admin(sender, instance, created, **kwargs):
@@ -1,6 +1,9 @@
 from celery import shared_task
 from django.utils import timezone
-from .models import Promotion
+from .card_assets import card_assets
+from .card_images import prerender_card_images
+from .models import LoyaltyCard, Promotion
+from .points import reconcile_balances
 
 @shared_task
 def delete_expired_promotions():
@@ -8,4 +11,22 @@ def delete_expired_promotions():
     expired = Promotion.objects.filter(end_date__lt=now)
     count = expired.count()
     expired.delete()
-    return f"Удалено {count} акций"
\ No newline at end of file
+    return f"Удалено {count} акций"
+
+@shared_task
+def reconcile_card_balances():
+    count = reconcile_balances()
+    return f"Исправлено {count} балансов"
+
+
+@shared_task
+def render_card_images(card_ids=None, force=False):
+    """Картинки карт в кэш: по id карт или (без аргументов) всех карт сразу."""
+    # Полный прогон — после замены логотипа или шрифтов: сверяем их с источниками сразу,
+    # не дожидаясь ASSET_CHECK_INTERVAL
+    card_assets.refresh(force=card_ids is None)
+    cards = LoyaltyCard.objects.select_related('user').order_by('id')
+    if card_ids is not None:
+        cards = cards.filter(id__in=card_ids)
+    count = prerender_card_images(cards.iterator(chunk_size=500), force=force)
+    return f"Отрисовано {count} карт"
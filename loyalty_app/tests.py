@@ -1,3 +1,373 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import card_assets as card_assets_module
+from .card_assets import card_assets
+from .card_images import card_image_inputs
+from .forms import LoyaltyCardForm
+from .models import LoyaltyCard, PointsSystemSettings, PointsTransaction
+from .points import IdempotencyConflict, InsufficientPoints, reconcile_balances, spend_points
+from .tasks import render_card_images
+
+User = get_user_model()
+
+
+class CardBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(tg_id=1001, username='user1001')
+        # bulk_create — без сигнала с бонусами за регистрацию
+        cls.card = LoyaltyCard.objects.bulk_create([LoyaltyCard(user=user, card_number='100 001')])[0]
+
+    def _transaction(self, points):
+        return PointsTransaction.objects.create(
+            points=points, price=0.0, transaction_type='начисление' if points > 0 else 'списание', card_id=self.card
+        )
+
+    def _balance(self):
+        return LoyaltyCard.objects.get(pk=self.card.pk).get_balance()
+
+    def test_balance_follows_transactions(self):
+        self._transaction(100)
+        debit = self._transaction(-30)
+        self.assertEqual(self._balance(), 70)
+
+        debit.points = -50
+        debit.save()
+        self.assertEqual(self._balance(), 50)
+
+        debit.delete()
+        self.assertEqual(self._balance(), 100)
+
+        self._transaction(20)
+        PointsTransaction.objects.filter(points=20).delete()
+        self.assertEqual(self._balance(), 100)
+
+    def test_balance_read_does_not_depend_on_history(self):
+        PointsTransaction.objects.bulk_create([
+            PointsTransaction(points=1, price=0.0, transaction_type='начисление', card_id=self.card)
+            for _ in range(50)
+        ])
+        card = LoyaltyCard.objects.get(pk=self.card.pk)
+        with self.assertNumQueries(0):
+            card.get_balance()
+
+    def test_reconcile_fixes_drift(self):
+        self._transaction(100)
+        # Записи в обход save() баланс не меняют — их догоняет сверка
+        PointsTransaction.objects.bulk_create([
+            PointsTransaction(points=5, price=0.0, transaction_type='начисление', card_id=self.card)
+        ])
+        self.assertEqual(self._balance(), 100)
+
+        self.assertEqual(reconcile_balances(), 1)
+        self.assertEqual(self._balance(), 105)
+        self.assertEqual(reconcile_balances(), 0)
+
+    def test_stale_card_save_keeps_balance(self):
+        stale = LoyaltyCard.objects.get(pk=self.card.pk)
+        self._transaction(40)
+
+        stale.save()
+        form = LoyaltyCardForm(
+            data={'user': stale.user_id, 'card_number': '100 002', 'user_first_name': 'Иван', 'user_last_name': ''},
+            instance=stale,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(self._balance(), 40)
+
+    def test_new_card_sees_welcome_points(self):
+        PointsSystemSettings.objects.create(new_user_points=50)
+        user = User.objects.create_user(tg_id=1002, username='user1002')
+
+        card, created = LoyaltyCard.objects.get_or_create(user=user)
+        self.assertTrue(created)
+        self.assertEqual(card.get_balance(), 50)
+        self.assertEqual(card_image_inputs(card, user)[-1], 50)
+
+
+class SpendPointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(tg_id=2001, username='user2001')
+        cls.card = LoyaltyCard.objects.bulk_create([LoyaltyCard(user=user, card_number='200 001')])[0]
+        PointsTransaction.objects.create(points=100, price=0.0, transaction_type='начисление', card_id=cls.card)
+
+    def _balance(self):
+        return LoyaltyCard.objects.get(pk=self.card.pk).balance
+
+    def test_spend_is_idempotent(self):
+        first, created = spend_points(self.card.id, 30, idempotency_key='order-1')
+        self.assertTrue(created)
+        self.assertEqual(first.points, -30)
+
+        again, created = spend_points(self.card.id, 30, idempotency_key='order-1')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(self._balance(), 70)
+
+    def test_key_reused_for_other_purchase(self):
+        spend_points(self.card.id, 30, idempotency_key='order-2', operation='outfit:1')
+        for points, operation in ((30, 'outfit:2'), (10, 'outfit:1')):
+            with self.assertRaises(IdempotencyConflict):
+                spend_points(self.card.id, points, idempotency_key='order-2', operation=operation)
+        self.assertEqual(self._balance(), 70)
+
+    def test_insufficient_points(self):
+        with self.assertRaises(InsufficientPoints) as error:
+            spend_points(self.card.id, 101)
+        self.assertEqual((error.exception.balance, error.exception.required), (100, 101))
+        self.assertEqual(self._balance(), 100)
+
+
+class ConcurrentSpendTests(TransactionTestCase):
+    """Параллельные покупки из разных потоков с отдельными соединениями к базе."""
+    PURCHASES = 12
+    PRICE = 30
+    INITIAL = 100
+
+    def setUp(self):
+        # После коммита списания ставится перерисовка картинки карты — брокер здесь не нужен
+        patcher = mock.patch('loyalty_app.tasks.render_card_images.delay')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(tg_id=3001, username='user3001')
+        self.card = LoyaltyCard.objects.bulk_create([LoyaltyCard(user=user, card_number='300 001')])[0]
+        PointsTransaction.objects.create(points=self.INITIAL, price=0.0, transaction_type='начисление', card_id=self.card)
+
+    def _purchase(self, barrier, key):
+        barrier.wait()
+        try:
+            for _ in range(200):
+                try:
+                    _, created = spend_points(self.card.id, self.PRICE, idempotency_key=key)
+                    return 'spent' if created else 'replayed'
+                except InsufficientPoints:
+                    return 'insufficient'
+                except OperationalError:
+                    # SQLite не ждёт чужую блокировку, а сразу отказывает — клиент повторяет запрос
+                    time.sleep(0.01)
+            return 'failed'
+        finally:
+            connection.close()
+
+    def _run(self, keys):
+        barrier = threading.Barrier(len(keys))
+        with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+            return list(pool.map(lambda key: self._purchase(barrier, key), keys))
+
+    def _check_consistent(self, results):
+        card = LoyaltyCard.objects.get(pk=self.card.pk)
+        total = sum(PointsTransaction.objects.filter(card_id=card).values_list('points', flat=True))
+        self.assertGreaterEqual(card.balance, 0)
+        self.assertEqual(card.balance, total)
+        self.assertEqual(card.balance, self.INITIAL - self.PRICE * results.count('spent'))
+        return card.balance
+
+    def test_parallel_purchases_never_overspend(self):
+        results = self._run([f'order-{i}' for i in range(self.PURCHASES)])
+        self.assertEqual(results.count('spent'), self.INITIAL // self.PRICE)
+        self.assertEqual(results.count('insufficient'), self.PURCHASES - self.INITIAL // self.PRICE)
+        self._check_consistent(results)
+
+    def test_parallel_retries_spend_once(self):
+        results = self._run(['same-order'] * self.PURCHASES)
+        self.assertEqual(sorted(results), ['replayed'] * (self.PURCHASES - 1) + ['spent'])
+        self.assertEqual(PointsTransaction.objects.filter(idempotency_key='same-order').count(), 1)
+        self.assertEqual(self._check_consistent(results), self.INITIAL - self.PRICE)
+
+
+# Логотип и маскот читаются из медиахранилища — в тестах оно в памяти
+IN_MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def clear_artwork():
+    for path, _ in card_assets_module.ARTWORK.values():
+        default_storage.delete(path)
+    card_assets.clear()
+
+
+def png(size, color):
+    buffer = BytesIO()
+    Image.new('RGBA', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@override_settings(BOT_API_KEY='test-bot-key', STORAGES=IN_MEMORY_STORAGES)
+class CardImageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=4001, username='user4001', first_name='Иван', last_name='Петров')
+        cls.card = LoyaltyCard.objects.bulk_create([LoyaltyCard(user=cls.user, card_number='400 001')])[0]
+        cls.url = f'/api/loyalty-cards/{cls.user.tg_id}/card-image/'
+
+    def setUp(self):
+        cache.clear()
+        clear_artwork()
+        self.client = APIClient(HTTP_X_BOT_API_KEY='test-bot-key')
+        # Настоящая отрисовка ходит за логотипом по сети — здесь важен только факт вызова
+        patcher = mock.patch('loyalty_app.card_images.render_card_image', return_value=b'png')
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_image_is_rendered_once_and_revalidated_by_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, b'png')
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        second = self.client.get(self.url)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.render.call_count, 1)
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_balance_change_renders_new_image(self):
+        etag = self.client.get(self.url)['ETag']
+        PointsTransaction.objects.create(points=10, price=0.0, transaction_type='начисление', card_id=self.card)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.render.call_count, 2)
+        self.assertEqual(self.render.call_args.args, ('400 001', 'Иван', 'Петров', 10))
+
+    def test_new_logo_renders_new_image(self):
+        etag = self.client.get(self.url)['ETag']
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((10, 10), 'red')))
+        card_assets.refresh(force=True)
+
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+        self.assertEqual(self.render.call_count, 2)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class CardAssetsTests(TestCase):
+    def setUp(self):
+        clear_artwork()
+        self.addCleanup(clear_artwork)
+
+    def test_artwork_is_loaded_once_and_resized(self):
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((600, 300), 'red')))
+        with mock.patch('loyalty_app.card_assets._load_artwork', wraps=card_assets_module._load_artwork) as load:
+            logo = card_assets.artwork('logo')
+            self.assertIs(card_assets.artwork('logo'), logo)
+        self.assertEqual((logo.mode, logo.size), ('RGBA', (150, 75)))
+        self.assertEqual(load.call_count, 1)
+        self.assertIsNone(card_assets.artwork('mascot'))
+        self.assertIs(card_assets.fonts(), card_assets.fonts())
+
+    def test_changed_file_is_reloaded(self):
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((10, 10), 'red')))
+        version = card_assets.version()
+
+        default_storage.delete('loyalty_cards/logo.png')
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((20, 20), 'blue')))
+        # Без force перепроверка ждёт ASSET_CHECK_INTERVAL
+        self.assertEqual(card_assets.artwork('logo').size, (10, 10))
+
+        card_assets.refresh(force=True)
+        self.assertEqual(card_assets.artwork('logo').size, (20, 20))
+        self.assertNotEqual(card_assets.version(), version)
+
+    def test_storage_is_checked_once_for_all_processes(self):
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((10, 10), 'red')))
+        # Второй экземпляр — как другой процесс gunicorn с тем же общим кэшем
+        other = card_assets_module.CardAssets()
+        with mock.patch('loyalty_app.card_assets._modified_time',
+                        wraps=card_assets_module._modified_time) as modified_time:
+            card_assets.artwork('logo')
+            self.assertEqual(other.version(), card_assets.version())
+            other.artwork('logo')
+        self.assertEqual(modified_time.call_count, len(card_assets_module.ARTWORK))
+
+    def test_fonts_are_reloaded_when_files_change(self):
+        with mock.patch('loyalty_app.card_assets._font_versions', return_value={'arial.ttf': 1}):
+            fonts = card_assets.fonts()
+        with mock.patch('loyalty_app.card_assets._font_versions', return_value={'arial.ttf': 2}), \
+                mock.patch('loyalty_app.card_assets._load_fonts', return_value=({}, 'new')) as load:
+            self.assertIs(card_assets.fonts(), fonts)
+            card_assets.refresh(force=True)
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual(card_assets.version().split(',')[0], 'new')
+
+    def test_full_render_picks_up_new_artwork(self):
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((10, 10), 'red')))
+        card_assets.artwork('logo')
+        default_storage.delete('loyalty_cards/logo.png')
+        default_storage.save('loyalty_cards/logo.png', ContentFile(png((20, 20), 'blue')))
+
+        with mock.patch('loyalty_app.card_images.render_card_image', return_value=b'png'):
+            render_card_images()
+        self.assertEqual(card_assets.artwork('logo').size, (20, 20))
+
+
+@override_settings(BOT_API_KEY='test-bot-key', STORAGES=IN_MEMORY_STORAGES)
+class CardImagePrerenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=5001, username='user5001', first_name='Анна', last_name='Смирнова')
+        cls.card = LoyaltyCard.objects.bulk_create([LoyaltyCard(user=cls.user, card_number='500 001')])[0]
+
+    def setUp(self):
+        cache.clear()
+        clear_artwork()
+        patcher = mock.patch('loyalty_app.card_images.render_card_image', return_value=b'png')
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enqueued(self, action):
+        with mock.patch('loyalty_app.tasks.render_card_images.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+        return [call.args[0] for call in delay.call_args_list]
+
+    def test_render_is_enqueued_when_card_inputs_change(self):
+        accrual = lambda: PointsTransaction.objects.create(
+            points=10, price=100.0, transaction_type='начисление', card_id=self.card
+        )
+        self.assertEqual(self._enqueued(accrual), [[self.card.id]])
+
+        def rename():
+            self.user.user_first_name = 'Аня'
+            self.user.save()
+        self.assertEqual(self._enqueued(rename), [[self.card.id]])
+
+        def touch():
+            self.user.username = 'user5001-new'
+            self.user.save()
+        self.assertEqual(self._enqueued(touch), [])
+
+    def test_endpoint_serves_prerendered_image(self):
+        render_card_images([self.card.id])
+        self.assertEqual(self.render.call_count, 1)
+        # Повторный прогон задачи без изменений ничего не перерисовывает
+        render_card_images([self.card.id])
+        self.assertEqual(self.render.call_count, 1)
+
+        client = APIClient(HTTP_X_BOT_API_KEY='test-bot-key')
+        response = client.get(f'/api/loyalty-cards/{self.user.tg_id}/card-image/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.render.call_count, 1)
+
+        render_card_images([self.card.id], force=True)
+        self.assertEqual(self.render.call_count, 2)
@@ -1,11 +1,5 @@
-from datetime import timezone
-
-import requests
-from django.conf import settings
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
-import os
-from django.http import HttpResponse
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -13,7 +7,9 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from user_app.auth.permissions import IsBotAuthenticated, IsAdmin
 from user_app.serializers import UserSerializer
+from .card_images import card_image_response
 from .models import LoyaltyCard, PointsTransaction, Promotion, PointsSystemSettings
+from .points import IDEMPOTENCY_HEADER, IdempotencyConflict, InsufficientPoints, spend_points
 from resident_app.models import Resident
 from .serializers import PointsTransactionSerializer, PromotionSerializer, UserPromotionSerializer, PointsSystemSettingsSerializer
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse, OpenApiTypes, OpenApiExample
@@ -38,97 +34,6 @@ class LoyaltyCardViewSet(viewsets.ViewSet):
             return 0
         return card.get_balance()
 
-    def generate_card_image(self, user, card_number):
-        cream_light = (255, 255, 230)
-        img = Image.new('RGB', (800, 500), color=cream_light)
-        draw = ImageDraw.Draw(img)
-
-        try:
-            font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'arial.ttf')
-            font_bold_path = os.path.join(os.path.dirname(__file__), 'fonts', 'arialbd.ttf')
-            font_large = ImageFont.truetype(font_path, 40)
-            font_medium = ImageFont.truetype(font_path, 30)
-            font_medium_bold = ImageFont.truetype(font_bold_path, 30)
-            font_small = ImageFont.truetype(font_path, 25)
-        except Exception as e:
-            logger.warning(f"Failed to load fonts, using default: {e}")
-            font_large = ImageFont.load_default()
-            font_medium = ImageFont.load_default()
-            font_medium_bold = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-
-        logo_url = f"{settings.MEDIA_URL}loyalty_cards/logo.png"
-        logo_y = 20
-        logo_x = 30
-        logo_height = 0
-        try:
-            response = requests.get(logo_url, timeout=5)
-            response.raise_for_status()  # Проверяем, что запрос успешен
-            logo = Image.open(BytesIO(response.content)).convert("RGBA")
-            logo.thumbnail((150, 150), Image.Resampling.LANCZOS)
-            logo_height = logo.height
-            img.paste(logo, (logo_x, logo_y), logo)
-        except Exception as e:
-            logger.warning(f"Не удалось загрузить логотип из {logo_url}: {e}")
-
-        first_name = getattr(user, 'user_first_name', None) or getattr(user, 'first_name', 'Не указано')
-        last_name = getattr(user, 'user_last_name', None) or getattr(user, 'last_name', 'Не указано')
-        balance = self.get_balance(user)
-
-        logo_title_spacing = 50
-        title_text = "Карта лояльности"
-        bbox_title = draw.textbbox((0, 0), title_text, font=font_large)
-        title_width = bbox_title[2] - bbox_title[0]
-        title_x = (img.width - title_width) // 2
-        title_y = logo_y + logo_height + logo_title_spacing
-        draw.text((title_x, title_y), title_text, font=font_large, fill=(0, 0, 0))
-
-        title_spacing = 50
-        base_y = title_y + bbox_title[3] - bbox_title[1] + title_spacing
-
-        full_name = f"{first_name} {last_name}"
-        line_spacing = 50
-        draw.text((50, base_y), full_name, font=font_medium, fill=(0, 0, 0))
-
-        bbox_name = draw.textbbox((0, 0), full_name, font=font_medium)
-        name_height = bbox_name[3] - bbox_name[1]
-        base_y += name_height + line_spacing
-
-        balance_prefix = "Баланс: "
-        balance_suffix = " бонусов"
-        x_pos = 50
-        draw.text((x_pos, base_y), balance_prefix, font=font_medium, fill=(0, 0, 0))
-        prefix_width = draw.textbbox((0, 0), balance_prefix, font=font_medium)[2]
-        draw.text((x_pos + prefix_width, base_y), str(balance), font=font_medium_bold, fill=(0, 0, 0))
-        balance_width = draw.textbbox((0, 0), str(balance), font=font_medium_bold)[2]
-        draw.text((x_pos + prefix_width + balance_width, base_y), balance_suffix, font=font_medium, fill=(0, 0, 0))
-
-        card_number_text = f"№ {card_number}"
-        bbox_card = draw.textbbox((0, 0), card_number_text, font=font_small)
-        card_width = bbox_card[2] - bbox_card[0]
-        card_height = bbox_card[3] - bbox_card[1]
-        card_x = (img.width - card_width) // 2
-        card_y = img.height - card_height - 20
-        draw.text((card_x, card_y), card_number_text, font=font_small, fill=(0, 0, 0))
-
-        mascot_url = f"{settings.MEDIA_URL}loyalty_cards/mascot.png"  # Публичный URL
-        try:
-            response = requests.get(mascot_url, timeout=5)
-            response.raise_for_status()
-            mascot = Image.open(BytesIO(response.content)).convert("RGBA")
-            mascot.thumbnail((200, 200), Image.Resampling.LANCZOS)
-            mascot_width, mascot_height = mascot.size
-            mascot_x = img.width - mascot_width - 20
-            mascot_y = img.height - mascot_height - 20
-            img.paste(mascot, (mascot_x, mascot_y), mascot)
-        except Exception as e:
-            logger.warning(f"Не удалось загрузить маскот из {mascot_url}: {e}")
-
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        return buffer
-
     @action(detail=True, methods=['get'], url_path='card-image')
     def loyalty_card_image(self, request, user__tg_id=None):
         logger.info(f"Запрошено изображение карты для tg_id={user__tg_id}")
@@ -143,13 +48,11 @@ class LoyaltyCardViewSet(viewsets.ViewSet):
             logger.info(f"Создана новая карта лояльности для tg_id={user__tg_id}")
 
         try:
-            image = self.generate_card_image(user, card.card_number)
+            return card_image_response(request, card, user)
         except Exception as e:
             logger.error(f"Ошибка генерации изображения карты для tg_id={user__tg_id}: {e}")
             return Response({"detail": "Ошибка генерации изображения"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return HttpResponse(image.getvalue(), content_type='image/png')
-
     @action(detail=True, methods=['get'], url_path='card-number')
     def card_number(self, request, user__tg_id=None):
         logger.info(f"Запрошен номер карты для tg_id={user__tg_id}")
@@ -446,6 +349,18 @@ class PromotionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
+    @extend_schema(
+        summary='Купить промокод за бонусы',
+        parameters=[
+            OpenApiParameter(
+                name=IDEMPOTENCY_HEADER,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                required=False,
+                description='Ключ повтора (до 64 символов): повторный запрос с тем же ключом не списывает бонусы ещё раз',
+            ),
+        ],
+    )
     @action(detail=True, methods=['post'], url_path='buy-promocode')
     def buy_promocode(self, request, pk=None):
         user = request.user
@@ -468,28 +383,34 @@ class PromotionViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Настройки программы лояльности не найдены'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         points_per_1_percent = points_settings.points_per_1_percent
-        current_balance = card.get_balance()
         points_to_deduct = round(float(promotion.discount_percent) * points_per_1_percent)
 
-        if current_balance < points_to_deduct:
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key and len(idempotency_key) > 64:
+            return Response({'error': f'{IDEMPOTENCY_HEADER} длиннее 64 символов.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Ошибка записи покупки (например, промокод уже куплен) откатывает и списание
+            with transaction.atomic():
+                _, created = spend_points(
+                    card.id, points_to_deduct, idempotency_key=idempotency_key,
+                    operation=f'promo:{promotion.id}', resident_id=promotion.resident
+                )
+                if created:
+                    serializer = UserPromotionSerializer(
+                        data={'user': user.id, 'promotion': promotion.id}, context={'request': request}
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+        except IdempotencyConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except InsufficientPoints as e:
             return Response({
                 'error': f'Недостаточно бонусов.\n'
-                        f'Баланс: <b>{current_balance}</b>.\n'
-                        f'требуется: <b>{points_to_deduct}</b>'
+                        f'Баланс: <b>{e.balance}</b>.\n'
+                        f'требуется: <b>{e.required}</b>'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        PointsTransaction.objects.create(
-            points=points_to_deduct,
-            price=0.0,
-            transaction_type='списание',
-            card_id=card,
-            resident_id=promotion.resident
-        )
-
-        serializer = UserPromotionSerializer(data={'user': user.id, 'promotion': promotion.id})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-
         return Response({
             'message': 'Промокод успешно активирован.',
             'promotion': promotion.title,
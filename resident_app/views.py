@@ -73,9 +73,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         show_all = self.request.query_params.get('tree') == 'true'
+        # Дерево двухуровневое (категория → подкатегории), но сериализатор запрашивает
+        # children и у подкатегорий, поэтому подгружаем и их пустые списки
         if show_all:
-            return Category.objects.all().prefetch_related('children')
-        return Category.objects.filter(parent__isnull=True).prefetch_related('children')
+            return Category.objects.all().prefetch_related('children__children')
+        return Category.objects.filter(parent__isnull=True).prefetch_related('children__children')
 
     def get_object(self):
         # Ищем категорию без фильтрации по parent
@@ -168,7 +170,7 @@ class ResidentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsBotAuthenticated | IsAuthenticated]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related('categories__children__children')
         category_id = self.request.query_params.get('category_id')
         is_main = self.request.query_params.get('main', 'false') == 'true'
 
@@ -310,7 +312,7 @@ class MapResidentListView(APIView):
     def get(self, request):
         category_ids = request.query_params.get('category_id')
 
-        queryset = Resident.objects.prefetch_related('categories', 'map_marker')
+        queryset = Resident.objects.prefetch_related('categories__children__children', 'map_marker')
 
         if category_ids:
             ids = [int(i) for i in category_ids.split(',') if i.isdigit()]
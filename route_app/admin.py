@@ -1,6 +1,11 @@
+import json
+
 from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from .graph_integrity import analyze_graph
 from .models import Building, Floor, Location, Connection, Route, LocationCorner, LocationType, Tour
 from django import forms
 from django.utils.html import mark_safe
@@ -40,7 +45,8 @@ class LocationTypeForm(forms.ModelForm):
 
 @admin.register(LocationType)
 class LocationTypeAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'transition')
+    list_filter = ('transition',)
     search_fields = ('name',)
     form = LocationTypeForm
 
@@ -64,6 +70,58 @@ class LocationAdmin(admin.ModelAdmin):
     inlines = [LocationCornerInline]
 
 
+@staff_member_required
+def admin_graph_report_view(request):
+    report = analyze_graph()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(report, json_dumps_params={'ensure_ascii': False, 'indent': 2})
+
+    summary = report['summary']
+    labels = {
+        'locations': 'Локаций',
+        'connections': 'Связей',
+        'components': 'Компонент связности',
+        'strong_components': 'Компонент сильной связности',
+        'isolated': 'Изолированных локаций',
+        'dead_ends': 'Тупиков (можно войти, нельзя выйти)',
+        'unreachable': 'Недостижимых локаций (можно только выйти)',
+        'cost_anomalies': 'Аномальных стоимостей',
+        'buildings_not_strongly_connected': 'Зданий, где не все локации достижимы друг из друга',
+    }
+    rows = format_html_join('', '<tr><td>{}</td><td>{}</td></tr>', ((label, summary[key]) for key, label in labels.items()))
+    buildings = format_html_join(
+        '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+        (
+            (building['name'], building['locations'], len(building['components']),
+             'да' if building['strongly_connected'] else 'нет')
+            for building in report['buildings']
+        )
+    )
+    anomalies = format_html_join(
+        '', '<tr><td>{}</td><td>{} → {}</td><td>{}</td><td>{}</td></tr>',
+        (
+            (anomaly['connection_id'], anomaly['from'], anomaly['to'], anomaly['cost'], anomaly['reason'])
+            for anomaly in report['cost_anomalies']
+        )
+    )
+    page = format_html(
+        '<html><head><meta charset="utf-8"><title>Проверка графа навигации</title></head><body>'
+        '<h1>Проверка графа навигации: {}</h1>'
+        '<p><a href="?format=json">Отчёт в JSON</a></p>'
+        '<table border="1" cellpadding="4">{}</table>'
+        '<h2>Здания</h2><table border="1" cellpadding="4">'
+        '<tr><th>Здание</th><th>Локаций</th><th>Компонент</th><th>Всё достижимо</th></tr>{}</table>'
+        '<h2>Аномальные стоимости</h2><table border="1" cellpadding="4">'
+        '<tr><th>Связь</th><th>Локации</th><th>Стоимость</th><th>Причина</th></tr>{}</table>'
+        '<h2>Тупики</h2><p>{}</p><h2>Недостижимые</h2><p>{}</p><h2>Изолированные</h2><p>{}</p>'
+        '</body></html>',
+        'проблем нет' if summary['ok'] else 'найдены проблемы',
+        rows, buildings, anomalies,
+        json.dumps(report['dead_ends']), json.dumps(report['unreachable']), json.dumps(report['isolated']),
+    )
+    return HttpResponse(page)
+
+
 @admin.register(Connection)
 class ConnectionAdmin(admin.ModelAdmin):
     list_display = ('from_location', 'to_location', 'bidirectional', 'cost')
@@ -71,6 +129,14 @@ class ConnectionAdmin(admin.ModelAdmin):
     raw_id_fields = ('from_location', 'to_location')
     autocomplete_fields = ('from_location', 'to_location')
 
+    def get_urls(self):
+        from django.urls import path
+        urls = super().get_urls()
+        custom_urls = [
+            path('report/', self.admin_site.admin_view(admin_graph_report_view), name='route_app_graph_report'),
+        ]
+        return custom_urls + urls
+
 
 @admin.register(Route)
 class RouteAdmin(admin.ModelAdmin):
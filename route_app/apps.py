@@ -5,3 +5,6 @@ class RouteAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'route_app'
     verbose_name = 'Маршруты'
+
+    def ready(self):
+        import route_app.signals
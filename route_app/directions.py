@@ -0,0 +1,132 @@
+"""
+Пошаговые подсказки по пути: поворот, расстояние, смена этажа.
+
+Направления считаются по центроидам локаций, которые уже лежат в скомпилированном графе
+(xs/ys, один запрос на весь граф при его сборке), поэтому углы локаций пути не читаются.
+Ось y плана направлена вверх (угол направления растёт против часовой стрелки), поэтому
+поворот направо уменьшает угол; в подсказке он записывается положительным.
+Подряд идущие отрезки без поворота склеиваются в один шаг.
+"""
+from math import atan2, degrees
+
+from .models import Location
+from .navigation import ELEVATOR, ESCALATOR, PLAIN, RAMP, STAIRS
+
+START = 'start'
+STRAIGHT = 'straight'
+SLIGHT_LEFT, SLIGHT_RIGHT = 'slight_left', 'slight_right'
+LEFT, RIGHT = 'left', 'right'
+SHARP_LEFT, SHARP_RIGHT = 'sharp_left', 'sharp_right'
+FLOOR = 'floor'
+PASSAGE = 'passage'
+ARRIVE = 'arrive'
+
+# Границы углов (в градусах) для «прямо», «чуть левее/правее» и обычного поворота
+STRAIGHT_ANGLE = 25
+SLIGHT_ANGLE = 60
+TURN_ANGLE = 135
+
+TRANSITION_NAMES = {STAIRS: 'stairs', ELEVATOR: 'elevator', ESCALATOR: 'escalator', RAMP: 'ramp'}
+
+
+def path_steps(graph, path_ids):
+    """
+    {'distance': длина пути в метрах без штрафов, 'steps': [...]}.
+    Шаг: action, turn (градусы, + направо, для первого шага и переходов — None),
+    distance, location_id/name/floor — где шаг заканчивается, transition — для смены этажа.
+    """
+    locations = {
+        location_id: (name, floor_number)
+        for location_id, name, floor_number in Location.objects.filter(id__in=path_ids).values_list(
+            'id', 'name', 'floor__number'
+        )
+    }
+    # Сохранённый путь маршрута мог пережить удаление локации — такие узлы пропускаем
+    nodes = [graph.index[location_id] for location_id in path_ids if location_id in graph.index]
+
+    steps = []
+    total = 0
+    heading = None
+    for source, target in zip(nodes, nodes[1:]):
+        length, kind = _arc(graph, source, target)
+        total += length
+        location_id = graph.ids[target]
+        name, floor_number = locations.get(location_id, ('', None))
+
+        if graph.floors[source] != graph.floors[target]:
+            # Координаты разных этажей несопоставимы — направление начинается заново
+            heading = None
+            steps.append({
+                'action': PASSAGE if kind == PLAIN else FLOOR,
+                'turn': None,
+                'distance': length,
+                'location_id': location_id,
+                'name': name,
+                'floor': floor_number,
+                'transition': TRANSITION_NAMES.get(kind),
+            })
+            continue
+
+        new_heading = _heading(graph, source, target)
+        if heading is None or new_heading is None:
+            action, turn = (START if heading is None else STRAIGHT), None
+        else:
+            turn = (heading - new_heading + 180) % 360 - 180
+            action = _action(turn)
+        heading = new_heading if new_heading is not None else heading
+
+        previous = steps[-1] if steps else None
+        if action == STRAIGHT and previous is not None and previous['action'] not in (FLOOR, PASSAGE):
+            previous['distance'] += length
+            previous.update(location_id=location_id, name=name, floor=floor_number)
+            continue
+        steps.append({
+            'action': action,
+            'turn': round(turn) if turn is not None else None,
+            'distance': length,
+            'location_id': location_id,
+            'name': name,
+            'floor': floor_number,
+            'transition': None,
+        })
+
+    if nodes:
+        location_id = graph.ids[nodes[-1]]
+        name, floor_number = locations.get(location_id, ('', None))
+        steps.append({
+            'action': ARRIVE, 'turn': None, 'distance': 0,
+            'location_id': location_id, 'name': name, 'floor': floor_number, 'transition': None,
+        })
+    return {'distance': total, 'steps': steps}
+
+
+def _arc(graph, source, target):
+    """(длина, вид) самого дешёвого ребра source → target."""
+    best = None
+    for i in range(graph.offsets[source], graph.offsets[source + 1]):
+        if graph.targets[i] == target and (best is None or graph.costs[i] < graph.costs[best]):
+            best = i
+    if best is None:
+        return 0, PLAIN
+    kind = graph.arc_kinds[best] if graph.arc_kinds is not None else PLAIN
+    return graph.lengths[best], kind
+
+
+def _heading(graph, source, target):
+    if not graph.has_center(source) or not graph.has_center(target):
+        return None
+    dx, dy = graph.xs[target] - graph.xs[source], graph.ys[target] - graph.ys[source]
+    if dx == 0 and dy == 0:
+        return None
+    return degrees(atan2(dy, dx))
+
+
+def _action(turn):
+    size = abs(turn)
+    if size < STRAIGHT_ANGLE:
+        return STRAIGHT
+    if size < SLIGHT_ANGLE:
+        return SLIGHT_RIGHT if turn > 0 else SLIGHT_LEFT
+    if size < TURN_ANGLE:
+        return RIGHT if turn > 0 else LEFT
+    return SHARP_RIGHT if turn > 0 else SHARP_LEFT
@@ -1,26 +1,16 @@
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from route_app.models import Floor
+from django.utils.html import escape
+from route_app.floor_plans import drawable, floor_plan_response, plan_bounds
 
 
 def floor_plan_preview(request, pk):
-    floor = get_object_or_404(Floor, pk=pk)
+    return floor_plan_response(request, pk, 'preview', render_floor_plan_preview)
 
+
+def render_floor_plan_preview(geometry):
     base_view_width, base_view_height = 800, 600
     padding = 50
 
-    all_x, all_y = [], []
-    for loc in floor.locations.all():
-        for corner in loc.corners.all():
-            all_x.append(corner.x)
-            all_y.append(corner.y)
-
-    if not all_x or not all_y:
-        min_x = min_y = 0
-        max_x = max_y = 100
-    else:
-        min_x, max_x = min(all_x), max(all_x)
-        min_y, max_y = min(all_y), max(all_y)
+    min_x, min_y, max_x, max_y = plan_bounds(geometry)
 
     content_width = max_x - min_x if max_x > min_x else 1
     content_height = max_y - min_y if max_y > min_y else 1
@@ -53,14 +43,9 @@ def floor_plan_preview(request, pk):
     # Построение полигонов и подписей с поправкой координат (уже применяется масштаб и origin в SVG)
     polygons = []
     labels = []
-    for location in floor.locations.all():
-        corners = location.corners.all().order_by('order')
-        if corners.count() < 3:
-            continue
-
-        points = " ".join(f"{c.x},{-c.y}" for c in corners)
-        color = getattr(location.location_type, "color", "#cccccc") or "#cccccc"
-        name = location.name
+    for _, name, color, corners, (avg_x, avg_y) in drawable(geometry):
+        points = " ".join(f"{x},{-y}" for x, y in corners)
+        name = escape(name)
 
         polygons.append(f'''
             <polygon points="{points}" fill="{color}" stroke="#000000" stroke-width="1">
@@ -68,9 +53,6 @@ def floor_plan_preview(request, pk):
             </polygon>
         ''')
 
-        avg_x = sum(c.x for c in corners) / corners.count()
-        avg_y = sum(c.y for c in corners) / corners.count()
-
         labels.append(f'''
             <text x="{avg_x}" y="{-avg_y}" font-size="12" fill="#000" text-anchor="middle" dominant-baseline="middle" pointer-events="none">
                 {name}
@@ -205,4 +187,4 @@ def floor_plan_preview(request, pk):
     </html>
     '''
 
-    return HttpResponse(svg)
+    return svg
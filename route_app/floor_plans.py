@@ -0,0 +1,170 @@
+"""
+Геометрия этажей для планов: многоугольники локаций этажа с цветами типов.
+
+Геометрия этажа загружается одним запросом (плюс prefetch углов) и кэшируется до изменения
+локаций, углов или типов на этом этаже. ETag — хэш содержимого, поэтому отрисованные планы
+кэшируются по нему и отдаются с 304 Not Modified, пока этаж не изменился.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.html import escape
+
+from .geometry import polygon_center
+from .models import Floor, Location
+
+DEFAULT_COLOR = '#cccccc'
+FLOOR_PLAN_TIMEOUT = 60 * 60 * 24
+
+
+def _geometry_key(floor_id):
+    return f'route_app:floor_plan:{floor_id}'
+
+
+def _etag_key(floor_id):
+    return f'route_app:floor_plan_etag:{floor_id}'
+
+
+def get_floor_geometry(floor_id):
+    """
+    {'etag': ..., 'locations': [(id, name, color, [(x, y), ...]), ...]} — углы в порядке обхода.
+    """
+    key = _geometry_key(floor_id)
+    geometry = cache.get(key)
+    if geometry is None:
+        locations = [
+            (
+                location.id,
+                location.name,
+                getattr(location.location_type, 'color', DEFAULT_COLOR) or DEFAULT_COLOR,
+                [(corner.x, corner.y) for corner in location.corners.all()],
+            )
+            for location in Location.objects.filter(floor_id=floor_id)
+            .select_related('location_type')
+            .prefetch_related('corners')
+            .order_by('id')
+        ]
+        etag = hashlib.sha1(json.dumps(locations, ensure_ascii=False).encode()).hexdigest()
+        geometry = {'etag': etag, 'locations': locations}
+        cache.set_many({key: geometry, _etag_key(floor_id): etag}, FLOOR_PLAN_TIMEOUT)
+    return geometry
+
+
+def get_floor_etag(floor_id):
+    """Только ETag геометрии этажа — дешёвая проверка актуальности без чтения всей геометрии."""
+    etag = cache.get(_etag_key(floor_id))
+    if etag is None:
+        etag = get_floor_geometry(floor_id)['etag']
+    return etag
+
+
+def get_rendered(geometry, kind, render):
+    """Отрисованный план из кэша по ETag геометрии; render(geometry) вызывается только при промахе."""
+    key = f'route_app:floor_plan:{geometry["etag"]}:{kind}'
+    content = cache.get(key)
+    if content is None:
+        content = render(geometry)
+        cache.set(key, content, FLOOR_PLAN_TIMEOUT)
+    return content
+
+
+def plan_bounds(geometry):
+    """(min_x, min_y, max_x, max_y) по всем углам этажа; для пустого этажа — (0, 0, 100, 100)."""
+    xs = [x for _, _, _, points in geometry['locations'] for x, _ in points]
+    ys = [y for _, _, _, points in geometry['locations'] for _, y in points]
+    if not xs:
+        return 0, 0, 100, 100
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def drawable(geometry):
+    """Локации, которые можно нарисовать (не меньше трёх углов), с центром для подписи."""
+    for location_id, name, color, points in geometry['locations']:
+        if len(points) >= 3:
+            yield location_id, name, color, points, polygon_center(points)
+
+
+def render_svg(geometry):
+    """Самостоятельный SVG этажа: только многоугольники и подписи, ось Y направлена вверх."""
+    min_x, min_y, max_x, max_y = plan_bounds(geometry)
+    width = max(max_x - min_x, 1)
+    height = max(max_y - min_y, 1)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{_num(min_x)} {_num(-max_y)} {_num(width)} {_num(height)}">'
+    ]
+    labels = []
+    for location_id, name, color, points, (center_x, center_y) in drawable(geometry):
+        name = escape(name)
+        coordinates = ' '.join(f'{_num(x)},{_num(-y)}' for x, y in points)
+        parts.append(
+            f'<polygon data-id="{location_id}" points="{coordinates}" fill="{color}" stroke="#000" '
+            f'stroke-width="1" vector-effect="non-scaling-stroke"><title>{name}</title></polygon>'
+        )
+        labels.append(
+            f'<text x="{_num(center_x)}" y="{_num(-center_y)}" font-size="12" text-anchor="middle" '
+            f'dominant-baseline="middle" pointer-events="none">{name}</text>'
+        )
+    parts.extend(labels)
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def render_json(geometry):
+    """
+    Компактный план: палитра цветов и для каждой локации id, название, индекс цвета,
+    плоский массив координат [x0, y0, x1, y1, ...] и точка подписи.
+    """
+    colors = []
+    color_index = {}
+    locations = []
+    for location_id, name, color, points, (center_x, center_y) in drawable(geometry):
+        if color not in color_index:
+            color_index[color] = len(colors)
+            colors.append(color)
+        locations.append({
+            'id': location_id,
+            'name': name,
+            'color': color_index[color],
+            'points': [coordinate for point in points for coordinate in point],
+            'label': [center_x, center_y],
+        })
+    return json.dumps(
+        {'bounds': plan_bounds(geometry), 'colors': colors, 'locations': locations},
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+
+
+def _num(value):
+    # Без хвостовых нулей: 12.0 -> 12, так SVG заметно короче
+    return f'{value:.6g}' if isinstance(value, float) else str(value)
+
+
+def floor_plan_response(request, floor_id, kind, render, content_type='text/html; charset=utf-8'):
+    """
+    Ответ с планом этажа: 304, если у клиента актуальная версия, иначе отрисовка из кэша.
+    """
+    if not str(floor_id).isdigit():
+        raise Http404
+    geometry = get_floor_geometry(int(floor_id))
+    if not geometry['locations'] and not Floor.objects.filter(pk=floor_id).exists():
+        raise Http404
+
+    if geometry['etag'] in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_rendered(geometry, kind, render), content_type=content_type)
+
+    response['ETag'] = f'"{geometry["etag"]}"'
+    # Клиент хранит план, но перепроверяет его по ETag при каждом открытии
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def invalidate_floor_plans(floor_ids):
+    floor_ids = [floor_id for floor_id in floor_ids if floor_id is not None]
+    cache.delete_many([_geometry_key(floor_id) for floor_id in floor_ids] + [_etag_key(floor_id) for floor_id in floor_ids])
@@ -0,0 +1,443 @@
+"""
+Импорт и экспорт геометрии здания в GeoJSON (FeatureCollection).
+
+Формат: в properties коллекции — название здания и номера этажей, каждая локация — Feature
+с Polygon (углы в порядке обхода, кольцо замкнуто) и properties id/name/floor/location_type,
+каждая связь — Feature с LineString между центрами локаций и properties kind="connection",
+from/to (id локаций из этого же файла), cost, bidirectional.
+
+Экспорт отдаётся кусками: локации и углы читаются итератором пачками, поэтому здание целиком
+в память не загружается. Импорт разбирает features по одной (json.JSONDecoder.raw_decode по
+буферу), проверяет углы и связи в памяти и сохраняет всё через bulk_create в одной транзакции.
+bulk_create не отправляет сигналы, поэтому граф, планы этажей и привязки меток сбрасываются
+здесь же после коммита.
+"""
+import json
+from math import isfinite
+
+from django.db import transaction
+
+from .floor_plans import invalidate_floor_plans
+from .geometry import polygon_center
+from .models import Building, Connection, Floor, Location, LocationCorner, LocationType
+from .navigation import invalidate_graph
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+CONNECTION = 'connection'
+
+
+class GeoJSONImportError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+# =================================================================================================
+# Экспорт
+# =================================================================================================
+
+def export_building(building):
+    """Генератор кусков GeoJSON для здания: подходит для StreamingHttpResponse и записи в файл."""
+    floors = list(building.floors.order_by('number').values_list('id', 'number'))
+    numbers = dict(floors)
+    header = {'type': 'FeatureCollection', 'properties': {
+        'building': building.name,
+        'description': building.description,
+        'floors': [number for _, number in floors],
+    }}
+    yield json.dumps(header, ensure_ascii=False)[:-1] + ', "features": ['
+
+    centers = {}
+    first = True
+    locations = (
+        Location.objects.filter(floor__building=building)
+        .select_related('location_type')
+        .prefetch_related('corners')
+        .order_by('id')
+    )
+    for location in locations.iterator(chunk_size=BATCH_SIZE):
+        points = [[corner.x, corner.y] for corner in location.corners.all()]
+        if points:
+            centers[location.id] = list(polygon_center(points))
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [points + points[:1]]} if points else None,
+            'properties': {
+                'id': location.id,
+                'name': location.name,
+                'floor': numbers[location.floor_id],
+                'location_type': getattr(location.location_type, 'name', None),
+            },
+        }
+        yield ('' if first else ',') + json.dumps(feature, ensure_ascii=False)
+        first = False
+
+    connections = Connection.objects.filter(
+        from_location__floor__building=building, to_location__floor__building=building
+    ).order_by('id').values_list('from_location_id', 'to_location_id', 'cost', 'bidirectional')
+    for from_id, to_id, cost, bidirectional in connections.iterator(chunk_size=BATCH_SIZE):
+        line = [centers[from_id], centers[to_id]] if from_id in centers and to_id in centers else None
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': line} if line else None,
+            'properties': {'kind': CONNECTION, 'from': from_id, 'to': to_id, 'cost': cost, 'bidirectional': bidirectional},
+        }
+        yield ('' if first else ',') + json.dumps(feature, ensure_ascii=False)
+        first = False
+
+    yield ']}'
+
+
+# =================================================================================================
+# Импорт
+# =================================================================================================
+
+def iter_features(stream, collection):
+    """
+    Разбирает FeatureCollection из файлового объекта по частям и отдаёт features по одной.
+    Остальные ключи верхнего уровня складываются в collection по мере чтения: если properties
+    стоят до features (как в экспорте), они доступны уже при обработке первой feature.
+    """
+    reader = _Reader(_Utf8Stream(stream))
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.take()
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'features':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.take()
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',', ']') == ']':
+                        break
+        else:
+            collection[key] = reader.value()
+        if reader.expect(',', '}') == '}':
+            break
+
+
+class _Utf8Stream:
+    """Обёртка над файлом с байтами: read() отдаёт текст, не разрезая символы UTF-8 на границе куска."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.tail = b''
+
+    def read(self, size):
+        data = self.stream.read(size)
+        if isinstance(data, str):
+            return data
+        data = self.tail + data
+        cut = len(data)
+        for back in range(1, min(4, len(data)) + 1):
+            byte = data[-back]
+            if byte & 0xC0 != 0x80:
+                length = 1 if byte < 0x80 else 2 if byte >> 5 == 0b110 else 3 if byte >> 4 == 0b1110 else 4
+                if length > back:
+                    cut = len(data) - back
+                break
+        self.tail = data[cut:]
+        try:
+            return data[:cut].decode('utf-8')
+        except UnicodeDecodeError:
+            raise GeoJSONImportError(['Файл должен быть в кодировке UTF-8'])
+
+
+class _Reader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        # Прочитанное уже не нужно — буфер не растёт на всю длину файла
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise GeoJSONImportError(['Неожиданный конец файла'])
+            self._fill()
+
+    def take(self):
+        char = self.peek()
+        self.position += 1
+        return char
+
+    def expect(self, *chars):
+        char = self.take()
+        if char not in chars:
+            raise GeoJSONImportError([f'Ожидался символ {" или ".join(chars)}, получен {char!r}'])
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                if self.eof:
+                    raise GeoJSONImportError([f'Некорректный JSON: {error.msg}'])
+                self._fill()
+                continue
+            # Число на границе буфера могло прочитаться не полностью
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.position = end
+            return value
+
+
+def import_building(stream, building_name=None):
+    """
+    Импортирует здание из GeoJSON (файловый объект с байтами или текстом).
+    Здание ищется по названию (из аргумента или из properties файла) и создаётся, если его нет;
+    этажи сопоставляются по номеру. Локации и связи из файла добавляются как новые записи.
+    При любой ошибке ничего не сохраняется — бросается GeoJSONImportError со списком ошибок.
+    Возвращает словарь с количеством созданных записей.
+    """
+    collection = {}
+    stats = {'floors': 0, 'locations': 0, 'corners': 0, 'connections': 0}
+    errors = []
+    id_map = {}
+    seen_ids = set()
+    connections = []
+    pending = []
+    floors = {}
+    types = {}
+    building = None
+    affected_floors = set()
+
+    with transaction.atomic():
+        for number, feature in enumerate(iter_features(stream, collection)):
+            properties = (feature.get('properties') or {}) if isinstance(feature, dict) else {}
+            if properties.get('kind') == CONNECTION:
+                connections.append((number, properties))
+                continue
+
+            location = _parse_location(number, feature, properties, errors)
+            if location is None:
+                continue
+            if location[0] in seen_ids:
+                errors.append(f'Feature {number}: повторяющийся id локации {location[0]}')
+                continue
+            seen_ids.add(location[0])
+            pending.append(location)
+            if len(pending) >= BATCH_SIZE:
+                # Локации сохраняются пачками по мере чтения, углы — вместе с ними
+                building = building or _get_building(building_name, collection)
+                _flush_locations(building, pending, floors, types, id_map, stats, affected_floors)
+                pending = []
+
+        building = building or _get_building(building_name, collection)
+        _flush_locations(building, pending, floors, types, id_map, stats, affected_floors)
+        for floor_number in (collection.get('properties') or {}).get('floors', []):
+            if isinstance(floor_number, int) and not isinstance(floor_number, bool):
+                _get_floor(building, floor_number, floors, stats)
+
+        new_connections = _parse_connections(connections, id_map, errors)
+        if errors:
+            # Исключение откатывает и уже сохранённые пачки локаций
+            raise GeoJSONImportError(errors)
+
+        Connection.objects.bulk_create(new_connections, batch_size=BATCH_SIZE)
+        stats['connections'] = len(new_connections)
+
+        transaction.on_commit(lambda: _after_import(affected_floors))
+    return stats
+
+
+def _get_building(name, collection):
+    properties = collection.get('properties') or {}
+    name = name or properties.get('building')
+    if not isinstance(name, str) or not name:
+        raise GeoJSONImportError(['Не указано название здания: передайте его явно, '
+                                  'если properties коллекции стоят после features'])
+    building = Building.objects.filter(name=name).first()
+    if building is None:
+        building = Building.objects.create(name=name, description=properties.get('description') or '')
+    return building
+
+
+def _get_floor(building, number, floors, stats):
+    if number not in floors:
+        floor, created = Floor.objects.get_or_create(building=building, number=number)
+        floors[number] = floor.id
+        stats['floors'] += created
+    return floors[number]
+
+
+def _get_location_type(name, types):
+    if name is None:
+        return None
+    if name not in types:
+        location_type = LocationType.objects.filter(name=name).first()
+        if location_type is None:
+            location_type = LocationType.objects.create(name=name)
+        types[name] = location_type.id
+    return types[name]
+
+
+def _flush_locations(building, pending, floors, types, id_map, stats, affected_floors):
+    if not pending:
+        return
+    locations = []
+    for file_id, name, floor_number, type_name, points in pending:
+        floor_id = _get_floor(building, floor_number, floors, stats)
+        affected_floors.add(floor_id)
+        locations.append(Location(name=name, floor_id=floor_id, location_type_id=_get_location_type(type_name, types)))
+    # На PostgreSQL (и SQLite 3.35+) bulk_create проставляет первичные ключи
+    Location.objects.bulk_create(locations)
+
+    corners = []
+    for (file_id, _, _, _, points), location in zip(pending, locations):
+        id_map[file_id] = location.id
+        corners.extend(
+            LocationCorner(location_id=location.id, x=x, y=y, order=order) for order, (x, y) in enumerate(points)
+        )
+    LocationCorner.objects.bulk_create(corners, batch_size=BATCH_SIZE)
+    stats['locations'] += len(locations)
+    stats['corners'] += len(corners)
+
+
+def _parse_location(number, feature, properties, errors):
+    prefix = f'Feature {number}'
+    if not isinstance(feature, dict) or feature.get('type') != 'Feature':
+        errors.append(f'{prefix}: ожидается объект Feature')
+        return None
+
+    file_id = properties.get('id')
+    name = properties.get('name')
+    floor_number = properties.get('floor')
+    if not isinstance(file_id, (int, str)) or isinstance(file_id, bool):
+        errors.append(f'{prefix}: не указан id локации')
+        return None
+    if not isinstance(name, str) or not name or len(name) > Location._meta.get_field('name').max_length:
+        errors.append(f'{prefix}: некорректное название локации')
+        return None
+    if not isinstance(floor_number, int) or isinstance(floor_number, bool):
+        errors.append(f'{prefix}: номер этажа должен быть целым числом')
+        return None
+    type_name = properties.get('location_type')
+    if type_name is not None and not isinstance(type_name, str):
+        errors.append(f'{prefix}: тип локации задаётся названием')
+        return None
+
+    geometry = feature.get('geometry')
+    if geometry is None:
+        return file_id, name, floor_number, type_name, []
+    points = _parse_ring(geometry)
+    if points is None:
+        errors.append(f'{prefix}: ожидается Polygon из одного кольца с числовыми координатами')
+        return None
+    problem = _ring_problem(points)
+    if problem:
+        errors.append(f'{prefix}: {problem}')
+        return None
+    return file_id, name, floor_number, type_name, points
+
+
+def _parse_ring(geometry):
+    if not isinstance(geometry, dict) or geometry.get('type') != 'Polygon':
+        return None
+    rings = geometry.get('coordinates')
+    if not isinstance(rings, list) or len(rings) != 1 or not isinstance(rings[0], list):
+        return None
+    points = []
+    for point in rings[0]:
+        if (not isinstance(point, list) or len(point) < 2
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool) and isfinite(value)
+                           for value in point[:2])):
+            return None
+        points.append((float(point[0]), float(point[1])))
+    # Кольцо GeoJSON замкнуто: последняя точка повторяет первую
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def _ring_problem(points):
+    """Проверка порядка углов: не меньше трёх, без повторов подряд, ненулевая площадь, без самопересечений."""
+    if len(points) < 3:
+        return 'у локации должно быть не меньше трёх углов'
+    edges = list(zip(points, points[1:] + points[:1]))
+    if any(a == b for a, b in edges):
+        return 'углы повторяются подряд'
+    area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in edges)
+    if area == 0:
+        return 'углы лежат на одной прямой'
+    for i, (a, b) in enumerate(edges):
+        for j in range(i + 2, len(edges)):
+            if i == 0 and j == len(edges) - 1:
+                continue  # соседние через замыкание кольца
+            if _segments_cross(a, b, *edges[j]):
+                return 'стороны многоугольника пересекаются: проверьте порядок обхода углов'
+    return None
+
+
+def _segments_cross(p1, p2, p3, p4):
+    def orientation(a, b, c):
+        value = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (value > 0) - (value < 0)
+
+    def on_segment(a, b, c):
+        return min(a[0], b[0]) <= c[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= c[1] <= max(a[1], b[1])
+
+    o1, o2, o3, o4 = orientation(p1, p2, p3), orientation(p1, p2, p4), orientation(p3, p4, p1), orientation(p3, p4, p2)
+    if o1 != o2 and o3 != o4:
+        return True
+    return ((o1 == 0 and on_segment(p1, p2, p3)) or (o2 == 0 and on_segment(p1, p2, p4))
+            or (o3 == 0 and on_segment(p3, p4, p1)) or (o4 == 0 and on_segment(p3, p4, p2)))
+
+
+def _parse_connections(connections, id_map, errors):
+    result = []
+    seen = set()
+    for number, properties in connections:
+        prefix = f'Feature {number}'
+        from_id = id_map.get(properties.get('from'))
+        to_id = id_map.get(properties.get('to'))
+        cost = properties.get('cost', 1.0)
+        bidirectional = properties.get('bidirectional', True)
+        if from_id is None or to_id is None:
+            errors.append(f'{prefix}: связь ссылается на локацию, которой нет в файле')
+            continue
+        if from_id == to_id:
+            errors.append(f'{prefix}: связь локации с самой собой')
+            continue
+        if not isinstance(cost, (int, float)) or isinstance(cost, bool) or not isfinite(cost) or cost < 0:
+            errors.append(f'{prefix}: стоимость перехода должна быть неотрицательным числом')
+            continue
+        if not isinstance(bidirectional, bool):
+            errors.append(f'{prefix}: bidirectional должен быть true или false')
+            continue
+        if (from_id, to_id) in seen:
+            errors.append(f'{prefix}: повторяющаяся связь')
+            continue
+        seen.add((from_id, to_id))
+        result.append(Connection(from_location_id=from_id, to_location_id=to_id, cost=cost, bidirectional=bidirectional))
+    return result
+
+
+def _after_import(floor_ids):
+    from .tasks import snap_map_markers
+
+    invalidate_graph()
+    invalidate_floor_plans(floor_ids)
+    snap_map_markers.delay(floor_ids=list(floor_ids))
@@ -0,0 +1,28 @@
+"""
+Геометрия локаций: многоугольник локации задаётся её углами (LocationCorner) в порядке обхода.
+"""
+from math import hypot
+
+
+def polygon_center(points):
+    """Центр как среднее углов — так же, как Location.get_center()."""
+    if not points:
+        return None
+    return sum(x for x, _ in points) / len(points), sum(y for _, y in points) / len(points)
+
+
+def point_in_polygon(x, y, points):
+    """Проверка попадания точки в многоугольник методом луча (точки на границе считаются внутри не всегда)."""
+    inside = False
+    j = len(points) - 1
+    for i in range(len(points)):
+        xi, yi = points[i]
+        xj, yj = points[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def distance(a, b):
+    return hypot(a[0] - b[0], a[1] - b[1])
@@ -0,0 +1,237 @@
+"""
+Проверка целостности графа навигации (Connection).
+
+Граф загружается один раз (локации и связи — по одному запросу) в тот же CSR, что и для
+навигации. Дальше всё линейно по числу локаций и связей: компоненты связности — обходом
+в ширину без учёта направления, компоненты сильной связности — итеративным алгоритмом Тарьяна,
+достижимость между компонентами внутри здания — одним проходом по конденсации с битовыми масками.
+Результат — словарь, готовый к json.dumps: его отдают команда check_graph и отчёт в админке.
+"""
+from collections import deque
+from math import isfinite
+from statistics import quantiles
+
+from .models import Connection, Location
+from .navigation import NavigationGraph, get_graph_version
+
+# Стоимость выше Q3 + k * IQR считается выбросом
+OUTLIER_FACTOR = 3
+
+
+def analyze_graph():
+    locations = list(Location.objects.values_list(
+        'id', 'name', 'floor_id', 'floor__number', 'floor__building_id', 'floor__building__name'
+    ))
+    connections = list(Connection.objects.values_list('id', 'from_location_id', 'to_location_id', 'cost', 'bidirectional'))
+
+    graph = NavigationGraph.from_edges(
+        ((location_id, floor_id, None, None) for location_id, _, floor_id, _, _, _ in locations),
+        ((from_id, to_id, cost, bidirectional) for _, from_id, to_id, cost, bidirectional in connections),
+        get_graph_version(),
+    )
+    reverse = graph.reversed()
+    size = len(graph)
+
+    out_degree = [graph.offsets[node + 1] - graph.offsets[node] for node in range(size)]
+    in_degree = [reverse.offsets[node + 1] - reverse.offsets[node] for node in range(size)]
+    isolated = [graph.ids[node] for node in range(size) if not out_degree[node] and not in_degree[node]]
+    dead_ends = [graph.ids[node] for node in range(size) if in_degree[node] and not out_degree[node]]
+    unreachable = [graph.ids[node] for node in range(size) if out_degree[node] and not in_degree[node]]
+
+    components = _weak_components(graph, reverse)
+    component_of, strong = _strong_components(graph)
+    buildings = _building_reachability(graph, locations, component_of, strong, set(isolated))
+    anomalies = _cost_anomalies(connections)
+
+    summary = {
+        'locations': size,
+        'connections': len(connections),
+        'components': len(components),
+        'strong_components': len(strong),
+        'isolated': len(isolated),
+        'dead_ends': len(dead_ends),
+        'unreachable': len(unreachable),
+        'cost_anomalies': len(anomalies),
+        'buildings_not_strongly_connected': sum(not building['strongly_connected'] for building in buildings),
+    }
+    summary['ok'] = (
+        len(components) <= 1
+        and not isolated and not dead_ends and not unreachable and not anomalies
+        and not summary['buildings_not_strongly_connected']
+    )
+    return {
+        'graph_version': graph.version,
+        'summary': summary,
+        # Самая большая компонента — основная сеть, остальные обычно забытые связи
+        'components': [{'size': len(ids), 'location_ids': ids} for ids in components],
+        'isolated': isolated,
+        'dead_ends': dead_ends,
+        'unreachable': unreachable,
+        'cost_anomalies': anomalies,
+        'buildings': buildings,
+    }
+
+
+def _weak_components(graph, reverse):
+    seen = bytearray(len(graph))
+    components = []
+    for start in range(len(graph)):
+        if seen[start]:
+            continue
+        seen[start] = 1
+        queue = deque([start])
+        members = []
+        while queue:
+            node = queue.popleft()
+            members.append(graph.ids[node])
+            for csr in (graph, reverse):
+                for i in range(csr.offsets[node], csr.offsets[node + 1]):
+                    target = csr.targets[i]
+                    if not seen[target]:
+                        seen[target] = 1
+                        queue.append(target)
+        components.append(sorted(members))
+    components.sort(key=len, reverse=True)
+    return components
+
+
+def _strong_components(graph):
+    """
+    Итеративный Тарьян. Возвращает (component_of, components): компоненты идут в порядке
+    завершения, то есть обратном топологическому — стоки конденсации раньше истоков.
+    """
+    size = len(graph)
+    index = [-1] * size
+    low = [0] * size
+    on_stack = bytearray(size)
+    component_of = [-1] * size
+    components = []
+    stack = []
+    counter = 0
+
+    for root in range(size):
+        if index[root] != -1:
+            continue
+        work = [(root, graph.offsets[root])]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        while work:
+            node, i = work[-1]
+            if i < graph.offsets[node + 1]:
+                work[-1] = (node, i + 1)
+                target = graph.targets[i]
+                if index[target] == -1:
+                    index[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = 1
+                    work.append((target, graph.offsets[target]))
+                elif on_stack[target]:
+                    low[node] = min(low[node], index[target])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component_of[member] = len(components)
+                    members.append(member)
+                    if member == node:
+                        break
+                components.append(members)
+    return component_of, components
+
+
+def _building_reachability(graph, locations, component_of, strong, isolated):
+    """
+    Для каждого здания: его компоненты сильной связности (без изолированных локаций)
+    и матрица reachability[i][j] — можно ли из компоненты i попасть в компоненту j.
+    Путь может проходить через другие здания, поэтому достижимость считается по всему графу.
+    """
+    by_building = {}
+    for location_id, _, _, _, building_id, building_name in locations:
+        nodes = by_building.setdefault((building_id, building_name), [])
+        # Изолированные локации перечислены отдельно и только раздули бы матрицу
+        if location_id not in isolated:
+            nodes.append(graph.index[location_id])
+
+    # Компоненты каждого здания получают свои биты в общей маске: смещение здания + позиция компоненты
+    buildings = []
+    own = [0] * len(strong)
+    offset = 0
+    for (building_id, building_name), nodes in sorted(by_building.items(), key=lambda item: item[0][0] or 0):
+        local = {}
+        for node in nodes:
+            local.setdefault(component_of[node], []).append(graph.ids[node])
+        order = sorted(local, key=lambda component: -len(local[component]))
+        for position, component in enumerate(order):
+            own[component] |= 1 << (offset + position)
+        buildings.append((building_id, building_name, len(nodes), local, order, offset))
+        offset += len(order)
+
+    # Дуги конденсации: из компоненты c в d, причём d завершена раньше c
+    condensation = [set() for _ in strong]
+    for node in range(len(graph)):
+        for i in range(graph.offsets[node], graph.offsets[node + 1]):
+            source, target = component_of[node], component_of[graph.targets[i]]
+            if source != target:
+                condensation[source].add(target)
+
+    # Один проход для всех зданий сразу. Компоненты пронумерованы в обратном топологическом
+    # порядке — потомки готовы раньше предков
+    reach = [0] * len(strong)
+    for component in range(len(strong)):
+        mask = own[component]
+        for target in condensation[component]:
+            mask |= reach[target]
+        reach[component] = mask
+
+    result = []
+    for building_id, building_name, size, local, order, offset in buildings:
+        result.append({
+            'id': building_id,
+            'name': building_name,
+            'locations': size,  # без изолированных
+            'strongly_connected': len(order) <= 1,
+            'components': [sorted(local[component]) for component in order],
+            'reachability': [
+                [bool(reach[source] >> (offset + position) & 1) for position in range(len(order))]
+                for source in order
+            ],
+        })
+    return result
+
+
+def _cost_anomalies(connections):
+    costs = sorted(cost for _, _, _, cost, _ in connections if isfinite(cost) and cost > 0)
+    limit = None
+    if len(costs) >= 4:
+        q1, _, q3 = quantiles(costs, n=4)
+        limit = q3 + OUTLIER_FACTOR * (q3 - q1)
+
+    anomalies = []
+    for connection_id, from_id, to_id, cost, bidirectional in connections:
+        if from_id == to_id:
+            reason = 'self_loop'
+        elif not isfinite(cost):
+            reason = 'not_finite'
+        elif cost < 0:
+            reason = 'negative'
+        elif cost == 0:
+            reason = 'zero'
+        elif limit is not None and cost > limit:
+            reason = 'outlier'
+        else:
+            continue
+        anomalies.append({
+            'connection_id': connection_id, 'from': from_id, 'to': to_id,
+            'cost': cost if isfinite(cost) else str(cost), 'bidirectional': bidirectional, 'reason': reason,
+        })
+    return anomalies
@@ -0,0 +1,142 @@
+"""
+Двухуровневый поиск пути: этаж → оверлей из «порталов».
+
+Ячейка — этаж (floor_id узла). Портал — локация, у которой есть связь с другим этажом
+(лестница, лифт, переход между зданиями). Для каждого этажа заранее считаются кратчайшие
+расстояния между его порталами по рёбрам внутри этажа; вместе со связями между этажами они
+образуют небольшой оверлейный граф.
+
+Запрос просматривает только начальный и конечный этажи (прямой и обратный поиск внутри этажа)
+и оверлей, поэтому его время почти не зависит от числа зданий. Рабочие структуры запроса —
+словари размером с этаж, а не массивы на весь граф. Ярлыки между порталами в путь
+разворачиваются повторным поиском внутри этажа.
+"""
+import heapq
+from math import inf as INF
+
+
+class FloorOverlay:
+    def __init__(self, graph):
+        self.graph = graph
+        self.reverse = graph.reversed()
+        floors = graph.floors
+
+        self.portals = {}  # этаж → порталы этажа
+        self.overlay = {}  # портал → [(портал, стоимость)]
+        for u in range(len(graph)):
+            for i in range(graph.offsets[u], graph.offsets[u + 1]):
+                v, cost = graph.targets[i], graph.costs[i]
+                if floors[u] != floors[v] and cost < INF:
+                    self.overlay.setdefault(u, []).append((v, cost))
+                    self.overlay.setdefault(v, [])
+        for portal in self.overlay:
+            self.portals.setdefault(floors[portal], set()).add(portal)
+
+        # Ярлыки портал → портал того же этажа по рёбрам внутри этажа
+        for floor_portals in self.portals.values():
+            for portal in floor_portals:
+                best, _ = _floor_search(graph, portal)
+                self.overlay[portal].extend(
+                    (other, best[other]) for other in floor_portals if other != portal and other in best
+                )
+
+    def search(self, start, goal):
+        """(список номеров узлов, стоимость) или None, если пути нет."""
+        graph = self.graph
+        floors = graph.floors
+        forward, forward_parents = _floor_search(graph, start)
+        backward, backward_parents = _floor_search(self.reverse, goal)
+
+        best = forward.get(goal, INF)
+        meeting = None
+
+        start_portals = self.portals.get(floors[start], ())
+        goal_portals = self.portals.get(floors[goal], ())
+        distances = {}
+        parents = {}
+        queue = []
+        for portal in start_portals:
+            if portal in forward:
+                distances[portal] = forward[portal]
+                parents[portal] = -1
+                queue.append((forward[portal], portal))
+        heapq.heapify(queue)
+
+        while queue:
+            cost, portal = heapq.heappop(queue)
+            if cost >= best:
+                break
+            if cost > distances[portal]:
+                continue
+            if portal in goal_portals and portal in backward and cost + backward[portal] < best:
+                best = cost + backward[portal]
+                meeting = portal
+            for target, edge_cost in self.overlay[portal]:
+                new_cost = cost + edge_cost
+                if new_cost < distances.get(target, INF):
+                    distances[target] = new_cost
+                    parents[target] = portal
+                    heapq.heappush(queue, (new_cost, target))
+
+        if best == INF:
+            return None
+        if meeting is None:
+            return _unwind(forward_parents, goal), best
+
+        portals = []
+        node = meeting
+        while node != -1:
+            portals.append(node)
+            node = parents[node]
+        portals.reverse()
+
+        path = _unwind(forward_parents, portals[0])
+        for source, target in zip(portals, portals[1:]):
+            if floors[source] == floors[target]:
+                _, leg_parents = _floor_search(graph, source, target)
+                path.extend(_unwind(leg_parents, target)[1:])
+            else:
+                path.append(target)
+        # В обратном поиске предшественник указывает следующий шаг в сторону goal
+        node = backward_parents[meeting]
+        while node != -1:
+            path.append(node)
+            node = backward_parents[node]
+        return path, best
+
+
+def _floor_search(graph, source, target=None):
+    """Дейкстра от source только по рёбрам этажа source: (стоимости, предшественники) в словарях."""
+    floor_id = graph.floors[source]
+    floors, offsets, targets, costs = graph.floors, graph.offsets, graph.targets, graph.costs
+    best = {source: 0}
+    parents = {source: -1}
+    done = set()
+    queue = [(0, source)]
+    while queue:
+        cost, current = heapq.heappop(queue)
+        if current in done:
+            continue
+        done.add(current)
+        if current == target:
+            break
+        for i in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[i]
+            if floors[neighbor] != floor_id:
+                continue
+            new_cost = cost + costs[i]
+            if new_cost < best.get(neighbor, INF):
+                best[neighbor] = new_cost
+                parents[neighbor] = current
+                heapq.heappush(queue, (new_cost, neighbor))
+    # Ещё не снятые с кучи узлы могут иметь завышенную стоимость — отдаём только окончательные
+    return {node: best[node] for node in done}, parents
+
+
+def _unwind(parents, node):
+    path = []
+    while node != -1:
+        path.append(node)
+        node = parents[node]
+    path.reverse()
+    return path
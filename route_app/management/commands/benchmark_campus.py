@@ -0,0 +1,91 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from route_app.navigation import NavigationGraph, _search
+
+
+def build_campus_graph(buildings, floors, side, seed=0):
+    """
+    Кампус из buildings зданий по floors этажей, этаж — сетка side × side локаций.
+    На каждом этаже две лестницы в противоположных углах, здания соединены переходами
+    на первом этаже в цепочку. Возвращает граф и список этажей.
+    """
+    rnd = random.Random(seed)
+    locations = []
+    edges = []
+    floor_ids = []
+
+    def location_id(building, floor, row, col):
+        return ((building * floors + floor) * side + row) * side + col + 1
+
+    for building in range(buildings):
+        for floor in range(floors):
+            floor_id = building * floors + floor + 1
+            floor_ids.append(floor_id)
+            for row in range(side):
+                for col in range(side):
+                    current = location_id(building, floor, row, col)
+                    locations.append((current, floor_id, building * side * 6.0 + col * 5.0, row * 5.0))
+                    if col + 1 < side:
+                        edges.append((current, current + 1, 5.0 * rnd.uniform(1, 1.5), True))
+                    if row + 1 < side:
+                        edges.append((current, current + side, 5.0 * rnd.uniform(1, 1.5), True))
+            if floor + 1 < floors:
+                for row, col in ((0, 0), (side - 1, side - 1)):
+                    edges.append((location_id(building, floor, row, col),
+                                  location_id(building, floor + 1, row, col), 20.0, True))
+        if building + 1 < buildings:
+            edges.append((location_id(building, 0, side // 2, side - 1),
+                          location_id(building + 1, 0, side // 2, 0), 10.0, True))
+    return NavigationGraph.from_edges(locations, edges), floor_ids
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк навигации по кампусу: время запроса плоского поиска и двухуровневого '
+            '(этаж + оверлей переходов) при росте числа зданий')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buildings', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32],
+                            help='Число зданий в кампусе')
+        parser.add_argument('--floors', type=int, default=5, help='Этажей в здании')
+        parser.add_argument('--side', type=int, default=20, help='Сторона сетки локаций этажа')
+        parser.add_argument('--queries', type=int, default=50, help='Число запросов на каждый кампус')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        implementations = [
+            ('dijkstra', lambda graph, start, goal: _search(graph, start, goal)),
+            ('astar', lambda graph, start, goal: _search(graph, start, goal, graph.heuristic(goal))),
+            ('hierarchical', lambda graph, start, goal: graph.overlay().search(start, goal)),
+        ]
+
+        self.stdout.write(f'{"buildings":>9} {"nodes":>8} {"portals":>8} {"prepare ms":>11} '
+                          f'{"impl":>12} {"ms/query":>10}')
+        for buildings in options['buildings']:
+            graph, _ = build_campus_graph(buildings, options['floors'], options['side'], options['seed'])
+
+            # Разовая подготовка на версию графа, к запросу не относится
+            started = time.perf_counter()
+            overlay = graph.overlay()
+            prepare = (time.perf_counter() - started) * 1000
+            graph.astar_bounds()
+
+            # Запросы в пределах соседних зданий: типичный маршрут по кампусу
+            rnd = random.Random(options['seed'])
+            per_building = len(graph) // buildings
+            pairs = []
+            for _ in range(options['queries']):
+                building = rnd.randrange(buildings)
+                other = min(buildings - 1, building + 1)
+                pairs.append((building * per_building + rnd.randrange(per_building),
+                              other * per_building + rnd.randrange(per_building)))
+
+            for name, search in implementations:
+                started = time.perf_counter()
+                for start, goal in pairs:
+                    search(graph, start, goal)
+                elapsed = (time.perf_counter() - started) / len(pairs) * 1000
+                self.stdout.write(f'{buildings:>9} {len(graph):>8} {len(overlay.overlay):>8} {prepare:>11.0f} '
+                                  f'{name:>12} {elapsed:>10.2f}')
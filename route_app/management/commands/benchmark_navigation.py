@@ -0,0 +1,94 @@
+import heapq
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from route_app.navigation import NavigationGraph, _search
+
+
+def build_synthetic_graph(size, seed=0):
+    """
+    Квадратная сетка коридоров примерно из size локаций плюс случайные «срезки».
+    Стоимость ребра — расстояние между центроидами с небольшим шумом.
+    """
+    rnd = random.Random(seed)
+    side = max(2, int(size ** 0.5))
+    locations = []
+    edges = []
+    for row in range(side):
+        for col in range(side):
+            location_id = row * side + col + 1
+            locations.append((location_id, 1, col * 5.0, row * 5.0))
+            if col + 1 < side:
+                edges.append((location_id, location_id + 1, 5.0 * rnd.uniform(1, 1.5), True))
+            if row + 1 < side:
+                edges.append((location_id, location_id + side, 5.0 * rnd.uniform(1, 1.5), True))
+    for _ in range(side):
+        a, b = rnd.randrange(1, side * side + 1), rnd.randrange(1, side * side + 1)
+        if a != b:
+            edges.append((a, b, 5.0 * side, rnd.random() < 0.5))
+    return NavigationGraph.from_edges(locations, edges)
+
+
+def legacy_search(graph, start, goal):
+    # Прежняя реализация: полный путь хранится в каждой записи кучи и копируется при раскрытии
+    queue = [(0, start, [])]
+    visited = set()
+
+    while queue:
+        cost, current, path = heapq.heappop(queue)
+        if current in visited:
+            continue
+        visited.add(current)
+        path = path + [current]
+
+        if current == goal:
+            return path
+
+        for neighbor, edge_cost in graph.neighbors(current):
+            if neighbor not in visited:
+                heapq.heappush(queue, (cost + edge_cost, neighbor, path))
+
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк поиска пути на синтетических графах: время и пиковая память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                            help='Размеры графов (число локаций)')
+        parser.add_argument('--queries', type=int, default=5, help='Число запросов на каждый граф')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        implementations = [
+            ('legacy', lambda graph, start, goal: legacy_search(graph, start, goal)),
+            ('dijkstra', lambda graph, start, goal: _search(graph, start, goal)),
+            ('astar', lambda graph, start, goal: _search(graph, start, goal, graph.heuristic(goal))),
+        ]
+
+        self.stdout.write(f'{"size":>8} {"impl":>9} {"ms/query":>10} {"peak KiB":>10}')
+        for size in options['sizes']:
+            graph = build_synthetic_graph(size, options['seed'])
+            graph.astar_bounds()  # разовая подготовка, не относится к запросу
+            rnd = random.Random(options['seed'])
+            # Дальние пары из противоположных углов сетки — худший случай для длины пути
+            pairs = [(rnd.randrange(len(graph) // 10), len(graph) - 1 - rnd.randrange(len(graph) // 10))
+                     for _ in range(options['queries'])]
+
+            for name, search in implementations:
+                started = time.perf_counter()
+                for start, goal in pairs:
+                    search(graph, start, goal)
+                elapsed = (time.perf_counter() - started) / len(pairs) * 1000
+
+                # Память меряем отдельным прогоном: tracemalloc заметно замедляет код
+                tracemalloc.start()
+                search(graph, *pairs[0])
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(f'{len(graph):>8} {name:>9} {elapsed:>10.1f} {peak / 1024:>10.0f}')
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from route_app.graph_integrity import analyze_graph
+
+
+class Command(BaseCommand):
+    help = ('Проверить граф навигации: компоненты связности, тупики, изолированные локации, '
+            'достижимость внутри зданий и аномальные стоимости. Отчёт выводится в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', help='Файл для отчёта (по умолчанию — stdout)')
+        parser.add_argument('--indent', type=int, default=None, help='Отступ JSON')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться с ошибкой, если найдены проблемы (для запуска после импорта)')
+
+    def handle(self, *args, **options):
+        report = analyze_graph()
+        content = json.dumps(report, ensure_ascii=False, indent=options['indent'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
+
+        if options['fail'] and not report['summary']['ok']:
+            raise CommandError('Граф навигации содержит ошибки: ' + json.dumps(report['summary'], ensure_ascii=False))
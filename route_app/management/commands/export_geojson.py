@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from route_app.geojson import export_building
+from route_app.models import Building
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить строение (этажи, локации, углы и связи) в GeoJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('building_id', type=int, help='ID строения')
+        parser.add_argument('-o', '--output', help='Файл для записи (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        building = Building.objects.filter(id=options['building_id']).first()
+        if building is None:
+            raise CommandError('Строение не найдено')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for chunk in export_building(building):
+                    output.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f'Строение выгружено в {options["output"]}'))
+        else:
+            for chunk in export_building(building):
+                self.stdout.write(chunk, ending='')
+            self.stdout.write('')
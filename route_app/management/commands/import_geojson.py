@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from route_app.geojson import GeoJSONImportError, import_building
+
+
+class Command(BaseCommand):
+    help = 'Загрузить строение (этажи, локации, углы и связи) из GeoJSON одной транзакцией'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу GeoJSON')
+        parser.add_argument('--building', help='Название строения, если его нет в файле')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as source:
+                stats = import_building(source, options['building'])
+        except GeoJSONImportError as error:
+            raise CommandError('\n'.join(error.errors))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: этажей {stats["floors"]}, локаций {stats["locations"]}, '
+            f'углов {stats["corners"]}, связей {stats["connections"]}'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from route_app.route_paths import precompute_route_paths
+
+
+class Command(BaseCommand):
+    help = 'Рассчитать и сохранить пути для всех маршрутов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--async', action='store_true', dest='run_async',
+                            help='Поставить расчёт в очередь celery вместо выполнения на месте')
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            from route_app.tasks import precompute_route_paths as task
+            task.delay()
+            self.stdout.write(self.style.SUCCESS('Задача поставлена в очередь.'))
+            return
+
+        count = precompute_route_paths()
+        self.stdout.write(self.style.SUCCESS(f'Рассчитано путей: {count}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from route_app.markers import snap_markers
+
+
+class Command(BaseCommand):
+    help = 'Привязать метки резидентов на карте к локациям навигации'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--async', action='store_true', dest='run_async',
+                            help='Поставить привязку в очередь celery вместо выполнения на месте')
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            from route_app.tasks import snap_map_markers
+            snap_map_markers.delay()
+            self.stdout.write(self.style.SUCCESS('Задача поставлена в очередь.'))
+            return
+
+        count = snap_markers()
+        self.stdout.write(self.style.SUCCESS(f'Привязано меток: {count}'))
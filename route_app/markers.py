@@ -0,0 +1,109 @@
+"""
+Привязка меток резидентов (MapMarker) к локациям навигации (MarkerLocation).
+
+Метка хранит только координаты, а навигация работает между локациями, поэтому каждая метка
+привязывается к локации, в которую попадает, а если ни в одну не попадает — к ближайшей.
+Привязки пересчитываются пачкой: здания и этажи сопоставляются одним запросом, локации всех
+нужных этажей читаются одним запросом (плюс prefetch углов) и раскладываются по индексам
+FloorIndex, сохраняется всё одним bulk_create.
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from resident_app.models import MapMarker
+
+from .models import Floor, Location, MarkerLocation
+from .spatial import FloorIndex
+
+
+def snap_markers(markers=None):
+    """
+    Пересчитывает привязки для markers (queryset MapMarker, по умолчанию — все метки).
+    Метки, для которых локацию найти не удалось, теряют старую привязку.
+    Возвращает число сохранённых привязок.
+    """
+    if markers is None:
+        markers = MapMarker.objects.all()
+
+    # Строение и этаж у резидента — строки, сопоставляем их с названием здания и номером этажа
+    floor_ids = {
+        (building_name, str(number)): floor_id
+        for floor_id, number, building_name in Floor.objects.values_list('id', 'number', 'building__name')
+    }
+
+    rows = [
+        (marker_id, x, y, floor_ids.get((building, floor)))
+        for marker_id, x, y, building, floor in markers.values_list(
+            'id', 'x', 'y', 'resident__building', 'resident__floor'
+        )
+    ]
+    indexes = _load_indexes({floor_id for _, _, _, floor_id in rows if floor_id is not None})
+
+    now = timezone.now()
+    snapped = []
+    unsnapped = []
+    for marker_id, x, y, floor_id in rows:
+        nearest = indexes[floor_id].nearest(x, y) if floor_id in indexes else None
+        if nearest is None:
+            unsnapped.append(marker_id)
+            continue
+        location_id, _, distance = nearest
+        snapped.append(MarkerLocation(marker_id=marker_id, location_id=location_id, distance=distance, computed_at=now))
+
+    if unsnapped:
+        MarkerLocation.objects.filter(marker_id__in=unsnapped).delete()
+    if snapped:
+        MarkerLocation.objects.bulk_create(
+            snapped,
+            update_conflicts=True,
+            unique_fields=['marker'],
+            update_fields=['location', 'distance', 'computed_at'],
+        )
+    return len(snapped)
+
+
+def _load_indexes(floor_ids):
+    # Геометрию читаем из БД, а не из кэша планов: в воркере celery локальный кэш может отставать
+    polygons = {floor_id: [] for floor_id in floor_ids}
+    for location in Location.objects.filter(floor_id__in=floor_ids).prefetch_related('corners').order_by('id'):
+        points = [(corner.x, corner.y) for corner in location.corners.all()]
+        if len(points) >= 3:
+            polygons[location.floor_id].append((location.id, location.name, points))
+    return {floor_id: FloorIndex(None, floor_polygons) for floor_id, floor_polygons in polygons.items()}
+
+
+def snap_floor_markers(floor_ids):
+    """Пересчитывает привязки меток резидентов, находящихся на этажах floor_ids."""
+    floors = Floor.objects.filter(id__in=floor_ids).values_list('number', 'building__name')
+    if not floors:
+        return 0
+
+    condition = Q()
+    for number, building_name in floors:
+        condition |= Q(resident__building=building_name, resident__floor=str(number))
+    return snap_markers(MapMarker.objects.filter(condition))
+
+
+def resident_locations(residents):
+    """
+    {resident_id: location_id} для резидентов с меткой на карте.
+    residents — список резидентов, загруженных с select_related('map_marker__snapped_location').
+    Метки без сохранённой привязки привязываются на месте.
+    """
+    result = {}
+    missing = []
+    for resident in residents:
+        marker = getattr(resident, 'map_marker', None)
+        if marker is None:
+            continue
+        try:
+            result[resident.id] = marker.snapped_location.location_id
+        except MarkerLocation.DoesNotExist:
+            missing.append(marker.id)
+
+    if missing:
+        snap_markers(MapMarker.objects.filter(id__in=missing))
+        result.update(
+            MarkerLocation.objects.filter(marker_id__in=missing).values_list('marker__resident_id', 'location_id')
+        )
+    return result
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_app', '0009_alter_tour_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoutePath',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precomputed_path', serialize=False, to='route_app.route', verbose_name='Маршрут')),
+                ('location_ids', models.JSONField(blank=True, help_text='Пусто, если пути нет', null=True, verbose_name='Путь (id локаций)')),
+                ('distance', models.FloatField(blank=True, null=True, verbose_name='Длина, м')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Рассчитанный путь',
+                'verbose_name_plural': 'Рассчитанные пути',
+            },
+        ),
+    ]
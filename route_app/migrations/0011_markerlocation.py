@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resident_app', '0007_alter_resident_photo'),
+        ('route_app', '0010_routepath'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkerLocation',
+            fields=[
+                ('marker', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapped_location', serialize=False, to='resident_app.mapmarker', verbose_name='Метка на карте')),
+                ('distance', models.FloatField(default=0, help_text='0, если метка внутри локации', verbose_name='Расстояние до локации')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapped_markers', to='route_app.location', verbose_name='Локация')),
+            ],
+            options={
+                'verbose_name': 'Привязка метки к локации',
+                'verbose_name_plural': 'Привязки меток к локациям',
+            },
+        ),
+    ]
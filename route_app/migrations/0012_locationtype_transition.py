@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_app', '0011_markerlocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locationtype',
+            name='transition',
+            field=models.CharField(blank=True, choices=[('stairs', 'Лестница'), ('elevator', 'Лифт'), ('escalator', 'Эскалатор'), ('ramp', 'Пандус')], default='', help_text='Для лестниц, лифтов и т.п.: учитывается при построении маршрута между этажами', max_length=20, verbose_name='Переход между этажами'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_app', '0012_locationtype_transition'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='connection',
+            name='cost',
+            field=models.FloatField(default=1.0, help_text='Стоимость перехода, м', validators=[django.core.validators.MinValueValidator(0)], verbose_name='Стоимость перехода, м'),
+        ),
+    ]
@@ -1,6 +1,7 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 
-from resident_app.models import Resident
+from resident_app.models import MapMarker, Resident
 from dzavod.validators import validate_image
 
 
@@ -17,6 +18,12 @@ class Building(models.Model):
 
 
 class LocationType(models.Model):
+    class Transition(models.TextChoices):
+        STAIRS = 'stairs', 'Лестница'
+        ELEVATOR = 'elevator', 'Лифт'
+        ESCALATOR = 'escalator', 'Эскалатор'
+        RAMP = 'ramp', 'Пандус'
+
     name = models.CharField(max_length=100, verbose_name='Название')
     color = models.CharField(
         max_length=7,
@@ -24,6 +31,14 @@ class LocationType(models.Model):
         verbose_name='Цвет (hex)',
         help_text='Например, #ff0000 для красного'
     )
+    transition = models.CharField(
+        max_length=20,
+        choices=Transition.choices,
+        blank=True,
+        default='',
+        verbose_name='Переход между этажами',
+        help_text='Для лестниц, лифтов и т.п.: учитывается при построении маршрута между этажами'
+    )
 
     class Meta:
         verbose_name = 'Тип локации'
@@ -101,13 +116,46 @@ class Route(models.Model):
         return self.name
 
 
+class RoutePath(models.Model):
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='precomputed_path',
+                                 verbose_name='Маршрут')
+    location_ids = models.JSONField(null=True, blank=True, verbose_name='Путь (id локаций)',
+                                    help_text='Пусто, если пути нет')
+    distance = models.FloatField(null=True, blank=True, verbose_name='Длина, м')
+    computed_at = models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Рассчитанный путь'
+        verbose_name_plural = 'Рассчитанные пути'
+
+    def __str__(self):
+        return f'Путь для {self.route}'
+
+
+class MarkerLocation(models.Model):
+    marker = models.OneToOneField(MapMarker, on_delete=models.CASCADE, primary_key=True, related_name='snapped_location',
+                                  verbose_name='Метка на карте')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='snapped_markers',
+                                 verbose_name='Локация')
+    distance = models.FloatField(default=0, verbose_name='Расстояние до локации',
+                                 help_text='0, если метка внутри локации')
+    computed_at = models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Привязка метки к локации'
+        verbose_name_plural = 'Привязки меток к локациям'
+
+    def __str__(self):
+        return f'{self.marker} → {self.location}'
+
+
 class Connection(models.Model):
     from_location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='connections_from',
                                       verbose_name='Откуда')
     to_location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='connections_to',
                                     verbose_name='Куда')
     bidirectional = models.BooleanField(default=True, verbose_name='Двунаправленная связь')
-    cost = models.FloatField(default=1.0, help_text='Стоимость перехода, м',
+    cost = models.FloatField(default=1.0, validators=[MinValueValidator(0)], help_text='Стоимость перехода, м',
                              verbose_name='Стоимость перехода, м')
 
     class Meta:
@@ -1,35 +1,501 @@
 import heapq
-from collections import defaultdict
+import threading
+import time
+from array import array
+from math import hypot, inf as INF, isnan, nan as NAN
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg
 
-def find_shortest_path(start_location, end_location):
-    # Строим граф: {location_id: [(neighbor_id, cost), ...]}
-    graph = defaultdict(list)
+from .hierarchy import FloorOverlay
 
-    from route_app.models import Connection
 
-    connections = Connection.objects.all()
-    for conn in connections:
-        graph[conn.from_location_id].append((conn.to_location_id, conn.cost))
-        if conn.bidirectional:
-            graph[conn.to_location_id].append((conn.from_location_id, conn.cost))
+GRAPH_VERSION_KEY = 'route_app:graph_version'
+PATH_CACHE_TIMEOUT = 60 * 60
 
-    # Алгоритм Дейкстры
-    queue = [(0, start_location.id, [])]  # (общая стоимость, текущая локация, путь)
-    visited = set()
+DIJKSTRA = 'dijkstra'
+ASTAR = 'astar'
+HIERARCHICAL = 'hierarchical'
+ALGORITHMS = (DIJKSTRA, ASTAR, HIERARCHICAL)
+
+# Режимы маршрута: в доступном режиме нельзя пользоваться лестницами и эскалаторами
+DEFAULT_PROFILE = 'default'
+ACCESSIBLE_PROFILE = 'accessible'
+PROFILES = (DEFAULT_PROFILE, ACCESSIBLE_PROFILE)
+
+# Коды видов рёбер в NavigationGraph.arc_kinds (значения совпадают с LocationType.Transition)
+PLAIN, STAIRS, ELEVATOR, ESCALATOR, RAMP = range(5)
+TRANSITION_CODES = {'stairs': STAIRS, 'elevator': ELEVATOR, 'escalator': ESCALATOR, 'ramp': RAMP}
+EXCLUDED_BY_PROFILE = {
+    DEFAULT_PROFILE: frozenset(),
+    ACCESSIBLE_PROFILE: frozenset({STAIRS, ESCALATOR}),
+}
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+class NavigationGraph:
+    """
+    Скомпилированный граф связей в компактном виде (CSR):
+    соседи узла i лежат в targets/costs в диапазоне offsets[i]:offsets[i + 1].
+    Узлы индексируются плотно, ids[i] — id локации, index[location_id] — номер узла.
+
+    arc_kinds[i] — вид ребра (обычное, лестница, лифт...). Режимы маршрута — это слои
+    над одной и той же топологией: слой отличается только массивом стоимостей, в котором
+    запрещённые режимом рёбра имеют бесконечную стоимость (см. layer()).
+    """
+
+    def __init__(self, version, ids, offsets, targets, costs, floors=None, xs=None, ys=None, arc_kinds=None,
+                 lengths=None):
+        self.version = version
+        self.ids = ids
+        self.index = {location_id: i for i, location_id in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        # Этаж и центроид каждого узла; у локаций без углов координаты — nan
+        self.floors = floors if floors is not None else array('q', [0] * len(ids))
+        self.xs = xs if xs is not None else array('d', [NAN] * len(ids))
+        self.ys = ys if ys is not None else array('d', [NAN] * len(ids))
+        self.arc_kinds = arc_kinds
+        # Длина ребра в метрах без штрафов за переходы — для подсказок по шагам
+        self.lengths = lengths if lengths is not None else costs
+        self._astar_bounds = None
+        self._reversed = None
+        self._layers = {}
+        self._overlay = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_edges(cls, locations, edges, version=0, transitions=None, penalties=None):
+        """
+        locations — (id, floor_id, x, y) всех локаций, где x/y — центроид или None;
+        edges — (from_id, to_id, cost, bidirectional);
+        transitions — {id локации: (номер этажа, тип перехода или '')}: по ним рёбра
+        между этажами получают вид и штраф penalties[вид] за каждый пройденный этаж.
+        """
+        edges = list(edges)
+        transitions = transitions or {}
+        penalties = penalties or {}
+        nodes = {location_id: (floor_id, x, y) for location_id, floor_id, x, y in locations}
+        for from_id, to_id, _, _ in edges:
+            nodes.setdefault(from_id, (0, None, None))
+            nodes.setdefault(to_id, (0, None, None))
+
+        ids = array('q', sorted(nodes))
+        index = {location_id: i for i, location_id in enumerate(ids)}
+
+        floors = array('q')
+        xs = array('d')
+        ys = array('d')
+        for location_id in ids:
+            floor_id, x, y = nodes[location_id]
+            floors.append(floor_id or 0)
+            xs.append(NAN if x is None else x)
+            ys.append(NAN if y is None else y)
+
+        adjacency = [[] for _ in ids]
+        for from_id, to_id, cost, bidirectional in edges:
+            kind, penalty = _arc_kind(transitions.get(from_id), transitions.get(to_id), penalties)
+            adjacency[index[from_id]].append((index[to_id], cost, penalty, kind))
+            if bidirectional:
+                adjacency[index[to_id]].append((index[from_id], cost, penalty, kind))
+
+        offsets = array('q', [0])
+        targets = array('q')
+        costs = array('d')
+        lengths = array('d')
+        arc_kinds = array('b')
+        for neighbors in adjacency:
+            for target, cost, penalty, kind in neighbors:
+                targets.append(target)
+                costs.append(cost + penalty)
+                lengths.append(cost)
+                arc_kinds.append(kind)
+            offsets.append(len(targets))
+
+        return cls(version, ids, offsets, targets, costs, floors, xs, ys, arc_kinds, lengths)
+
+    @classmethod
+    def load(cls, version):
+        from route_app.models import Connection, Location
+
+        # Центроид считается так же, как в Location.get_center(), но одним запросом на все локации
+        rows = Location.objects.annotate(
+            center_x=Avg('corners__x'), center_y=Avg('corners__y')
+        ).values_list('id', 'floor_id', 'center_x', 'center_y', 'floor__number', 'location_type__transition')
+        locations = []
+        transitions = {}
+        for location_id, floor_id, x, y, level, transition in rows:
+            locations.append((location_id, floor_id, x, y))
+            transitions[location_id] = (level, transition or '')
+        edges = Connection.objects.values_list('from_location_id', 'to_location_id', 'cost', 'bidirectional')
+        return cls.from_edges(locations, edges, version, transitions, transition_penalties())
+
+    def neighbors(self, node):
+        for i in range(self.offsets[node], self.offsets[node + 1]):
+            yield self.targets[i], self.costs[i]
+
+    def reversed(self):
+        """Граф с обращёнными рёбрами (нужен для поиска «до узла»), строится один раз."""
+        if self._reversed is None:
+            n = len(self)
+            counts = array('q', [0]) * (n + 1)
+            for target in self.targets:
+                counts[target + 1] += 1
+            offsets = array('q', [0]) * (n + 1)
+            for i in range(n):
+                offsets[i + 1] = offsets[i] + counts[i + 1]
+            fill = array('q', offsets)
+            targets = array('q', [0]) * len(self.targets)
+            costs = array('d', [0]) * len(self.costs)
+            for u in range(n):
+                for i in range(self.offsets[u], self.offsets[u + 1]):
+                    v = self.targets[i]
+                    targets[fill[v]] = u
+                    costs[fill[v]] = self.costs[i]
+                    fill[v] += 1
+            reversed_graph = NavigationGraph(self.version, self.ids, offsets, targets, costs,
+                                             self.floors, self.xs, self.ys)
+            reversed_graph.index = self.index
+            self._reversed = reversed_graph
+        return self._reversed
+
+    def layer(self, profile):
+        """Граф для режима маршрута: та же топология, но запрещённые режимом рёбра недоступны."""
+        excluded = EXCLUDED_BY_PROFILE[profile]
+        if not excluded or self.arc_kinds is None:
+            return self
+        layer = self._layers.get(profile)
+        if layer is None:
+            costs = array('d', (
+                INF if kind in excluded else cost for cost, kind in zip(self.costs, self.arc_kinds)
+            ))
+            layer = NavigationGraph(self.version, self.ids, self.offsets, self.targets, costs,
+                                    self.floors, self.xs, self.ys, self.arc_kinds, self.lengths)
+            layer.index = self.index
+            self._layers[profile] = layer
+        return layer
+
+    def overlay(self):
+        """Оверлей порталов этажей для двухуровневого поиска (см. hierarchy), строится один раз."""
+        if self._overlay is None:
+            self._overlay = FloorOverlay(self)
+        return self._overlay
+
+    def has_center(self, node):
+        return not isnan(self.xs[node])
+
+    def astar_bounds(self):
+        """
+        Данные для эвристики A*, считаются один раз на версию графа:
+
+        scales[floor_id] — сколько метров стоимости минимум приходится на единицу координат
+        на этом этаже (минимум cost / расстояние между центроидами по рёбрам этажа);
+        exit_costs[i] — кратчайшая стоимость, за которую из узла i можно уйти с этажа
+        или в локацию без координат. Эвристика ограничивается ею, иначе путь через
+        другой этаж мог бы оказаться короче оценки.
+        """
+        if self._astar_bounds is not None:
+            return self._astar_bounds
+
+        n = len(self)
+        scales = {}
+        exit_costs = [INF] * n
+        reverse = [[] for _ in range(n)]
+
+        for u in range(n):
+            mapped_u = self.has_center(u)
+            for v, cost in self.neighbors(u):
+                if mapped_u and self.has_center(v) and self.floors[u] == self.floors[v]:
+                    reverse[v].append((u, cost))
+                    distance = hypot(self.xs[u] - self.xs[v], self.ys[u] - self.ys[v])
+                    if distance > 0:
+                        floor_id = self.floors[u]
+                        scales[floor_id] = min(scales.get(floor_id, INF), max(cost, 0) / distance)
+                elif mapped_u:
+                    exit_costs[u] = min(exit_costs[u], max(cost, 0))
+
+        # Обратная Дейкстра от всех «выходов» сразу по рёбрам внутри этажей
+        queue = [(cost, u) for u, cost in enumerate(exit_costs) if cost < INF]
+        heapq.heapify(queue)
+        while queue:
+            cost, u = heapq.heappop(queue)
+            if cost > exit_costs[u]:
+                continue
+            for w, edge_cost in reverse[u]:
+                new_cost = cost + max(edge_cost, 0)
+                if new_cost < exit_costs[w]:
+                    exit_costs[w] = new_cost
+                    heapq.heappush(queue, (new_cost, w))
+
+        self._astar_bounds = (scales, exit_costs)
+        return self._astar_bounds
+
+    def heuristic(self, goal):
+        """
+        Допустимая и монотонная оценка расстояния до goal. Для узлов на других этажах
+        и без координат оценка нулевая — там поиск вырождается в Дейкстру.
+        """
+        if not self.has_center(goal):
+            return None
+
+        scales, exit_costs = self.astar_bounds()
+        floor_id = self.floors[goal]
+        scale = scales.get(floor_id, 0)
+        if not scale or scale == INF:
+            return None
+
+        goal_x, goal_y = self.xs[goal], self.ys[goal]
+        floors, xs, ys = self.floors, self.xs, self.ys
+
+        def estimate(node):
+            if floors[node] != floor_id or isnan(xs[node]):
+                return 0
+            return min(scale * hypot(xs[node] - goal_x, ys[node] - goal_y), exit_costs[node])
+
+        return estimate
+
+
+def transition_penalties():
+    """Штрафы из settings.NAVIGATION_TRANSITION_PENALTIES по кодам видов рёбер."""
+    configured = getattr(settings, 'NAVIGATION_TRANSITION_PENALTIES', {})
+    return {TRANSITION_CODES[name]: float(penalty) for name, penalty in configured.items() if name in TRANSITION_CODES}
+
+
+def _arc_kind(source, target, penalties):
+    """
+    Вид и штраф ребра по (номер этажа, тип перехода) его концов.
+    Ребро, касающееся лестницы, — лестница. Ребро между этажами берёт тип перехода
+    с любого из концов, а если его нет — считается лестницей: про такой переход нельзя
+    сказать, что он доступен. Штраф умножается на число пройденных этажей.
+    """
+    if source is None or target is None:
+        return PLAIN, 0
+    (source_level, source_kind), (target_level, target_kind) = source, target
+    kinds = {TRANSITION_CODES.get(source_kind, PLAIN), TRANSITION_CODES.get(target_kind, PLAIN)}
+
+    floors = abs(source_level - target_level) if source_level is not None and target_level is not None else 0
+    if STAIRS in kinds:
+        kind = STAIRS
+    elif not floors:
+        return PLAIN, 0
+    else:
+        kind = next((kind for kind in (ESCALATOR, ELEVATOR, RAMP) if kind in kinds), STAIRS)
+    return kind, penalties.get(kind, 0) * floors
+
+
+def get_graph_version():
+    version = cache.get(GRAPH_VERSION_KEY)
+    if version is None:
+        # Стартуем со временного штампа, а не с 1: после вытеснения ключа из кэша
+        # версия не должна совпасть с той, по которой уже собран чей-то граф
+        cache.add(GRAPH_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(GRAPH_VERSION_KEY)
+    return version
+
+
+def invalidate_graph():
+    try:
+        cache.incr(GRAPH_VERSION_KEY)
+    except ValueError:
+        cache.add(GRAPH_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_graph():
+    """
+    Возвращает граф процесса, пересобирая его только если версия в кэше изменилась.
+    """
+    global _graph
+
+    version = get_graph_version()
+    graph = _graph
+    if graph is not None and graph.version == version:
+        return graph
+
+    with _graph_lock:
+        if _graph is None or _graph.version != version:
+            _graph = NavigationGraph.load(version)
+        return _graph
+
+
+def find_shortest_path(start_location, end_location, algorithm=DIJKSTRA):
+    result = shortest_path(get_graph(), start_location.id, end_location.id, algorithm)
+    if result is None:
+        return None  # пути нет
+    return result[0]  # список id локаций
+
+
+def find_cached_path(start_id, end_id, algorithm=DIJKSTRA, profile=DEFAULT_PROFILE):
+    """
+    Путь между двумя локациями с кэшированием по (откуда, куда, алгоритм, режим, версия графа).
+    После любого изменения графа версия меняется, и старые записи просто перестают читаться.
+    """
+    graph = get_graph()
+    key = f'route_app:path:{graph.version}:{algorithm}:{profile}:{start_id}:{end_id}'
+    path = cache.get(key)
+    if path is None:
+        result = shortest_path(graph.layer(profile), start_id, end_id, algorithm)
+        path = result[0] if result else []  # пустой список — «пути нет», чтобы не путать с промахом кэша
+        cache.set(key, path, PATH_CACHE_TIMEOUT)
+    return path or None
+
+
+def shortest_path(graph, start_id, end_id, algorithm=DIJKSTRA):
+    """
+    Возвращает (список id локаций, длина пути) или None, если пути нет.
+    """
+    start = graph.index.get(start_id)
+    goal = graph.index.get(end_id)
+    if start is None or goal is None:
+        return None
+
+    if algorithm == HIERARCHICAL:
+        result = graph.overlay().search(start, goal)
+    else:
+        heuristic = graph.heuristic(goal) if algorithm == ASTAR else None
+        result = _search(graph, start, goal, heuristic)
+    if result is None:
+        return None
+    path, cost = result
+    return [graph.ids[node] for node in path], cost
+
+
+def shortest_paths_to_many(graph, start_id, target_ids, limit=None):
+    """
+    Один проход Дейкстры от start_id сразу до набора целей. Поиск останавливается,
+    как только закрыты все цели (или limit ближайших из них).
+    Возвращает [(id цели, длина, список id локаций)] по возрастанию длины;
+    недостижимые цели в ответ не попадают.
+    """
+    start = graph.index.get(start_id)
+    if start is None:
+        return []
+
+    remaining = {graph.index[target_id] for target_id in target_ids if target_id in graph.index}
+    if limit is not None:
+        limit = min(limit, len(remaining))
+    else:
+        limit = len(remaining)
+
+    n = len(graph)
+    best = array('d', [INF]) * n
+    parents = array('q', [-1]) * n
+    best[start] = 0
+    queue = [(0, start)]
+    offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+    found = []
+    settled = bytearray(n)
+
+    while queue and len(found) < limit:
+        cost, current = heapq.heappop(queue)
+        if settled[current]:
+            continue
+        settled[current] = 1
+        if current in remaining:
+            # Узлы снимаются с кучи по возрастанию стоимости, поэтому found уже упорядочен
+            remaining.discard(current)
+            found.append((current, cost))
+
+        for i in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[i]
+            new_cost = cost + costs[i]
+            if not settled[neighbor] and new_cost < best[neighbor]:
+                best[neighbor] = new_cost
+                parents[neighbor] = current
+                heapq.heappush(queue, (new_cost, neighbor))
+
+    return [
+        (graph.ids[node], cost, [graph.ids[step] for step in tree_path(parents, node)])
+        for node, cost in found
+    ]
+
+
+def shortest_path_tree(graph, source, reverse=False):
+    """
+    Полный проход Дейкстры от узла source: (стоимости, предшественники) для всех узлов.
+    С reverse=True идёт по обратным рёбрам — стоимости до source от каждого узла,
+    а предшественник указывает следующий шаг в сторону source.
+    """
+    if reverse:
+        graph = graph.reversed()
+
+    n = len(graph)
+    best = array('d', [INF]) * n
+    parents = array('q', [-1]) * n
+    best[source] = 0
+    queue = [(0, source)]
+    offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+    settled = bytearray(n)
 
     while queue:
-        cost, current_id, path = heapq.heappop(queue)
-        if current_id in visited:
+        cost, current = heapq.heappop(queue)
+        if settled[current]:
             continue
-        visited.add(current_id)
-        path = path + [current_id]
+        settled[current] = 1
+        for i in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[i]
+            new_cost = cost + costs[i]
+            if not settled[neighbor] and new_cost < best[neighbor]:
+                best[neighbor] = new_cost
+                parents[neighbor] = current
+                heapq.heappush(queue, (new_cost, neighbor))
+
+    return best, parents
+
+
+def _search(graph, start, goal, heuristic=None):
+    """
+    Дейкстра, а с эвристикой — A*. В куче лежат только узлы: лучшая стоимость и
+    предшественник хранятся в плоских массивах, путь восстанавливается один раз в конце.
+    Эвристика монотонна, поэтому узел, снятый с кучи по лучшей стоимости, окончателен.
+    Снятые узлы помечаются в settled и больше не улучшаются: даже с отрицательной стоимостью
+    связи в данных поиск завершается, а дерево предшественников остаётся без циклов.
+    """
+    if heuristic is None:
+        heuristic = _zero
+
+    n = len(graph)
+    best = array('d', [INF]) * n
+    parents = array('q', [-1]) * n
+    best[start] = 0
+    queue = [(heuristic(start), 0, start)]  # (оценка, стоимость, текущий узел)
+    offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+    settled = bytearray(n)
+
+    while queue:
+        _, cost, current = heapq.heappop(queue)
+        if settled[current]:
+            continue  # устаревшая запись
+        settled[current] = 1
+
+        if current == goal:
+            return tree_path(parents, goal), cost
+
+        for i in range(offsets[current], offsets[current + 1]):
+            neighbor = targets[i]
+            new_cost = cost + costs[i]
+            if not settled[neighbor] and new_cost < best[neighbor]:
+                best[neighbor] = new_cost
+                parents[neighbor] = current
+                heapq.heappush(queue, (new_cost + heuristic(neighbor), new_cost, neighbor))
+
+    return None
+
 
-        if current_id == end_location.id:
-            return path  # список id локаций
+def tree_path(parents, node):
+    """Путь от корня дерева предшественников до node (список номеров узлов)."""
+    path = []
+    while node != -1:
+        path.append(node)
+        node = parents[node]
+    path.reverse()
+    return path
 
-        for neighbor_id, edge_cost in graph[current_id]:
-            if neighbor_id not in visited:
-                heapq.heappush(queue, (cost + edge_cost, neighbor_id, path))
 
-    return None  # пути нет
+def _zero(node):
+    return 0
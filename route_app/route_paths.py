@@ -0,0 +1,201 @@
+"""
+Таблица заранее рассчитанных путей для маршрутов (Route → RoutePath).
+
+Полный пересчёт группирует маршруты по начальной локации: один проход Дейкстры
+от каждой начальной точки даёт пути сразу для всех её маршрутов. При изменении
+одной связи пересчитываются только затронутые маршруты.
+"""
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Route, RoutePath
+from .navigation import (
+    DIJKSTRA, NavigationGraph, get_graph, get_graph_version, shortest_path, shortest_path_tree, tree_path
+)
+
+EPSILON = 1e-9
+
+
+def load_fresh_graph():
+    # В воркере celery локальный кэш может отставать от веб-процессов, поэтому граф читаем из БД
+    return NavigationGraph.load(get_graph_version())
+
+
+def get_route_path(route, algorithm=DIJKSTRA):
+    """
+    Путь маршрута из таблицы (route должен быть загружен с select_related('precomputed_path')).
+    Если записи ещё нет — считает путь на месте и сохраняет его.
+    """
+    try:
+        return route.precomputed_path.location_ids
+    except RoutePath.DoesNotExist:
+        return compute_route_path(route, algorithm)
+
+
+def compute_route_path(route, algorithm=DIJKSTRA):
+    """Считает путь маршрута по текущему графу и сохраняет его поверх прежней записи."""
+    result = shortest_path(get_graph(), route.start_location_id, route.end_location_id, algorithm)
+    location_ids, distance = result if result else (None, None)
+    _save([RoutePath(route=route, location_ids=location_ids, distance=distance, computed_at=timezone.now())])
+    return location_ids
+
+
+def precompute_route_paths(routes=None, graph=None):
+    """
+    Рассчитывает и сохраняет пути для routes (по умолчанию — для всех маршрутов).
+    Возвращает число сохранённых записей.
+    """
+    graph = graph or load_fresh_graph()
+    if routes is None:
+        routes = Route.objects.all()
+
+    routes_by_start = defaultdict(list)
+    for route_id, start_id, end_id in routes.values_list('id', 'start_location_id', 'end_location_id'):
+        routes_by_start[start_id].append((route_id, end_id))
+
+    now = timezone.now()
+    paths = []
+    for start_id, start_routes in routes_by_start.items():
+        source = graph.index.get(start_id)
+        tree = shortest_path_tree(graph, source) if source is not None else None
+        for route_id, end_id in start_routes:
+            location_ids, distance = _path_from_tree(graph, tree, end_id)
+            paths.append(RoutePath(route_id=route_id, location_ids=location_ids, distance=distance, computed_at=now))
+
+    _save(paths)
+    return len(paths)
+
+
+def refresh_route_paths(old_state, new_state, graph=None):
+    """
+    Обновляет пути после изменения одной связи.
+    old_state/new_state — (from_id, to_id, cost, bidirectional) до и после, None если связи не было/не стало.
+
+    Если ребро подорожало или исчезло, пересчитываются только маршруты, чей путь через него проходит.
+    Если ребро подешевело или появилось, маршрут s→t можно улучшить только через него:
+    кандидат d(s, u) + cost + d(v, t) считается по двум деревьям кратчайших путей.
+    """
+    graph = graph or load_fresh_graph()
+    old_arcs = _arcs(old_state)
+    new_arcs = _arcs(new_state)
+
+    worse = {arc for arc, cost in old_arcs.items() if new_arcs.get(arc, float('inf')) > cost}
+    better = {arc: cost for arc, cost in new_arcs.items() if cost < old_arcs.get(arc, float('inf'))}
+    if not worse and not better:
+        return 0
+
+    stale_ids = set()
+    if worse:
+        for route_id, location_ids in _paths_through(worse).values_list('route_id', 'location_ids'):
+            location_ids = location_ids or []
+            if any(arc in worse for arc in zip(location_ids, location_ids[1:])):
+                stale_ids.add(route_id)
+
+    updated = []
+    if better:
+        # Для проверки улучшения хватает концов маршрута и длины — сами пути не читаем
+        trees = {}
+        now = timezone.now()
+        stored = RoutePath.objects.values_list(
+            'route_id', 'route__start_location_id', 'route__end_location_id', 'distance'
+        )
+        for route_id, start_id, end_id, distance in stored.iterator():
+            if route_id in stale_ids:
+                continue
+            improved = _improve(graph, trees, better, start_id, end_id, distance)
+            if improved is not None:
+                location_ids, distance = improved
+                updated.append(RoutePath(route_id=route_id, location_ids=location_ids, distance=distance,
+                                         computed_at=now))
+
+    _save(updated)
+    refreshed = len(updated)
+    if stale_ids:
+        refreshed += precompute_route_paths(Route.objects.filter(id__in=stale_ids), graph)
+
+    # Маршруты без сохранённого пути заодно рассчитываем — так таблица догоняет новые записи
+    missing = Route.objects.filter(precomputed_path__isnull=True)
+    return refreshed + precompute_route_paths(missing, graph)
+
+
+def _paths_through(arcs):
+    """
+    Сохранённые пути, которые могут проходить по arcs. Где JSON поддерживает containment
+    (PostgreSQL), отбор идёт в SQL по паре концов дуги; порядок узлов проверяет вызывающий.
+    """
+    paths = RoutePath.objects.all()
+    if connection.features.supports_json_field_contains:
+        condition = Q()
+        for from_id, to_id in arcs:
+            condition |= Q(location_ids__contains=[from_id, to_id])
+        paths = paths.filter(condition)
+    return paths
+
+
+def _improve(graph, trees, better, start_id, end_id, distance):
+    start = graph.index.get(start_id)
+    end = graph.index.get(end_id)
+    if start is None or end is None:
+        return None
+
+    current = distance if distance is not None else float('inf')
+    best = None
+    for from_id, to_id in better:
+        u, v = graph.index.get(from_id), graph.index.get(to_id)
+        if u is None or v is None:
+            continue
+        # В графе к стоимости связи уже добавлен штраф за переход между этажами
+        cost = _arc_cost(graph, u, v)
+        if (u, True) not in trees:
+            trees[(u, True)] = shortest_path_tree(graph, u, reverse=True)
+        if (v, False) not in trees:
+            trees[(v, False)] = shortest_path_tree(graph, v)
+        to_u, to_u_parents = trees[(u, True)]
+        from_v, from_v_parents = trees[(v, False)]
+
+        candidate = to_u[start] + cost + from_v[end]
+        if candidate < current - EPSILON:
+            current = candidate
+            # В обратном дереве путь идёт от u к start, разворачиваем его
+            head = tree_path(to_u_parents, start)[::-1]
+            tail = tree_path(from_v_parents, end)
+            best = ([graph.ids[node] for node in head + tail], candidate)
+    return best
+
+
+def _arc_cost(graph, u, v):
+    return min((cost for target, cost in graph.neighbors(u) if target == v), default=float('inf'))
+
+
+def _arcs(state):
+    if state is None:
+        return {}
+    from_id, to_id, cost, bidirectional = state
+    arcs = {(from_id, to_id): cost}
+    if bidirectional:
+        arcs[(to_id, from_id)] = min(cost, arcs.get((to_id, from_id), cost))
+    return arcs
+
+
+def _path_from_tree(graph, tree, end_id):
+    end = graph.index.get(end_id)
+    if tree is None or end is None:
+        return None, None
+    best, parents = tree
+    if best[end] == float('inf'):
+        return None, None
+    return [graph.ids[node] for node in tree_path(parents, end)], best[end]
+
+
+def _save(paths):
+    if not paths:
+        return
+    RoutePath.objects.bulk_create(
+        paths,
+        update_conflicts=True,
+        unique_fields=['route'],
+        update_fields=['location_ids', 'distance', 'computed_at'],
+    )
@@ -27,7 +27,7 @@ class FloorSerializer(serializers.ModelSerializer):
 class LocationTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = LocationType
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'transition']
 
 
 class LocationCornerSerializer(serializers.ModelSerializer):
@@ -109,7 +109,88 @@ class RouteSerializer(serializers.ModelSerializer):
         ]
 
 
+# Облегчённые сериализаторы для ?view=compact: только id связанных объектов
+
+class FloorCompactSerializer(serializers.ModelSerializer):
+    building_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Floor
+        fields = ['id', 'number', 'building_id']
+
+
+class LocationCompactSerializer(serializers.ModelSerializer):
+    floor_id = serializers.IntegerField(read_only=True)
+    location_type_id = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Location
+        fields = ['id', 'name', 'floor_id', 'location_type_id']
+
+
+class ConnectionCompactSerializer(serializers.ModelSerializer):
+    from_location_id = serializers.IntegerField(read_only=True)
+    to_location_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Connection
+        fields = ['id', 'from_location_id', 'to_location_id', 'bidirectional', 'cost']
+
+
+class RouteCompactSerializer(serializers.ModelSerializer):
+    start_location_id = serializers.IntegerField(read_only=True)
+    end_location_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Route
+        fields = ['id', 'name', 'start_location_id', 'end_location_id']
+
+
 class TourSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tour
         fields = '__all__'
+
+
+class LocatedLocationSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class NavigationTargetSerializer(serializers.Serializer):
+    location_id = serializers.IntegerField()
+    name = serializers.CharField()
+    distance = serializers.FloatField(help_text='Длина пути, м')
+    path = serializers.ListField(child=serializers.IntegerField(), help_text='id локаций по порядку')
+
+
+class NavigationStepSerializer(serializers.Serializer):
+    action = serializers.CharField(help_text='start, straight, slight_left/right, left/right, sharp_left/right, '
+                                             'floor (смена этажа), passage (переход на другой этаж без лестницы '
+                                             'или в другое здание), arrive')
+    turn = serializers.IntegerField(allow_null=True, help_text='Угол поворота в градусах, положительный — направо')
+    distance = serializers.FloatField(help_text='Длина шага, м')
+    location_id = serializers.IntegerField(help_text='Локация, в которой заканчивается шаг')
+    name = serializers.CharField()
+    floor = serializers.IntegerField(allow_null=True, help_text='Номер этажа')
+    transition = serializers.CharField(allow_null=True, help_text='stairs, elevator, escalator или ramp для смены этажа')
+
+
+class NavigationStepsSerializer(serializers.Serializer):
+    distance = serializers.FloatField(help_text='Длина пути без штрафов за переходы, м')
+    steps = NavigationStepSerializer(many=True)
+
+
+class TourStopSerializer(serializers.Serializer):
+    resident_id = serializers.IntegerField()
+    resident_name = serializers.CharField()
+    location_id = serializers.IntegerField()
+    distance = serializers.FloatField(help_text='Расстояние от предыдущей остановки, м')
+    path = serializers.ListField(child=serializers.IntegerField(), help_text='id локаций от предыдущей остановки')
+
+
+class TourPathSerializer(serializers.Serializer):
+    distance = serializers.FloatField(help_text='Общая длина маршрута, м')
+    stops = TourStopSerializer(many=True)
+    unplaced = serializers.ListField(child=serializers.IntegerField(),
+                                     help_text='id резидентов без локации на карте или недостижимых')
@@ -0,0 +1,186 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+
+from resident_app.models import MapMarker, Resident
+from .floor_plans import invalidate_floor_plans
+from .models import Connection, Floor, Location, LocationCorner, LocationType, Route, RoutePath
+from .navigation import invalidate_graph
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=LocationCorner)
+@receiver(post_delete, sender=LocationCorner)
+def invalidate_navigation_graph(sender, **kwargs):
+    # Сбрасываем версию только после коммита, иначе граф могут пересобрать по старым данным
+    transaction.on_commit(invalidate_graph)
+
+
+def _connection_state(connection):
+    return [connection.from_location_id, connection.to_location_id, connection.cost, connection.bidirectional]
+
+
+@receiver(pre_save, sender=Connection)
+def remember_connection_state(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        old = Connection.objects.filter(pk=instance.pk).values_list(
+            'from_location_id', 'to_location_id', 'cost', 'bidirectional'
+        ).first()
+    instance._old_state = list(old) if old else None
+
+
+@receiver(post_save, sender=Connection)
+def refresh_paths_on_connection_save(sender, instance, **kwargs):
+    _schedule_refresh(getattr(instance, '_old_state', None), _connection_state(instance))
+
+
+@receiver(post_delete, sender=Connection)
+def refresh_paths_on_connection_delete(sender, instance, **kwargs):
+    _schedule_refresh(_connection_state(instance), None)
+
+
+def _schedule_refresh(old_state, new_state):
+    if old_state == new_state:
+        return
+
+    from .tasks import refresh_route_paths
+    transaction.on_commit(lambda: refresh_route_paths.delay(old_state, new_state))
+
+
+# Этаж, номер этажа и тип перехода меняют штрафы сразу многих рёбер — пути маршрутов
+# пересчитываются целиком, а не по одной связи
+
+def _precompute_routes_on_commit():
+    from .tasks import precompute_route_paths
+    transaction.on_commit(invalidate_graph)
+    transaction.on_commit(precompute_route_paths.delay)
+
+
+@receiver(post_save, sender=Location)
+def recompute_paths_on_location_move(sender, instance, created, **kwargs):
+    if created:
+        return
+    if (instance.floor_id, instance.location_type_id) != (
+        getattr(instance, '_old_floor_id', instance.floor_id),
+        getattr(instance, '_old_location_type_id', instance.location_type_id),
+    ):
+        _precompute_routes_on_commit()
+
+
+@receiver(pre_save, sender=LocationType)
+@receiver(pre_save, sender=Floor)
+def remember_transition_state(sender, instance, **kwargs):
+    field = 'transition' if sender is LocationType else 'number'
+    instance._old_transition_state = None
+    if instance.pk:
+        instance._old_transition_state = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=LocationType)
+@receiver(post_save, sender=Floor)
+def recompute_paths_on_transition_change(sender, instance, created, **kwargs):
+    current = instance.transition if sender is LocationType else instance.number
+    if not created and current != getattr(instance, '_old_transition_state', current):
+        _precompute_routes_on_commit()
+
+
+@receiver(pre_delete, sender=LocationType)
+def recompute_paths_on_transition_delete(sender, instance, **kwargs):
+    # Локации теряют тип через SET NULL без сигналов
+    if instance.transition:
+        _precompute_routes_on_commit()
+
+
+@receiver(post_save, sender=Route)
+def drop_stale_route_path(sender, instance, created, **kwargs):
+    # Путь пересчитается при следующей навигации или фоновом пересчёте
+    if not created:
+        RoutePath.objects.filter(route=instance).delete()
+
+
+# Планы этажей: сбрасываем кэш только тех этажей, которых коснулось изменение
+
+def _invalidate_floor_plans_on_commit(floor_ids):
+    floor_ids = set(floor_ids)
+    transaction.on_commit(lambda: invalidate_floor_plans(floor_ids))
+
+
+@receiver(pre_save, sender=Location)
+def remember_location_floor(sender, instance, **kwargs):
+    instance._old_floor_id = None
+    instance._old_location_type_id = None
+    if instance.pk:
+        old = Location.objects.filter(pk=instance.pk).values_list('floor_id', 'location_type_id').first()
+        if old:
+            instance._old_floor_id, instance._old_location_type_id = old
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_location_floor_plan(sender, instance, **kwargs):
+    _invalidate_floor_plans_on_commit([instance.floor_id, getattr(instance, '_old_floor_id', None)])
+
+
+@receiver(post_save, sender=LocationCorner)
+@receiver(post_delete, sender=LocationCorner)
+def invalidate_corner_floor_plan(sender, instance, **kwargs):
+    floor_id = Location.objects.filter(pk=instance.location_id).values_list('floor_id', flat=True).first()
+    _invalidate_floor_plans_on_commit([floor_id])
+
+
+@receiver(post_save, sender=LocationType)
+@receiver(pre_delete, sender=LocationType)
+def invalidate_location_type_floor_plans(sender, instance, **kwargs):
+    # При удалении типа локации сбрасываются в NULL без сигналов, поэтому этажи ищем до удаления
+    floor_ids = Location.objects.filter(location_type=instance).values_list('floor_id', flat=True).distinct()
+    _invalidate_floor_plans_on_commit(floor_ids)
+
+
+@receiver(post_delete, sender=Floor)
+def invalidate_deleted_floor_plan(sender, instance, **kwargs):
+    _invalidate_floor_plans_on_commit([instance.id])
+
+
+# Привязка меток резидентов к локациям: пересчитываем в фоне только затронутые метки и этажи
+
+def _snap_markers_on_commit(**kwargs):
+    from .tasks import snap_map_markers
+    transaction.on_commit(lambda: snap_map_markers.delay(**kwargs))
+
+
+@receiver(post_save, sender=MapMarker)
+def snap_saved_marker(sender, instance, **kwargs):
+    _snap_markers_on_commit(marker_ids=[instance.id])
+
+
+@receiver(post_save, sender=Resident)
+def snap_resident_marker(sender, instance, created, **kwargs):
+    # Строение или этаж резидента могли измениться — тогда метка лежит уже на другом этаже
+    if created:
+        return
+    marker_ids = list(MapMarker.objects.filter(resident=instance).values_list('id', flat=True))
+    if marker_ids:
+        _snap_markers_on_commit(marker_ids=marker_ids)
+
+
+@receiver(post_save, sender=Floor)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def snap_floor_markers_on_location_change(sender, instance, **kwargs):
+    if sender is Floor:
+        floor_ids = [instance.id]
+    else:
+        floor_ids = [floor_id for floor_id in (instance.floor_id, getattr(instance, '_old_floor_id', None)) if floor_id]
+    _snap_markers_on_commit(floor_ids=floor_ids)
+
+
+@receiver(post_save, sender=LocationCorner)
+@receiver(post_delete, sender=LocationCorner)
+def snap_floor_markers_on_corner_change(sender, instance, **kwargs):
+    floor_id = Location.objects.filter(pk=instance.location_id).values_list('floor_id', flat=True).first()
+    if floor_id:
+        _snap_markers_on_commit(floor_ids=[floor_id])
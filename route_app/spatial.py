@@ -0,0 +1,146 @@
+"""
+Пространственный индекс локаций этажа: «в какую локацию попадает точка».
+
+Для каждого этажа в памяти процесса строится равномерная сетка по ограничивающим
+прямоугольникам многоугольников; кандидаты из ячейки точки уточняются проверкой
+попадания в многоугольник. Индекс этажа пересобирается, только когда меняется ETag
+его геометрии (см. floor_plans), поэтому правка углов на одном этаже не трогает остальные.
+"""
+import threading
+from math import floor, hypot, inf as INF
+
+from .floor_plans import get_floor_etag, get_floor_geometry
+from .geometry import point_in_polygon
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class FloorIndex:
+    def __init__(self, etag, polygons):
+        """polygons — [(location_id, name, [(x, y), ...])], у каждого не меньше трёх углов."""
+        self.etag = etag
+        self.polygons = polygons
+        self.boxes = [
+            (min(x for x, _ in points), min(y for _, y in points), max(x for x, _ in points), max(y for _, y in points))
+            for _, _, points in polygons
+        ]
+
+        # Ячейка порядка среднего размера локации: в ячейку попадает всего несколько кандидатов
+        sizes = [max(box[2] - box[0], box[3] - box[1]) for box in self.boxes]
+        self.cell = max(sum(sizes) / len(sizes), 1e-6) if sizes else 1.0
+        self.grid = {}
+        for i, (min_x, min_y, max_x, max_y) in enumerate(self.boxes):
+            for cx in range(self._cell(min_x), self._cell(max_x) + 1):
+                for cy in range(self._cell(min_y), self._cell(max_y) + 1):
+                    self.grid.setdefault((cx, cy), []).append(i)
+        self.cell_bounds = (
+            min((cx for cx, _ in self.grid), default=0), min((cy for _, cy in self.grid), default=0),
+            max((cx for cx, _ in self.grid), default=0), max((cy for _, cy in self.grid), default=0),
+        )
+
+    def _cell(self, value):
+        return floor(value / self.cell)
+
+    def locate(self, x, y):
+        """(location_id, name) локации, содержащей точку, или None."""
+        for i in self.grid.get((self._cell(x), self._cell(y)), ()):
+            min_x, min_y, max_x, max_y = self.boxes[i]
+            if min_x <= x <= max_x and min_y <= y <= max_y:
+                location_id, name, points = self.polygons[i]
+                if point_in_polygon(x, y, points):
+                    return location_id, name
+        return None
+
+    def nearest(self, x, y):
+        """
+        (location_id, name, расстояние) ближайшей локации: 0, если точка внутри.
+        Ячейки обходятся кольцами вокруг точки, пока ближе найденного ничего быть не может.
+        """
+        located = self.locate(x, y)
+        if located is not None:
+            return located[0], located[1], 0.0
+        if not self.polygons:
+            return None
+
+        cx, cy = self._cell(x), self._cell(y)
+        min_cx, min_cy, max_cx, max_cy = self.cell_bounds
+        if not (min_cx <= cx <= max_cx and min_cy <= cy <= max_cy):
+            # Точка за пределами сетки: кольца пришлось бы растить на всё расстояние до плана,
+            # это квадратично по расстоянию — дешевле перебрать прямоугольники локаций
+            return self._nearest_by_boxes(x, y)
+
+        best, best_distance = None, INF
+        seen = set()
+        ring = 0
+        max_ring = max(abs(cx - min_cx), abs(cx - max_cx), abs(cy - min_cy), abs(cy - max_cy))
+        while ring <= max_ring:
+            for cell in _ring_cells(cx, cy, ring):
+                for i in self.grid.get(cell, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    d = _distance_to_polygon(x, y, self.polygons[i][2])
+                    if d < best_distance:
+                        best, best_distance = i, d
+            # Всё, что лежит дальше этого кольца, не ближе чем ring * cell
+            if best is not None and best_distance <= ring * self.cell:
+                break
+            ring += 1
+
+        location_id, name, _ = self.polygons[best]
+        return location_id, name, best_distance
+
+    def _nearest_by_boxes(self, x, y):
+        # До многоугольника не ближе, чем до его прямоугольника: идём по возрастанию этой оценки
+        candidates = sorted((_distance_to_box(x, y, box), i) for i, box in enumerate(self.boxes))
+        best, best_distance = None, INF
+        for bound, i in candidates:
+            if bound >= best_distance:
+                break
+            d = _distance_to_polygon(x, y, self.polygons[i][2])
+            if d < best_distance:
+                best, best_distance = i, d
+        location_id, name, _ = self.polygons[best]
+        return location_id, name, best_distance
+
+
+def _distance_to_box(x, y, box):
+    min_x, min_y, max_x, max_y = box
+    return hypot(max(min_x - x, 0, x - max_x), max(min_y - y, 0, y - max_y))
+
+
+def _ring_cells(cx, cy, ring):
+    if ring == 0:
+        yield cx, cy
+        return
+    for dx in range(-ring, ring + 1):
+        yield cx + dx, cy - ring
+        yield cx + dx, cy + ring
+    for dy in range(-ring + 1, ring):
+        yield cx - ring, cy + dy
+        yield cx + ring, cy + dy
+
+
+def _distance_to_polygon(x, y, points):
+    best = INF
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        t = 0 if length == 0 else max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / length))
+        best = min(best, hypot(x - (x1 + t * dx), y - (y1 + t * dy)))
+    return best
+
+
+def get_floor_index(floor_id):
+    etag = get_floor_etag(floor_id)
+    index = _indexes.get(floor_id)
+    if index is not None and index.etag == etag:
+        return index
+
+    geometry = get_floor_geometry(floor_id)
+    polygons = [(location_id, name, points) for location_id, name, _, points in geometry['locations'] if len(points) >= 3]
+    index = FloorIndex(geometry['etag'], polygons)
+    with _indexes_lock:
+        _indexes[floor_id] = index
+    return index
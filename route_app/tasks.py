@@ -0,0 +1,30 @@
+from celery import shared_task
+
+from .markers import snap_floor_markers, snap_markers
+from .route_paths import precompute_route_paths as precompute, refresh_route_paths as refresh
+
+
+@shared_task
+def precompute_route_paths():
+    count = precompute()
+    return f"Рассчитано {count} путей"
+
+
+@shared_task
+def refresh_route_paths(old_state, new_state):
+    count = refresh(old_state, new_state)
+    return f"Обновлено {count} путей"
+
+
+@shared_task
+def snap_map_markers(marker_ids=None, floor_ids=None):
+    """Привязка меток: по id меток, по этажам или (без аргументов) всех меток сразу."""
+    from resident_app.models import MapMarker
+
+    if floor_ids is not None:
+        count = snap_floor_markers(floor_ids)
+    elif marker_ids is not None:
+        count = snap_markers(MapMarker.objects.filter(id__in=marker_ids))
+    else:
+        count = snap_markers()
+    return f"Привязано {count} меток"
@@ -1,3 +1,782 @@
-from django.test import TestCase
+import json
+import time
+from io import BytesIO
+import random
+from itertools import permutations
+from math import hypot, inf as INF
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from resident_app.models import MapMarker, Resident
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .directions import path_steps
+from .geojson import GeoJSONImportError, export_building, import_building
+from .geometry import point_in_polygon
+from .graph_integrity import analyze_graph
+from .management.commands.benchmark_campus import build_campus_graph
+from .markers import snap_markers
+from .models import Building, Floor, LocationType, Location, LocationCorner, Connection, MarkerLocation, Route, RoutePath
+from .navigation import (
+    ACCESSIBLE_PROFILE, ASTAR, DEFAULT_PROFILE, DIJKSTRA, ELEVATOR, HIERARCHICAL, STAIRS, NavigationGraph, _search, get_graph_version, invalidate_graph, shortest_path,
+    shortest_path_tree, shortest_paths_to_many,
+)
+from .pagination import RouteAppPagination
+from .route_paths import precompute_route_paths, refresh_route_paths
+from .spatial import FloorIndex, _distance_to_polygon
+from .tours import _cost, _nearest_neighbour, _plan, _two_opt
+
+
+@override_settings(BOT_API_KEY='test-bot-key')
+class NavigateQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='Строение 1')
+        floor = Floor.objects.create(number=1, building=building)
+        location_type = LocationType.objects.create(name='Коридор')
+
+        cls.locations = []
+        for i in range(12):
+            location = Location.objects.create(name=f'Локация {i}', floor=floor, location_type=location_type)
+            LocationCorner.objects.bulk_create([
+                LocationCorner(location=location, x=i * 10 + dx, y=dy, order=order)
+                for order, (dx, dy) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+            ])
+            cls.locations.append(location)
+
+        for a, b in zip(cls.locations, cls.locations[1:]):
+            Connection.objects.create(from_location=a, to_location=b, cost=10)
+
+    def setUp(self):
+        # Версия графа живёт в кэше, а транзакции тестов откатываются без on_commit
+        cache.clear()
+        self.client = APIClient(HTTP_X_BOT_API_KEY='test-bot-key')
+
+    def _navigate(self, end):
+        url = f'/api/routes/navigate/?from={self.locations[0].id}&to={end.id}'
+        self.client.get(url)  # прогрев графа и кэша путей
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_depend_on_path_length(self):
+        short = self._navigate(self.locations[2])
+        long = self._navigate(self.locations[-1])
+
+        self.assertEqual(len(short), 3)
+        self.assertEqual(len(long), len(self.locations))
+        self.assertEqual([item['id'] for item in long], [location.id for location in self.locations])
+        self.assertEqual(len(long[-1]['corners']), 4)
+        self.assertEqual(long[-1]['floor']['building']['name'], 'Строение 1')
+
+    def test_stored_route_navigate_query_count(self):
+        short = Route.objects.create(name='Короткий', start_location=self.locations[0], end_location=self.locations[1])
+        long = Route.objects.create(name='Длинный', start_location=self.locations[0], end_location=self.locations[-1])
+
+        for route in (short, long):
+            url = f'/api/routes/{route.id}/navigate/'
+            self.client.get(url)  # первый вызов рассчитывает и сохраняет путь
+            # Маршрут вместе с рассчитанным путём, затем локации и углы
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_navigate_many(self):
+        floor = self.locations[0].floor
+        island = Location.objects.create(name='Без связей', floor=floor)
+        targets = [self.locations[9], self.locations[2], island, self.locations[5]]
+        url = (f'/api/routes/navigate-many/?from={self.locations[0].id}'
+               f'&to={",".join(str(location.id) for location in targets)},999999')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # По возрастанию длины, недостижимые и несуществующие цели пропущены
+        self.assertEqual(
+            [(item['location_id'], item['distance']) for item in response.json()],
+            [(self.locations[2].id, 20), (self.locations[5].id, 50), (self.locations[9].id, 90)],
+        )
+        self.assertEqual(response.json()[0]['path'], [location.id for location in self.locations[:3]])
+
+        limited = self.client.get(url + '&limit=2').json()
+        self.assertEqual([item['location_id'] for item in limited], [self.locations[2].id, self.locations[5].id])
+
+        for query in ('&limit=0', '&limit=-1', '&limit=x'):
+            self.assertEqual(self.client.get(url + query).status_code, 400, msg=query)
+        bad_to = f'/api/routes/navigate-many/?from={self.locations[0].id}&to={self.locations[2].id},abc'
+        self.assertEqual(self.client.get(bad_to).status_code, 400)
+
+    def test_path_cache_is_per_algorithm(self):
+        url = f'/api/routes/navigate/?from={self.locations[0].id}&to={self.locations[5].id}&algorithm='
+        with mock.patch('route_app.navigation.shortest_path', wraps=shortest_path) as search:
+            for algorithm in (DIJKSTRA, HIERARCHICAL, DIJKSTRA, ASTAR, HIERARCHICAL):
+                self.assertEqual(self.client.get(url + algorithm).status_code, 200)
+        # Повторный запрос тем же алгоритмом берётся из кэша, другой алгоритм считается заново
+        self.assertEqual([call.args[3] for call in search.call_args_list], [DIJKSTRA, HIERARCHICAL, ASTAR])
+
+    def test_stored_path_through_deleted_location_is_recomputed(self):
+        Connection.objects.create(from_location=self.locations[1], to_location=self.locations[3], cost=50)
+        route = Route.objects.create(name='Объезд', start_location=self.locations[0], end_location=self.locations[3])
+        url = f'/api/routes/{route.id}/navigate/'
+        self.assertEqual(len(self.client.get(url).json()), 4)
+
+        # Фоновый пересчёт путей ещё не дошёл, а граф уже без удалённой локации
+        self.locations[2].delete()
+        invalidate_graph()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        expected = [self.locations[0].id, self.locations[1].id, self.locations[3].id]
+        self.assertEqual([item['id'] for item in response.json()], expected)
+        self.assertEqual(RoutePath.objects.get(route=route).location_ids, expected)
+
+    def test_steps_view_is_compact(self):
+        url = f'/api/routes/navigate/?from={self.locations[0].id}&to={self.locations[-1].id}&view=steps'
+        self.client.get(url)
+        # Только названия и этажи локаций пути — без углов, центроиды берутся из графа
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        self.assertEqual(data['distance'], 110)
+        # Коридор без поворотов — один шаг и прибытие
+        self.assertEqual([step['action'] for step in data['steps']], ['start', 'arrive'])
+        self.assertEqual(data['steps'][0]['distance'], 110)
+        self.assertEqual(data['steps'][-1]['location_id'], self.locations[-1].id)
+
+
+class PathStepsTests(TestCase):
+    def _actions(self, points):
+        # Локации 1..n на одном этаже с центроидами points, соединённые по порядку
+        locations = [(i, 1, x, y) for i, (x, y) in enumerate(points, start=1)]
+        edges = [(i, i + 1, 10, True) for i in range(1, len(points))]
+        graph = NavigationGraph.from_edges(locations, edges)
+        steps = path_steps(graph, [location_id for location_id, *_ in locations])['steps']
+        return [(step['action'], step['turn']) for step in steps]
+
+    def test_turn_sides_on_plan_with_y_up(self):
+        # На восток, затем на север — против часовой стрелки, то есть налево
+        self.assertEqual(
+            self._actions([(0, 0), (10, 0), (10, 10)]), [('start', None), ('left', -90), ('arrive', None)]
+        )
+        self.assertEqual(
+            self._actions([(0, 0), (10, 0), (10, -10)]), [('start', None), ('right', 90), ('arrive', None)]
+        )
+
+
+class RefreshRoutePathsTests(TestCase):
+    SIDE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='Сетка')
+        floor = Floor.objects.create(number=1, building=building)
+        cls.grid = [
+            [Location.objects.create(name=f'Узел {row}-{col}', floor=floor) for col in range(cls.SIDE)]
+            for row in range(cls.SIDE)
+        ]
+        cost = 1
+        for row in range(cls.SIDE):
+            for col in range(cls.SIDE):
+                # Разные стоимости, чтобы кратчайший путь был единственным
+                cost = cost * 7 % 11 + 1
+                if col + 1 < cls.SIDE:
+                    Connection.objects.create(from_location=cls.grid[row][col], to_location=cls.grid[row][col + 1],
+                                              cost=cost)
+                if row + 1 < cls.SIDE:
+                    Connection.objects.create(from_location=cls.grid[row][col], to_location=cls.grid[row + 1][col],
+                                              cost=cost + 2)
+        corners = [cls.grid[0][0], cls.grid[0][-1], cls.grid[-1][0], cls.grid[-1][-1]]
+        cls.routes = [
+            Route.objects.create(name=f'{start.name} → {end.name}', start_location=start, end_location=end)
+            for start in corners for end in corners if start != end
+        ]
+
+    def setUp(self):
+        cache.clear()
+        precompute_route_paths(graph=self._graph())
+
+    def _graph(self):
+        return NavigationGraph.load(get_graph_version())
+
+    def _change(self, connection, cost=None, delete=False):
+        old = [connection.from_location_id, connection.to_location_id, connection.cost, connection.bidirectional]
+        # Через queryset: сигналы с фоновым пересчётом здесь не нужны, refresh вызывается явно
+        if delete:
+            Connection.objects.filter(pk=connection.pk).delete()
+            new = None
+        else:
+            Connection.objects.filter(pk=connection.pk).update(cost=cost)
+            new = old[:2] + [cost, connection.bidirectional]
+        graph = self._graph()
+        refresh_route_paths(old, new, graph)
+        return graph
+
+    def _assert_matches_full_recompute(self, graph, before):
+        # Изменение должно было задеть хотя бы один маршрут, иначе проверка ничего не показывает
+        self.assertNotEqual(self._stored(), before)
+        for route in self.routes:
+            stored = RoutePath.objects.get(route=route)
+            expected = shortest_path(graph, route.start_location_id, route.end_location_id, DIJKSTRA)
+            self.assertAlmostEqual(stored.distance, expected[1], msg=route.name)
+            self.assertEqual(stored.location_ids, expected[0], msg=route.name)
+
+    def _stored(self):
+        return dict(RoutePath.objects.values_list('route_id', 'distance'))
+
+    def _used_connection(self):
+        return self._used_connection_of(self.routes[0])
+
+    def _used_connection_of(self, route):
+        path = RoutePath.objects.get(route=route).location_ids
+        return Connection.objects.get(from_location_id=path[0], to_location_id=path[1])
+
+    def test_worse_edge(self):
+        before = self._stored()
+        self._assert_matches_full_recompute(self._change(self._used_connection(), cost=1000), before)
+
+    def test_deleted_edge(self):
+        before = self._stored()
+        self._assert_matches_full_recompute(self._change(self._used_connection(), delete=True), before)
+
+    def test_better_edge(self):
+        used = set(Connection.objects.filter(
+            from_location_id__in=RoutePath.objects.get(route=self.routes[0]).location_ids
+        ).values_list('pk', flat=True))
+        unused = Connection.objects.exclude(pk__in=used).order_by('-cost').first()
+        before = self._stored()
+        self._assert_matches_full_recompute(self._change(unused, cost=0.1), before)
+
+    def test_missing_path_is_computed(self):
+        RoutePath.objects.filter(route=self.routes[0]).delete()
+        before = self._stored()
+        self._assert_matches_full_recompute(self._change(self._used_connection_of(self.routes[1]), cost=1000),
+                                            before)
+
+
+class TourOrderTests(SimpleTestCase):
+    @staticmethod
+    def _matrix(points):
+        # Манхэттенские расстояния, как в коридорах с поворотами под прямым углом
+        return [[abs(ax - bx) + abs(ay - by) for bx, by in points] for ax, ay in points]
+
+    def test_two_opt_untangles_order(self):
+        line = self._matrix([(0, 0), (40, 0), (10, 0), (30, 0), (20, 0)])
+        self.assertEqual(_two_opt(line, [0, 1, 2, 3, 4], keep_first=True), [0, 2, 4, 3, 1])
+
+    def test_plan_beats_nearest_neighbour(self):
+        matrix = self._matrix([(19, 8), (11, 20), (16, 0), (14, 7), (20, 1), (5, 3)])
+        greedy = _nearest_neighbour(matrix, 0)
+        self.assertEqual((greedy, _cost(matrix, greedy)), ([0, 3, 2, 4, 5, 1], 60))
+        # Оптимум — перебором всех порядков с тем же началом
+        best = min(([0, *rest] for rest in permutations(range(1, 6))), key=lambda order: _cost(matrix, order))
+        self.assertEqual((best, _cost(matrix, best)), ([0, 4, 2, 5, 3, 1], 56))
+        self.assertEqual(_plan(matrix, fixed_start=0), best)
+
+    def test_unreachable_point_is_skipped(self):
+        matrix = self._matrix([(0, 0), (10, 0), (5, 0)])
+        for row in matrix[:2]:
+            row[2] = INF
+        matrix[2] = [INF, INF, 0]
+        self.assertEqual(_plan(matrix, fixed_start=0), [0, 1])
+
+
+class GeoJSONTests(TestCase):
+    SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+
+    def _collection(self, *features):
+        return BytesIO(json.dumps({
+            'type': 'FeatureCollection',
+            'properties': {'building': 'Импорт', 'floors': [1]},
+            'features': list(features),
+        }).encode())
+
+    def _location(self, file_id, ring=None):
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring or self.SQUARE]},
+            'properties': {'id': file_id, 'name': f'Локация {file_id}', 'floor': 1, 'location_type': 'Кабинет'},
+        }
+
+    def _connection(self, from_id, to_id, cost=5):
+        return {'type': 'Feature', 'geometry': None,
+                'properties': {'kind': 'connection', 'from': from_id, 'to': to_id, 'cost': cost, 'bidirectional': True}}
+
+    def test_malformed_input_is_rejected(self):
+        stream = self._collection(
+            self._location('a'),
+            # Стороны «бабочки» пересекаются
+            self._location('b', [[0, 0], [10, 10], [10, 0], [0, 20], [0, 0]]),
+            self._location('a'),
+            {'type': 'Feature', 'geometry': None, 'properties': {'id': 'c', 'name': 'Без этажа'}},
+            self._connection('a', 'missing'),
+            self._connection('a', 'a'),
+        )
+        with self.assertRaises(GeoJSONImportError) as error:
+            import_building(stream)
+
+        self.assertEqual(len(error.exception.errors), 5)
+        self.assertIn('пересекаются', error.exception.errors[0])
+        self.assertIn('повторяющийся id', error.exception.errors[1])
+        # При ошибке не сохраняется ничего, в том числе уже записанные локации
+        self.assertFalse(Building.objects.filter(name='Импорт').exists())
+        self.assertFalse(Location.objects.exists())
+
+    def test_broken_json_is_rejected(self):
+        with self.assertRaises(GeoJSONImportError):
+            import_building(BytesIO(b'{"type": "FeatureCollection", "features": [{"type": '))
+        self.assertFalse(Location.objects.exists())
+
+    def test_export_import_round_trip(self):
+        stats = import_building(self._collection(
+            self._location('a'),
+            self._location('b', [[10, 0], [20, 0], [20, 10], [10, 10], [10, 0]]),
+            {'type': 'Feature', 'geometry': None, 'properties': {'id': 'c', 'name': 'Без углов', 'floor': 2}},
+            self._connection('a', 'b', cost=7.5),
+        ))
+        self.assertEqual(stats, {'floors': 2, 'locations': 3, 'corners': 8, 'connections': 1})
+
+        original = Building.objects.get(name='Импорт')
+        exported = ''.join(export_building(original))
+        import_building(BytesIO(exported.encode()), building_name='Копия')
+        copy = Building.objects.get(name='Копия')
+
+        def normalized(building):
+            # id локаций в копии другие — сравниваем по названиям
+            collection = json.loads(''.join(export_building(building)))
+            names = {}
+            features = []
+            for feature in collection['features']:
+                properties = feature['properties']
+                if properties.get('kind') == 'connection':
+                    properties['from'], properties['to'] = names[properties['from']], names[properties['to']]
+                else:
+                    names[properties.pop('id')] = properties['name']
+                features.append(feature)
+            return collection['properties']['floors'], features
+
+        self.assertEqual(normalized(copy), normalized(original))
+
+
+class FloorPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(tg_id=1, username='planner')
+        building = Building.objects.create(name='Строение 1')
+        cls.floor = Floor.objects.create(number=1, building=building)
+        location = Location.objects.create(name='Холл', floor=cls.floor)
+        cls.corners = LocationCorner.objects.bulk_create([
+            LocationCorner(location=location, x=x, y=y, order=order)
+            for order, (x, y) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _urls(self):
+        return [
+            f'/api/floors/{self.floor.id}/plan.svg/',
+            f'/api/floors/{self.floor.id}/plan.json/',
+            f'/api/floors/{self.floor.id}/plan/',
+        ]
+
+    def test_not_modified(self):
+        for url in self._urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+
+    def test_plan_change_gives_new_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self._urls()}
+
+        corner = self.corners[2]
+        corner.x = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            corner.save()
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+        plan = json.loads(self.client.get(self._urls()[1]).content)
+        self.assertIn(20, plan['locations'][0]['points'])
+
+
+class FloorLocateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(tg_id=1, username='locator')
+        building = Building.objects.create(name='Строение 1')
+        cls.floor = Floor.objects.create(number=1, building=building)
+        cls.hall = Location.objects.create(name='Холл', floor=cls.floor)
+        cls.office = Location.objects.create(name='Офис', floor=cls.floor)
+        cls.corners = {}
+        for location, left in ((cls.hall, 0), (cls.office, 10)):
+            cls.corners[location.id] = LocationCorner.objects.bulk_create([
+                LocationCorner(location=location, x=left + dx, y=dy, order=order)
+                for order, (dx, dy) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+            ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _locate(self, **params):
+        return self.client.get(f'/api/floors/{self.floor.id}/locate/', params)
+
+    def test_point_in_location(self):
+        response = self._locate(x=15, y=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': self.office.id, 'name': 'Офис'})
+        self.assertEqual(self._locate(x=2.5, y=9.5).json()['id'], self.hall.id)
+
+    def test_off_plan_point(self):
+        for x, y in ((25, 5), (5, -1), (-1000, 1000)):
+            with self.subTest(x=x, y=y):
+                self.assertEqual(self._locate(x=x, y=y).status_code, 404)
+
+    def test_bad_coordinates(self):
+        self.assertEqual(self._locate(x=5).status_code, 400)
+        self.assertEqual(self._locate(x='left', y=5).status_code, 400)
+
+    def test_index_follows_corner_change(self):
+        self.assertEqual(self._locate(x=25, y=5).status_code, 404)
+
+        # Офис растягивается вправо до x=30
+        for corner in self.corners[self.office.id][1:3]:
+            corner.x = 30
+            with self.captureOnCommitCallbacks(execute=True):
+                corner.save()
+
+        self.assertEqual(self._locate(x=25, y=5).json()['id'], self.office.id)
+
+
+class CompactViewTests(TestCase):
+    COMPACT_FIELDS = {
+        'floors': {'id', 'number', 'building_id'},
+        'locations': {'id', 'name', 'floor_id', 'location_type_id'},
+        'connections': {'id', 'from_location_id', 'to_location_id', 'bidirectional', 'cost'},
+        'routes': {'id', 'name', 'start_location_id', 'end_location_id'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(tg_id=1, username='viewer')
+        building = Building.objects.create(name='Строение 1')
+        floor = Floor.objects.create(number=1, building=building)
+        location_type = LocationType.objects.create(name='Коридор')
+        cls.locations = Location.objects.bulk_create([
+            Location(name=f'Локация {i}', floor=floor, location_type=location_type) for i in range(105)
+        ])
+        LocationCorner.objects.bulk_create([
+            LocationCorner(location=location, x=dx, y=dy, order=order)
+            for location in cls.locations[:3]
+            for order, (dx, dy) in enumerate([(0, 0), (10, 0), (10, 10)])
+        ])
+        Connection.objects.bulk_create([
+            Connection(from_location=a, to_location=b, cost=10) for a, b in zip(cls.locations[:3], cls.locations[1:3])
+        ])
+        Route.objects.create(name='Маршрут', start_location=cls.locations[0], end_location=cls.locations[2])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_compact_fields(self):
+        for prefix, fields in self.COMPACT_FIELDS.items():
+            with self.subTest(endpoint=prefix):
+                compact = self.client.get(f'/api/{prefix}/', {'view': 'compact'}).json()['results'][0]
+                self.assertEqual(set(compact), fields)
+                detail = self.client.get(f'/api/{prefix}/{compact["id"]}/', {'view': 'compact'}).json()
+                self.assertEqual(detail, compact)
+
+                full = self.client.get(f'/api/{prefix}/{compact["id"]}/').json()
+                self.assertTrue(any(isinstance(value, dict) for value in full.values()))
+
+    def test_compact_skips_related_queries(self):
+        # count и страница; вложенные локации, этажи и углы не читаются
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/connections/', {'view': 'compact'})
+        self.assertEqual(response.json()['results'][0]['from_location_id'], self.locations[0].id)
+
+    def test_pagination_defaults(self):
+        first = self.client.get('/api/locations/', {'view': 'compact'}).json()
+        self.assertEqual(first['count'], 105)
+        self.assertEqual(len(first['results']), 100)
+        self.assertIsNotNone(first['next'])
+
+        second = self.client.get(first['next']).json()
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, sorted(location.id for location in self.locations))
+
+        page = self.client.get('/api/locations/', {'view': 'compact', 'page_size': 10}).json()
+        self.assertEqual(len(page['results']), 10)
+
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get('/api/locations/', {'page_size': 5000}))
+        self.assertEqual(RouteAppPagination().get_page_size(request), RouteAppPagination.max_page_size)
+
+
+class GraphIntegrityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        first = Floor.objects.create(number=1, building=Building.objects.create(name='А'))
+        second = Floor.objects.create(number=1, building=Building.objects.create(name='Б'))
+        cls.a1, cls.a2, cls.a3, cls.a4 = (Location.objects.create(name=f'А{i}', floor=first) for i in range(1, 5))
+        cls.b1, cls.b2 = (Location.objects.create(name=f'Б{i}', floor=second) for i in range(1, 3))
+
+        Connection.objects.create(from_location=cls.a1, to_location=cls.a2, cost=0)
+        # Из А2 в А3 можно попасть только через здание Б, обратно — никак
+        Connection.objects.create(from_location=cls.a2, to_location=cls.b1, cost=10, bidirectional=False)
+        Connection.objects.create(from_location=cls.b1, to_location=cls.b2, cost=10)
+        Connection.objects.create(from_location=cls.b2, to_location=cls.a3, cost=10, bidirectional=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_report(self):
+        report = analyze_graph()
+
+        self.assertEqual(report['summary'], {
+            'locations': 6,
+            'connections': 4,
+            'components': 2,
+            'strong_components': 4,
+            'isolated': 1,
+            'dead_ends': 1,
+            'unreachable': 0,
+            'cost_anomalies': 1,
+            'buildings_not_strongly_connected': 1,
+            'ok': False,
+        })
+        self.assertEqual(report['isolated'], [self.a4.id])
+        self.assertEqual(report['dead_ends'], [self.a3.id])
+        self.assertEqual(report['components'][1], {'size': 1, 'location_ids': [self.a4.id]})
+        self.assertEqual(report['cost_anomalies'][0]['reason'], 'zero')
+
+        first, second = report['buildings']
+        self.assertEqual(first['components'], [sorted([self.a1.id, self.a2.id]), [self.a3.id]])
+        self.assertEqual(first['reachability'], [[True, True], [False, True]])
+        self.assertFalse(first['strongly_connected'])
+        self.assertEqual(second['components'], [sorted([self.b1.id, self.b2.id])])
+        self.assertEqual(second['reachability'], [[True]])
+        self.assertTrue(second['strongly_connected'])
+
+
+class FloorOverlayTests(SimpleTestCase):
+    def _assert_matches_dijkstra(self, graph, pairs):
+        for start_id, end_id in pairs:
+            expected = shortest_path(graph, start_id, end_id, DIJKSTRA)
+            result = shortest_path(graph, start_id, end_id, HIERARCHICAL)
+            if expected is None:
+                self.assertIsNone(result)
+                continue
+            path, cost = result
+            self.assertAlmostEqual(cost, expected[1], msg=(start_id, end_id))
+            self.assertEqual((path[0], path[-1]), (start_id, end_id))
+            # Ярлыки оверлея развёрнуты: путь идёт по настоящим рёбрам и стоит столько же
+            arcs = [
+                min(c for target, c in graph.neighbors(graph.index[a]) if target == graph.index[b])
+                for a, b in zip(path, path[1:])
+            ]
+            self.assertAlmostEqual(sum(arcs), cost, msg=(start_id, end_id))
+
+    def test_campus_matches_dijkstra(self):
+        graph, _ = build_campus_graph(buildings=3, floors=3, side=4, seed=1)
+        ids = list(graph.ids)
+        pairs = [(ids[i], ids[j]) for i in range(0, len(ids), 7) for j in range(3, len(ids), 11)]
+        self._assert_matches_dijkstra(graph, pairs)
+
+    def test_same_floor_detour_through_other_floor(self):
+        # 1 и 2 на первом этаже, прямая связь дорогая; 3–4 и 5–6 — лестницы на второй этаж
+        graph = NavigationGraph.from_edges(
+            [(1, 1, 0, 0), (2, 1, 10, 0), (3, 1, 1, 0), (4, 2, 1, 0), (5, 2, 9, 0), (6, 1, 9, 0)],
+            [(1, 2, 100, True), (1, 3, 1, True), (3, 4, 1, True), (4, 5, 1, False), (5, 6, 1, True), (6, 2, 1, True)],
+        )
+        self.assertEqual(shortest_path(graph, 1, 2, HIERARCHICAL), ([1, 3, 4, 5, 6, 2], 5))
+        # Обратно односторонняя связь 4 → 5 не пускает — остаётся прямая
+        self.assertEqual(shortest_path(graph, 2, 1, HIERARCHICAL), ([2, 1], 100))
+        self._assert_matches_dijkstra(graph, [(a, b) for a in range(1, 7) for b in range(1, 7)])
+
+
+class NegativeCostTests(SimpleTestCase):
+    def test_search_terminates_with_negative_cost(self):
+        # Связь с отрицательной стоимостью, сохранённая до появления валидатора
+        graph = NavigationGraph.from_edges([(1, 1, 0, 0), (2, 1, 1, 0), (3, 1, 2, 0)], [(1, 2, -1, True), (2, 3, 1, False)])
+        path, _ = _search(graph, 0, 2)
+        self.assertEqual([graph.ids[node] for node in path], [1, 2, 3])
+        self.assertEqual([target for target, _, _ in shortest_paths_to_many(graph, 1, [2, 3])], [2, 3])
+        _, parents = shortest_path_tree(graph, 0)
+        self.assertEqual(list(parents), [-1, 0, 1])
+
+    def test_negative_cost_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            Connection._meta.get_field('cost').run_validators(-1)
+
+
+class FloorIndexTests(SimpleTestCase):
+    def setUp(self):
+        # Ряд квадратов 10 × 10 с зазором 5: (0..10), (15..25), ...
+        self.polygons = [
+            (i, f'Офис {i}', [(15 * i, 0), (15 * i + 10, 0), (15 * i + 10, 10), (15 * i, 10)]) for i in range(20)
+        ]
+        self.index = FloorIndex(None, self.polygons)
+
+    def _brute_force(self, x, y):
+        return min(
+            (0.0 if point_in_polygon(x, y, points) else _distance_to_polygon(x, y, points), location_id)
+            for location_id, _, points in self.polygons
+        )
+
+    def test_nearest_matches_brute_force(self):
+        for x, y in [(5, 5), (12, 5), (100, -7), (-30, 40), (400, 3), (1e4, -2e4), (-3e4, 3e4)]:
+            location_id, _, distance = self.index.nearest(x, y)
+            expected_distance, expected_id = self._brute_force(x, y)
+            self.assertEqual(location_id, expected_id, msg=(x, y))
+            self.assertAlmostEqual(distance, expected_distance, msg=(x, y))
+
+    def test_far_off_plan_point_is_fast(self):
+        started = time.perf_counter()
+        for _ in range(10):
+            location_id, _, _ = self.index.nearest(3e4, 3e4)
+        self.assertEqual(location_id, 19)
+        # Раньше кольца сетки росли до точки: около 10 секунд на один запрос
+        self.assertLess(time.perf_counter() - started, 1)
+
+
+class SnapMarkersTests(TestCase):
+    def test_far_off_plan_marker(self):
+        floor = Floor.objects.create(number=1, building=Building.objects.create(name='1'))
+        near, far = (Location.objects.create(name=name, floor=floor) for name in ('Холл', 'Склад'))
+        for location, offset in ((near, 0), (far, 100)):
+            LocationCorner.objects.bulk_create([
+                LocationCorner(location=location, x=offset + x, y=y, order=order)
+                for order, (x, y) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+            ])
+        resident = Resident.objects.create(name='Резидент', building='1', floor='1', office='1')
+        marker = MapMarker.objects.create(resident=resident, x=-3e4, y=5)
+
+        started = time.perf_counter()
+        self.assertEqual(snap_markers(), 1)
+        self.assertLess(time.perf_counter() - started, 1)
+        snapped = MarkerLocation.objects.get(marker=marker)
+        self.assertEqual(snapped.location, near)
+        self.assertAlmostEqual(snapped.distance, 3e4)
+
+    def test_marker_inside_location_and_unknown_floor(self):
+        floor = Floor.objects.create(number=1, building=Building.objects.create(name='1'))
+        hall = Location.objects.create(name='Холл', floor=floor)
+        LocationCorner.objects.bulk_create([
+            LocationCorner(location=hall, x=x, y=y, order=order)
+            for order, (x, y) in enumerate([(0, 0), (10, 0), (10, 10), (0, 10)])
+        ])
+        inside = MapMarker.objects.create(
+            resident=Resident.objects.create(name='Резидент', building='1', floor='1', office='1'), x=4, y=6
+        )
+        # Этажа 2 нет в плане: старая привязка метки должна пропасть
+        lost = MapMarker.objects.create(
+            resident=Resident.objects.create(name='Без этажа', building='1', floor='2', office='1'), x=4, y=6
+        )
+        MarkerLocation.objects.create(marker=lost, location=hall, distance=0)
+
+        self.assertEqual(snap_markers(), 1)
+        snapped = MarkerLocation.objects.get(marker=inside)
+        self.assertEqual((snapped.location, snapped.distance), (hall, 0))
+        self.assertFalse(MarkerLocation.objects.filter(marker=lost).exists())
+
+
+class AStarTests(SimpleTestCase):
+    def _assert_same_costs(self, graph, pairs):
+        for start_id, end_id in pairs:
+            expected = shortest_path(graph, start_id, end_id, DIJKSTRA)
+            result = shortest_path(graph, start_id, end_id, ASTAR)
+            if expected is None:
+                self.assertIsNone(result, msg=(start_id, end_id))
+            else:
+                self.assertAlmostEqual(result[1], expected[1], msg=(start_id, end_id))
+
+    def test_random_multi_floor_graph(self):
+        rnd = random.Random(7)
+        for _ in range(5):
+            locations = []
+            for location_id in range(1, 61):
+                # Часть локаций без углов — для них эвристика нулевая
+                center = (rnd.uniform(0, 100), rnd.uniform(0, 100)) if rnd.random() < 0.9 else (None, None)
+                locations.append((location_id, rnd.randint(1, 3), *center))
+            positions = {location_id: (floor_id, x, y) for location_id, floor_id, x, y in locations}
+
+            edges = []
+            for _ in range(150):
+                a, b = rnd.sample(range(1, 61), 2)
+                (floor_a, xa, ya), (floor_b, xb, yb) = positions[a], positions[b]
+                if floor_a == floor_b and xa is not None and xb is not None:
+                    cost = hypot(xa - xb, ya - yb) * rnd.uniform(0.5, 2)
+                else:
+                    # Дешёвые переходы между этажами: через них путь короче, чем по прямой на этаже
+                    cost = rnd.uniform(0, 5)
+                edges.append((a, b, cost, rnd.random() < 0.7))
+            graph = NavigationGraph.from_edges(locations, edges)
+
+            scales, exit_costs = graph.astar_bounds()
+            self.assertTrue(scales)
+            self.assertEqual(len(exit_costs), len(graph))
+            self._assert_same_costs(graph, [(a, b) for a in range(1, 61, 3) for b in range(2, 61, 4)])
+
+    def test_detour_through_other_floor(self):
+        # По этажу 1 от 1 до 2 далеко (100), а через этаж 2 — почти бесплатно
+        graph = NavigationGraph.from_edges(
+            [(1, 1, 0, 0), (2, 1, 100, 0), (3, 2, 0, 0), (4, 2, 100, 0)],
+            [(1, 2, 100, True), (1, 3, 1, True), (3, 4, 1, True), (4, 2, 1, True)],
+        )
+        estimate = graph.heuristic(graph.index[2])
+        self.assertEqual(estimate(graph.index[1]), 1)  # ограничено стоимостью выхода с этажа
+        self.assertEqual(shortest_path(graph, 1, 2, ASTAR), ([1, 3, 4, 2], 3))
+
+
+class TransitionProfileTests(SimpleTestCase):
+    PENALTIES = {STAIRS: 15, ELEVATOR: 30}
+
+    def _graph(self, with_lift=True, top_floor=2):
+        # 1 — холл на первом этаже, 6 — офис на верхнем; 2/4 — лестница, 3/5 — лифт
+        locations = [(1, 1, 0, 0), (2, 1, 1, 0), (4, 2, 1, 0), (6, 2, 0, 0)]
+        transitions = {1: (1, ''), 2: (1, 'stairs'), 4: (top_floor, 'stairs'), 6: (top_floor, '')}
+        edges = [(1, 2, 1, True), (2, 4, 3, True), (4, 6, 1, True)]
+        if with_lift:
+            locations += [(3, 1, 2, 0), (5, 2, 2, 0)]
+            transitions.update({3: (1, 'elevator'), 5: (top_floor, 'elevator')})
+            edges += [(1, 3, 5, True), (3, 5, 3, True), (5, 6, 5, True)]
+        return NavigationGraph.from_edges(locations, edges, transitions=transitions, penalties=self.PENALTIES)
+
+    def test_default_profile_takes_stairs(self):
+        # Лестница: 1 + (3 + 15) + 1, лифт: 5 + (3 + 30) + 5
+        self.assertEqual(shortest_path(self._graph().layer(DEFAULT_PROFILE), 1, 6), ([1, 2, 4, 6], 20))
+
+    def test_accessible_profile_takes_lift(self):
+        self.assertEqual(shortest_path(self._graph().layer(ACCESSIBLE_PROFILE), 1, 6), ([1, 3, 5, 6], 43))
+
+    def test_accessible_profile_without_lift(self):
+        graph = self._graph(with_lift=False)
+        self.assertIsNone(shortest_path(graph.layer(ACCESSIBLE_PROFILE), 1, 6))
+        self.assertIsNotNone(shortest_path(graph.layer(DEFAULT_PROFILE), 1, 6))
+
+    def test_penalty_per_floor(self):
+        # Лестница с первого на третий этаж — штраф за два этажа
+        graph = self._graph(with_lift=False, top_floor=3)
+        self.assertEqual(shortest_path(graph, 1, 6), ([1, 2, 4, 6], 1 + 3 + 15 * 2 + 1))
@@ -0,0 +1,137 @@
+"""
+Оптимальный порядок обхода резидентов тура.
+
+Резиденты привязываются к локациям навигации по сохранённой привязке метки на карте
+(см. markers): локация, внутри которой лежит метка, а если такой нет — ближайшая. Матрица расстояний
+между локациями тура считается один раз (один проход Дейкстры от каждой точки) и кэшируется до
+изменения графа или состава тура. Порядок строится жадно по ближайшему соседу и улучшается 2-opt.
+"""
+import hashlib
+from math import inf as INF
+
+from django.core.cache import cache
+
+from .markers import resident_locations
+from .navigation import get_graph, shortest_paths_to_many
+
+TOUR_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def tour_path(tour, start_location_id=None):
+    """
+    Возвращает словарь: stops — остановки по порядку (резидент, локация, путь от предыдущей
+    остановки), distance — общая длина, unplaced — резиденты без локации или недостижимые.
+    """
+    residents = list(tour.residents.select_related('map_marker__snapped_location').order_by('id'))
+    locations = resident_locations(residents)
+
+    graph = get_graph()
+    points = sorted({location_id for location_id in locations.values() if location_id in graph.index})
+    if start_location_id is not None:
+        points = [start_location_id] + [point for point in points if point != start_location_id]
+
+    matrix, paths = _distance_matrix(tour.id, graph, points)
+
+    order = _plan(matrix, fixed_start=0 if start_location_id is not None else None)
+
+    residents_by_location = {}
+    for resident in residents:
+        if resident.id in locations:
+            residents_by_location.setdefault(locations[resident.id], []).append(resident)
+
+    stops = []
+    total = 0
+    previous = None
+    for point in order:
+        location_id = points[point]
+        leg = matrix[previous][point] if previous is not None else 0
+        path = paths.get((points[previous], location_id), [location_id]) if previous is not None else [location_id]
+        total += leg
+        for resident in residents_by_location.get(location_id, []):
+            stops.append({
+                'resident_id': resident.id,
+                'resident_name': resident.name,
+                'location_id': location_id,
+                'distance': leg,
+                'path': path,
+            })
+            # Несколько резидентов в одной локации: до следующих идти не нужно
+            leg, path = 0, [location_id]
+        previous = point
+
+    placed = {stop['resident_id'] for stop in stops}
+    unplaced = [resident.id for resident in residents if resident.id not in placed]
+    return {'distance': total, 'stops': stops, 'unplaced': unplaced}
+
+
+def _distance_matrix(tour_id, graph, points):
+    digest = hashlib.md5(','.join(map(str, points)).encode()).hexdigest()
+    key = f'route_app:tour:{tour_id}:{graph.version}:{digest}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    position = {location_id: i for i, location_id in enumerate(points)}
+    matrix = [[INF] * len(points) for _ in points]
+    paths = {}
+    for i, location_id in enumerate(points):
+        matrix[i][i] = 0
+        for target_id, cost, path in shortest_paths_to_many(graph, location_id, points):
+            matrix[i][position[target_id]] = cost
+            paths[(location_id, target_id)] = path
+
+    cache.set(key, (matrix, paths), TOUR_CACHE_TIMEOUT)
+    return matrix, paths
+
+
+def _plan(matrix, fixed_start=None):
+    """
+    Открытый маршрут по всем точкам: ближайший сосед от каждой возможной стартовой точки
+    (или от fixed_start), затем 2-opt. Матрица может быть несимметричной из-за односторонних связей,
+    поэтому при развороте отрезка его длина пересчитывается целиком.
+    Недостижимые точки в порядок не попадают.
+    """
+    size = len(matrix)
+    if size == 0:
+        return []
+
+    starts = [fixed_start] if fixed_start is not None else range(size)
+    best_order, best_cost = None, INF
+    for start in starts:
+        order = _nearest_neighbour(matrix, start)
+        cost = _cost(matrix, order)
+        if best_order is None or len(order) > len(best_order) or (len(order) == len(best_order) and cost < best_cost):
+            best_order, best_cost = order, cost
+
+    return _two_opt(matrix, best_order, fixed_start is not None)
+
+
+def _nearest_neighbour(matrix, start):
+    order = [start]
+    left = set(range(len(matrix))) - {start}
+    while left:
+        current = order[-1]
+        nearest = min(left, key=lambda point: matrix[current][point])
+        if matrix[current][nearest] == INF:
+            break
+        order.append(nearest)
+        left.discard(nearest)
+    return order
+
+
+def _two_opt(matrix, order, keep_first):
+    improved = True
+    first = 1 if keep_first else 0
+    while improved:
+        improved = False
+        for i in range(first, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if _cost(matrix, candidate) < _cost(matrix, order) - 1e-9:
+                    order = candidate
+                    improved = True
+    return order
+
+
+def _cost(matrix, order):
+    return sum(matrix[a][b] for a, b in zip(order, order[1:]))
@@ -1,9 +1,25 @@
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse, OpenApiExample
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from drf_spectacular.utils import (
+    extend_schema, extend_schema_view, OpenApiResponse, OpenApiExample, OpenApiParameter, OpenApiTypes,
+    PolymorphicProxySerializer
+)
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from user_app.auth.permissions import IsBotAuthenticated
-from .navigation import find_shortest_path
+from resident_app.models import Resident
+from .geojson import GeoJSONImportError, export_building, import_building
+from .directions import path_steps
+from .floor_plans import floor_plan_response, render_json, render_svg
+from .markers import resident_locations
+from .navigation import (
+    ALGORITHMS, ASTAR, DEFAULT_PROFILE, PROFILES, find_cached_path, get_graph, shortest_paths_to_many
+)
+from .route_paths import compute_route_path, get_route_path
 from rest_framework import viewsets, status
 from .models import (
     Building, Floor, LocationType, Location,
@@ -12,9 +28,58 @@ from .models import (
 from .serializers import (
     BuildingSerializer, FloorSerializer, LocationTypeSerializer,
     LocationSerializer, LocationCornerSerializer, ConnectionSerializer,
-    RouteSerializer, TourSerializer
+    RouteSerializer, TourSerializer, NavigationTargetSerializer, TourPathSerializer, LocatedLocationSerializer,
+    NavigationStepsSerializer, FloorCompactSerializer, LocationCompactSerializer, ConnectionCompactSerializer,
+    RouteCompactSerializer
+)
+from .pagination import RouteAppPagination
+from .spatial import get_floor_index
+from .tours import tour_path
+
+COMPACT_VIEW_PARAMETER = OpenApiParameter(
+    name='view',
+    description="compact — только собственные поля и id связанных объектов, без вложенных "
+                "этажей, зданий, типов и углов.",
+    required=False,
+    type=str,
+    enum=['compact'],
 )
 
+# Вложенные объекты полного представления: локация тянет этаж со зданием, тип и углы
+LOCATION_RELATED = ('floor__building', 'location_type')
+READ_ACTIONS = ('list', 'retrieve')
+
+
+class CompactViewMixin:
+    """
+    ?view=compact для list/retrieve: отдаёт compact_serializer_class и не подгружает связанные
+    объекты. Полное представление подгружает их через select_related/prefetch_related,
+    чтобы число запросов не росло с размером страницы. Списки отдаются постранично.
+    """
+    compact_serializer_class = None
+    select_related = ()
+    prefetch_related = ()
+    pagination_class = RouteAppPagination
+
+    def is_compact(self):
+        return (
+            self.action in READ_ACTIONS
+            and self.request is not None
+            and self.request.query_params.get('view') == 'compact'
+        )
+
+    def get_serializer_class(self):
+        if self.is_compact():
+            return self.compact_serializer_class
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        # Постоянный порядок — иначе страницы пагинации могут пересекаться
+        queryset = super().get_queryset().order_by('id')
+        if self.action in READ_ACTIONS and not self.is_compact():
+            queryset = queryset.select_related(*self.select_related).prefetch_related(*self.prefetch_related)
+        return queryset
+
 
 # =================================================================================================
 # Строения
@@ -66,6 +131,52 @@ class BuildingViewSet(viewsets.ModelViewSet):
     queryset = Building.objects.all()
     serializer_class = BuildingSerializer
 
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Экспорт строения в GeoJSON",
+        description="Выгружает этажи, локации с углами и связи строения в виде GeoJSON FeatureCollection. "
+                    "Ответ отдаётся потоком, строение целиком в память не загружается.",
+        responses={(200, 'application/geo+json'): OpenApiTypes.OBJECT}
+    )
+    @action(detail=True, methods=['get'], url_path='export.geojson')
+    def export_geojson(self, request, pk=None):
+        building = self.get_object()
+        response = StreamingHttpResponse(export_building(building), content_type='application/geo+json')
+        response['Content-Disposition'] = f'attachment; filename="building-{building.id}.geojson"'
+        return response
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Импорт строения из GeoJSON",
+        description="Загружает этажи, локации с углами и связи из GeoJSON FeatureCollection (формат экспорта) "
+                    "одной транзакцией. Строение ищется по названию и создаётся, если его нет. "
+                    "При любой ошибке ничего не сохраняется.",
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'building': {'type': 'string', 'description': 'Название строения, если его нет в файле'},
+                },
+                'required': ['file'],
+            }
+        },
+        responses={
+            201: OpenApiResponse(description="Количество созданных этажей, локаций, углов и связей"),
+            400: OpenApiResponse(description="Файл не передан или содержит ошибки")
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_geojson(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Передайте файл в поле file"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            stats = import_building(upload, request.data.get('building') or None)
+        except GeoJSONImportError as error:
+            return Response({"detail": "Ошибка импорта", "errors": error.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats, status=status.HTTP_201_CREATED)
+
 
 # =================================================================================================
 # Этажи
@@ -77,12 +188,14 @@ class BuildingViewSet(viewsets.ModelViewSet):
         tags=['Маршруты'],
         summary="Список этажей",
         description="Возвращает список всех этажей.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: FloorSerializer(many=True)},
     ),
     retrieve=extend_schema(
         tags=['Маршруты'],
         summary="Получить этаж по ID",
         description="Возвращает информацию об этаже.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: FloorSerializer},
     ),
     create=extend_schema(
@@ -110,9 +223,75 @@ class BuildingViewSet(viewsets.ModelViewSet):
         responses={204: OpenApiResponse(description="Этаж удалён")},
     ),
 )
-class FloorViewSet(viewsets.ModelViewSet):
+class FloorViewSet(CompactViewMixin, viewsets.ModelViewSet):
     queryset = Floor.objects.all()
     serializer_class = FloorSerializer
+    compact_serializer_class = FloorCompactSerializer
+    select_related = ('building',)
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="План этажа в SVG",
+        description="Возвращает SVG с многоугольниками локаций этажа и подписями (ось Y направлена вверх). "
+                    "Поддерживает ETag/If-None-Match: пока этаж не менялся, отвечает 304.",
+        responses={
+            (200, 'image/svg+xml'): OpenApiTypes.STR,
+            304: OpenApiResponse(description="План не изменился"),
+            404: OpenApiResponse(description="Этаж не найден")
+        }
+    )
+    @method_decorator(gzip_page)
+    @action(detail=True, methods=['get'], url_path='plan.svg')
+    def plan_svg(self, request, pk=None):
+        return floor_plan_response(request, pk, 'svg', render_svg, 'image/svg+xml')
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="План этажа в JSON",
+        description="Компактный план этажа: bounds — [min_x, min_y, max_x, max_y], colors — палитра, "
+                    "locations — id, name, индекс цвета, плоский массив координат points [x0, y0, x1, y1, ...] "
+                    "и точка подписи label. Поддерживает ETag/If-None-Match.",
+        responses={
+            200: OpenApiTypes.OBJECT,
+            304: OpenApiResponse(description="План не изменился"),
+            404: OpenApiResponse(description="Этаж не найден")
+        }
+    )
+    @method_decorator(gzip_page)
+    @action(detail=True, methods=['get'], url_path='plan.json')
+    def plan_json(self, request, pk=None):
+        return floor_plan_response(request, pk, 'json', render_json, 'application/json')
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Локация по координатам",
+        description="Возвращает локацию этажа, в многоугольник которой попадает точка (x, y). "
+                    "Поиск идёт по пространственному индексу этажа в памяти процесса.",
+        parameters=[
+            OpenApiParameter(name='x', description="Координата X", required=True, type=float),
+            OpenApiParameter(name='y', description="Координата Y", required=True, type=float),
+        ],
+        responses={
+            200: LocatedLocationSerializer,
+            400: OpenApiResponse(description="Некорректные координаты"),
+            404: OpenApiResponse(description="Точка не попадает ни в одну локацию")
+        }
+    )
+    @action(detail=True, methods=['get'])
+    def locate(self, request, pk=None):
+        try:
+            x = float(request.query_params['x'])
+            y = float(request.query_params['y'])
+        except (KeyError, ValueError):
+            return Response({"detail": "Укажите координаты x и y"}, status=status.HTTP_400_BAD_REQUEST)
+
+        floor = self.get_object()
+        located = get_floor_index(floor.id).locate(x, y)
+        if located is None:
+            return Response({"detail": "Локация не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+        location_id, name = located
+        return Response(LocatedLocationSerializer({"id": location_id, "name": name}).data)
 
 
 # =================================================================================================
@@ -173,12 +352,14 @@ class LocationTypeViewSet(viewsets.ModelViewSet):
         tags=['Маршруты'],
         summary="Список локаций",
         description="Возвращает список всех локаций.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: LocationSerializer(many=True)},
     ),
     retrieve=extend_schema(
         tags=['Маршруты'],
         summary="Получить локацию по ID",
         description="Возвращает информацию о конкретной локации.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: LocationSerializer},
     ),
     create=extend_schema(
@@ -206,9 +387,12 @@ class LocationTypeViewSet(viewsets.ModelViewSet):
         responses={204: OpenApiResponse(description="Локация удалена")},
     ),
 )
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(CompactViewMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+    compact_serializer_class = LocationCompactSerializer
+    select_related = LOCATION_RELATED
+    prefetch_related = ('corners',)
 
 
 # =================================================================================================
@@ -269,12 +453,14 @@ class LocationCornerViewSet(viewsets.ModelViewSet):
         tags=['Маршруты'],
         summary="Список связей",
         description="Возвращает список всех связей между локациями.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: ConnectionSerializer(many=True)},
     ),
     retrieve=extend_schema(
         tags=['Маршруты'],
         summary="Получить связь по ID",
         description="Возвращает данные связи.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: ConnectionSerializer},
     ),
     create=extend_schema(
@@ -302,26 +488,53 @@ class LocationCornerViewSet(viewsets.ModelViewSet):
         responses={204: OpenApiResponse(description="Связь удалена")},
     ),
 )
-class ConnectionViewSet(viewsets.ModelViewSet):
+class ConnectionViewSet(CompactViewMixin, viewsets.ModelViewSet):
     queryset = Connection.objects.all()
     serializer_class = ConnectionSerializer
+    compact_serializer_class = ConnectionCompactSerializer
+    select_related = tuple(
+        f'{side}__{related}' for side in ('from_location', 'to_location') for related in LOCATION_RELATED
+    )
+    prefetch_related = ('from_location__corners', 'to_location__corners')
 
 
 # =================================================================================================
 # Маршруты
 # =================================================================================================
 
+PROFILE_PARAMETER = OpenApiParameter(
+    name='profile',
+    description="Режим маршрута: default (по умолчанию) или accessible — без лестниц и эскалаторов. "
+                "Переходы между этажами учитываются со штрафом NAVIGATION_TRANSITION_PENALTIES.",
+    required=False,
+    type=str,
+    enum=list(PROFILES),
+)
+
+PATH_VIEW_PARAMETER = OpenApiParameter(
+    name='view',
+    description="Формат ответа: по умолчанию — список локаций пути, steps — пошаговые подсказки "
+                "(поворот, расстояние, смена этажа) без вложенных этажей и углов.",
+    required=False,
+    type=str,
+    enum=['steps'],
+)
+PATH_VIEWS = (None, 'steps')
+
+
 @extend_schema_view(
     list=extend_schema(
         tags=['Маршруты'],
         summary="Список маршрутов",
         description="Возвращает список всех маршрутов.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: RouteSerializer(many=True)}
     ),
     retrieve=extend_schema(
         tags=['Маршруты'],
         summary="Получить маршрут по ID",
         description="Возвращает детальную информацию о маршруте по ID.",
+        parameters=[COMPACT_VIEW_PARAMETER],
         responses={200: RouteSerializer, 404: OpenApiResponse(description="Маршрут не найден")}
     ),
     create=extend_schema(
@@ -349,35 +562,269 @@ class ConnectionViewSet(viewsets.ModelViewSet):
         responses={204: OpenApiResponse(description="Маршрут удалён"), 404: OpenApiResponse(description="Маршрут не найден")}
     ),
 )
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(CompactViewMixin, viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
+    compact_serializer_class = RouteCompactSerializer
     permission_classes = [IsBotAuthenticated | IsAuthenticated]
+    select_related = tuple(
+        f'{side}__{related}' for side in ('start_location', 'end_location') for related in LOCATION_RELATED
+    )
+    prefetch_related = ('start_location__corners', 'end_location__corners')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'navigate':
+            queryset = queryset.select_related('precomputed_path')
+        return queryset
 
     @extend_schema(
         tags=['Маршруты'],
         summary="Навигация по маршруту",
-        description="Возвращает путь от начальной до конечной точки маршрута.",
+        description="Возвращает путь от начальной до конечной точки маршрута. "
+                    "Путь берётся из таблицы рассчитанных путей, а при её отсутствии считается и сохраняется.",
+        parameters=[
+            OpenApiParameter(
+                name='algorithm',
+                description="Алгоритм поиска, если путь ещё не рассчитан: "
+                            "astar (по умолчанию, с эвристикой по центроидам локаций), dijkstra "
+                            "или hierarchical (двухуровневый поиск через переходы между этажами)",
+                required=False,
+                type=str,
+                enum=list(ALGORITHMS),
+            ),
+            PROFILE_PARAMETER,
+            PATH_VIEW_PARAMETER,
+        ],
         responses={
-            200: LocationSerializer(many=True),
+            200: PolymorphicProxySerializer(
+                component_name='NavigationPath',
+                serializers=[LocationSerializer(many=True), NavigationStepsSerializer],
+                resource_type_field_name=None,
+            ),
+            400: OpenApiResponse(description="Неизвестный алгоритм, режим или формат ответа"),
             404: OpenApiResponse(description="Путь не найден")
         }
     )
     @action(detail=True, methods=['get'])
     def navigate(self, request, pk=None):
+        algorithm = request.query_params.get('algorithm', ASTAR)
+        profile = request.query_params.get('profile', DEFAULT_PROFILE)
+        view = request.query_params.get('view')
+        if algorithm not in ALGORITHMS or profile not in PROFILES or view not in PATH_VIEWS:
+            return Response({"detail": "Неизвестный алгоритм, режим или формат ответа"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
         route = self.get_object()
-        path_ids = find_shortest_path(route.start_location, route.end_location)
+        if profile == DEFAULT_PROFILE:
+            path_ids = get_route_path(route, algorithm)
+            return self._path_response(
+                path_ids, view, profile, recompute=lambda: compute_route_path(route, algorithm)
+            )
+        # В таблице хранятся пути только для обычного режима
+        path_ids = find_cached_path(route.start_location_id, route.end_location_id, algorithm, profile)
+        return self._path_response(path_ids, view, profile)
 
+    @extend_schema(
+        operation_id='routes_navigate_between',
+        tags=['Маршруты'],
+        summary="Навигация между произвольными локациями",
+        description="Возвращает путь между двумя локациями без создания маршрута. "
+                    "Только чтение: результат кэшируется до следующего изменения графа.",
+        parameters=[
+            OpenApiParameter(name='from', description="ID начальной локации", required=True, type=int),
+            OpenApiParameter(name='to', description="ID конечной локации", required=True, type=int),
+            OpenApiParameter(
+                name='algorithm',
+                description="Алгоритм поиска: astar (по умолчанию), dijkstra или hierarchical "
+                            "(только начальный и конечный этажи плюс оверлей переходов между этажами)",
+                required=False,
+                type=str,
+                enum=list(ALGORITHMS),
+            ),
+            PROFILE_PARAMETER,
+            PATH_VIEW_PARAMETER,
+        ],
+        responses={
+            200: PolymorphicProxySerializer(
+                component_name='NavigationPath',
+                serializers=[LocationSerializer(many=True), NavigationStepsSerializer],
+                resource_type_field_name=None,
+            ),
+            400: OpenApiResponse(description="Не указаны from/to, неизвестный алгоритм, режим или формат ответа"),
+            404: OpenApiResponse(description="Путь не найден")
+        }
+    )
+    @action(detail=False, methods=['get'], url_path='navigate')
+    def navigate_between(self, request):
+        start_id = request.query_params.get('from', '')
+        end_id = request.query_params.get('to', '')
+        algorithm = request.query_params.get('algorithm', ASTAR)
+        profile = request.query_params.get('profile', DEFAULT_PROFILE)
+        if not start_id.isdigit() or not end_id.isdigit():
+            return Response({"detail": "Укажите from и to"}, status=status.HTTP_400_BAD_REQUEST)
+        view = request.query_params.get('view')
+        if algorithm not in ALGORITHMS or profile not in PROFILES or view not in PATH_VIEWS:
+            return Response({"detail": "Неизвестный алгоритм, режим или формат ответа"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        path_ids = find_cached_path(int(start_id), int(end_id), algorithm, profile)
+        return self._path_response(path_ids, view, profile)
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Навигация до резидента",
+        description="Возвращает путь от локации до резидента. Конечная точка — локация, к которой "
+                    "привязана метка резидента на карте (внутри которой она лежит или ближайшая).",
+        parameters=[
+            OpenApiParameter(name='from', description="ID начальной локации", required=True, type=int),
+            OpenApiParameter(name='resident', description="ID резидента", required=True, type=int),
+            OpenApiParameter(
+                name='algorithm',
+                description="Алгоритм поиска: astar (по умолчанию), dijkstra или hierarchical "
+                            "(только начальный и конечный этажи плюс оверлей переходов между этажами)",
+                required=False,
+                type=str,
+                enum=list(ALGORITHMS),
+            ),
+            PROFILE_PARAMETER,
+            PATH_VIEW_PARAMETER,
+        ],
+        responses={
+            200: PolymorphicProxySerializer(
+                component_name='NavigationPath',
+                serializers=[LocationSerializer(many=True), NavigationStepsSerializer],
+                resource_type_field_name=None,
+            ),
+            400: OpenApiResponse(description="Не указаны from/resident, неизвестный алгоритм, режим или формат ответа"),
+            404: OpenApiResponse(description="Резидент не найден, не отмечен на карте или путь не найден")
+        }
+    )
+    @action(detail=False, methods=['get'], url_path='navigate-resident')
+    def navigate_resident(self, request):
+        start_id = request.query_params.get('from', '')
+        resident_id = request.query_params.get('resident', '')
+        algorithm = request.query_params.get('algorithm', ASTAR)
+        profile = request.query_params.get('profile', DEFAULT_PROFILE)
+        if not start_id.isdigit() or not resident_id.isdigit():
+            return Response({"detail": "Укажите from и resident"}, status=status.HTTP_400_BAD_REQUEST)
+        view = request.query_params.get('view')
+        if algorithm not in ALGORITHMS or profile not in PROFILES or view not in PATH_VIEWS:
+            return Response({"detail": "Неизвестный алгоритм, режим или формат ответа"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        resident = Resident.objects.select_related('map_marker__snapped_location').filter(id=resident_id).first()
+        if resident is None:
+            return Response({"detail": "Резидент не найден"}, status=status.HTTP_404_NOT_FOUND)
+        end_id = resident_locations([resident]).get(resident.id)
+        if end_id is None:
+            return Response({"detail": "Резидент не отмечен на карте"}, status=status.HTTP_404_NOT_FOUND)
+
+        path_ids = find_cached_path(int(start_id), end_id, algorithm, profile)
+        return self._path_response(path_ids, view, profile)
+
+    def _path_response(self, path_ids, view=None, profile=DEFAULT_PROFILE, recompute=None):
+        """
+        recompute — пересчёт сохранённого пути маршрута: вызывается, если путь проходит
+        через уже удалённую локацию. Без него такой путь отдаётся как ненайденный.
+        """
         if path_ids is None:
             return Response({"detail": "Путь не найден"}, status=status.HTTP_404_NOT_FOUND)
 
-        locations = Location.objects.filter(id__in=path_ids)
+        if view == 'steps':
+            # Один запрос за названиями и этажами, направления — по центроидам из графа
+            graph = get_graph().layer(profile)
+            if recompute is not None and any(loc_id not in graph.index for loc_id in path_ids):
+                return self._path_response(recompute(), view, profile)
+            steps = path_steps(graph, path_ids)
+            return Response(NavigationStepsSerializer(steps).data)
+
+        # Два запроса на любой длине пути: локации с этажом/зданием/типом одним JOIN и все углы разом
+        locations = Location.objects.filter(id__in=path_ids).select_related(
+            'floor__building', 'location_type'
+        ).prefetch_related('corners')
         locations_by_id = {loc.id: loc for loc in locations}
+        if len(locations_by_id) != len(set(path_ids)):
+            if recompute is not None:
+                return self._path_response(recompute(), view, profile)
+            return Response({"detail": "Путь не найден"}, status=status.HTTP_404_NOT_FOUND)
         ordered = [locations_by_id[loc_id] for loc_id in path_ids]
         serializer = LocationSerializer(ordered, many=True)
 
         return Response(serializer.data)
 
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Навигация до нескольких точек",
+        description="Считает пути от одной локации сразу до набора целей за один проход Дейкстры "
+                    "и возвращает их по возрастанию длины (например, «ближайшее кафе»). "
+                    "Цели задаются списком id локаций (to), типом локации (location_type) "
+                    "или категорией резидентов (category). "
+                    "Недостижимые цели в ответ не попадают.",
+        parameters=[
+            OpenApiParameter(name='from', description="ID начальной локации", required=True, type=int),
+            OpenApiParameter(name='to', description="ID целевых локаций через запятую, например 3,5,8",
+                             required=False, type=str),
+            OpenApiParameter(name='location_type', description="ID типа локации: цели — все локации этого типа",
+                             required=False, type=int),
+            OpenApiParameter(name='category', description="ID категории резидентов: цели — локации резидентов "
+                                                          "этой категории и её подкатегорий",
+                             required=False, type=int),
+            OpenApiParameter(name='limit', description="Вернуть только N ближайших целей (N ≥ 1)", required=False, type=int),
+            PROFILE_PARAMETER,
+        ],
+        responses={
+            200: NavigationTargetSerializer(many=True),
+            400: OpenApiResponse(description="Не указана начальная локация или цели, некорректные to или limit"),
+            404: OpenApiResponse(description="Начальная локация не найдена")
+        }
+    )
+    @action(detail=False, methods=['get'], url_path='navigate-many')
+    def navigate_many(self, request):
+        start_id = request.query_params.get('from', '')
+        target_ids = request.query_params.get('to')
+        location_type_id = request.query_params.get('location_type')
+        category_id = request.query_params.get('category')
+        limit = request.query_params.get('limit')
+        profile = request.query_params.get('profile', DEFAULT_PROFILE)
+
+        if profile not in PROFILES:
+            return Response({"detail": "Неизвестный режим"}, status=status.HTTP_400_BAD_REQUEST)
+        if not start_id.isdigit() or not (target_ids or location_type_id or category_id):
+            return Response({"detail": "Укажите from и to, location_type или category"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if any(value is not None and not value.isdigit() for value in (location_type_id, category_id, limit)):
+            return Response({"detail": "location_type, category и limit должны быть числами"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if limit is not None and int(limit) < 1:
+            return Response({"detail": "limit должен быть не меньше 1"}, status=status.HTTP_400_BAD_REQUEST)
+        if target_ids and not all(i.strip().isdigit() for i in target_ids.split(',')):
+            return Response({"detail": "to — id локаций через запятую"}, status=status.HTTP_400_BAD_REQUEST)
+
+        targets = Location.objects.all()
+        if target_ids:
+            targets = targets.filter(id__in=[int(i) for i in target_ids.split(',')])
+        if location_type_id:
+            targets = targets.filter(location_type_id=location_type_id)
+        if category_id:
+            # Локации резидентов берутся из сохранённых привязок меток (см. markers)
+            targets = targets.filter(
+                Q(snapped_markers__marker__resident__categories=category_id)
+                | Q(snapped_markers__marker__resident__categories__parent=category_id)
+            ).distinct()
+        names = dict(targets.values_list('id', 'name'))
+
+        graph = get_graph().layer(profile)
+        if int(start_id) not in graph.index:
+            return Response({"detail": "Локация не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+        results = shortest_paths_to_many(graph, int(start_id), names, int(limit) if limit is not None else None)
+        data = [
+            {"location_id": location_id, "name": names[location_id], "distance": distance, "path": path}
+            for location_id, distance, path in results
+        ]
+        return Response(NavigationTargetSerializer(data, many=True).data)
+
 
 # =================================================================================================
 # Туры
@@ -437,3 +884,37 @@ class TourViewSet(viewsets.ModelViewSet):
     queryset = Tour.objects.all().order_by('-created_at')
     serializer_class = TourSerializer
     permission_classes = [IsBotAuthenticated | IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in READ_ACTIONS:
+            # TourSerializer отдаёт id резидентов тура
+            queryset = queryset.prefetch_related('residents')
+        return queryset
+
+    @extend_schema(
+        tags=['Маршруты'],
+        summary="Маршрут тура",
+        description="Возвращает порядок обхода резидентов тура и пути между ними. "
+                    "Порядок строится по расстояниям графа связей (ближайший сосед + 2-opt). "
+                    "Резидент привязывается к локации по своей метке на карте.",
+        parameters=[
+            OpenApiParameter(name='start', description="ID локации, с которой начинается тур", required=False, type=int),
+        ],
+        responses={
+            200: TourPathSerializer,
+            400: OpenApiResponse(description="Некорректный start"),
+            404: OpenApiResponse(description="Тур или начальная локация не найдены")
+        }
+    )
+    @action(detail=True, methods=['get'])
+    def path(self, request, pk=None):
+        tour = self.get_object()
+        start = request.query_params.get('start')
+        if start is not None and not start.isdigit():
+            return Response({"detail": "start должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+        if start is not None and int(start) not in get_graph().index:
+            return Response({"detail": "Локация не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = tour_path(tour, int(start) if start is not None else None)
+        return Response(TourPathSerializer(data).data)
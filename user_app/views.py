@@ -55,7 +55,8 @@ class UserViewSet(
     viewsets.GenericViewSet
 ):
     lookup_field = 'tg_id'
-    queryset = User.objects.all()
+    # UserSerializer отдаёт группы и права — без prefetch это два запроса на пользователя
+    queryset = User.objects.prefetch_related('groups', 'user_permissions')
     serializer_class = UserSerializer
     
     def get_permissions(self):
@@ -205,7 +206,7 @@ class UserMeViewSet(viewsets.ViewSet):
         user_promotions = UserPromotion.objects.filter(
             user=user,
             promotion__end_date__gte=timezone.now()
-        )
+        ).select_related('promotion__resident')
         if not user_promotions.exists():
             return Response({'error': 'У Вас нет активных промокодов.'}, status=status.HTTP_404_NOT_FOUND)
         serializer = UserPromotionDisplaySerializer(user_promotions, many=True)